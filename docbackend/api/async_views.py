@@ -0,0 +1,139 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.utils.encoders import JSONEncoder
+
+from core.models import Document, Notification
+from core.utils import hash_file
+from core.services.notification_feed import serialize_notification
+from api.file_serving import serve_file
+from api.views import (
+    filter_documents, notification_feed,
+    serialize_document_detail, serialize_document_summary,
+)
+
+# Sync views (upload processing, OCR, thumbnails, search) run here under
+# ASGI instead of on the single thread Django otherwise runs them all on
+cpu_executor = ThreadPoolExecutor(max_workers=settings.ASYNC_EXECUTOR_WORKERS,
+                                  thread_name_prefix='docbackend-sync')
+
+
+def in_executor(view):
+    """Async view running the sync ``view`` (e.g. an APIView's as_view()) on cpu_executor"""
+    def run(request, *args, **kwargs):
+        try:
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render'):
+                # Render DRF responses here too rather than back on the event loop
+                response.render()
+            return response
+        finally:
+            # Django only closes the connections of its own request thread
+            close_old_connections()
+
+    run_async = sync_to_async(run, thread_sensitive=False, executor=cpu_executor)
+
+    async def async_view(request, *args, **kwargs):
+        return await run_async(request, *args, **kwargs)
+
+    async_view.csrf_exempt = getattr(view, 'csrf_exempt', False)
+    return async_view
+
+
+def api_response(data, status=200):
+    # Encoded like DRF's JSONRenderer, so responses match the sync views byte for byte
+    return JsonResponse(data, status=status, safe=False, encoder=JSONEncoder,
+                        json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')})
+
+
+class AsyncAPIView(View):
+    """Plain async Django view; CSRF-exempt like DRF's APIView"""
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+
+class AsyncDocumentListView(AsyncAPIView):
+    async def get(self, request):
+        return api_response([serialize_document_summary(doc) async for doc in filter_documents(request.GET)])
+
+
+class AsyncDocumentDetailView(AsyncAPIView):
+    async def get(self, request, document_id):
+        try:
+            document = await Document.objects.aget(file_id=document_id)
+        except Document.DoesNotExist:
+            return api_response({'error': 'Document not found'}, status=404)
+
+        fields = {}
+        async for field in document.extracted_fields.all():
+            fields.setdefault(field.name, []).append(field.value)
+        return api_response(serialize_document_detail(document, fields))
+
+
+class AsyncNotificationView(AsyncAPIView):
+    async def get(self, request):
+        since = request.GET.get('since')
+        if since is None:
+            notifications = await notification_feed.arecent(50)
+            return api_response([serialize_notification(notif) for notif in notifications])
+
+        try:
+            cursor = int(since)
+            wait = min(float(request.GET.get('wait', 0)), settings.NOTIFICATION_LONG_POLL_MAX_SECONDS)
+        except ValueError:
+            return api_response({'error': 'since and wait must be numbers'}, status=400)
+
+        if wait > 0:
+            # Waits on the event loop; an idle long-poll holds no thread
+            notifications = await notification_feed.apoll(cursor, wait)
+        else:
+            notifications = await notification_feed.asince(cursor)
+        return api_response([serialize_notification(notif) for notif in notifications])
+
+    async def put(self, request, notification_id):
+        if not await Notification.objects.filter(id=notification_id).aupdate(is_read=True):
+            return api_response({'error': 'Notification not found'}, status=404)
+        return api_response({'status': 'success'})
+
+
+class AsyncNotificationStreamView(AsyncAPIView):
+    async def get(self, request):
+        since = request.headers.get('Last-Event-ID') or request.GET.get('since')
+        try:
+            cursor = int(since) if since is not None else await notification_feed.alatest_id()
+        except ValueError:
+            return api_response({'error': 'since must be a notification id'}, status=400)
+
+        response = StreamingHttpResponse(notification_feed.astream(cursor), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Don't let nginx buffer events
+        return response
+
+
+class AsyncDocumentFileView(AsyncAPIView):
+    async def get(self, request, document_id):
+        try:
+            document = await Document.objects.aget(file_id=document_id)
+        except Document.DoesNotExist:
+            return api_response({'error': 'Document not found'}, status=404)
+        if not document.file:
+            return api_response({'error': 'No file available'}, status=404)
+
+        try:
+            if not document.content_hash:
+                # Hashing a large legacy upload is real work, keep it off the loop
+                document.content_hash = await asyncio.get_running_loop().run_in_executor(
+                    cpu_executor, hash_file, document.file.path)
+                await document.asave(update_fields=['content_hash'])
+            return serve_file(request, document.file.path, document.file.name,
+                              document.file_name, document.content_hash, asynchronous=True)
+        except Exception as e:
+            return api_response({'error': str(e)}, status=500)
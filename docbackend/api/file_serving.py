@@ -0,0 +1,156 @@
+import asyncio
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header, quote_etag
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def guess_content_type(file_name):
+    """Content type from the file name, e.g. image/jpeg rather than application/jpg"""
+    content_type, _ = mimetypes.guess_type(file_name)
+    return content_type or 'application/octet-stream'
+
+
+def _etag_matches(header, etag):
+    """Check an If-None-Match / If-Range header value against our strong ETag"""
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    return etag in [tag.strip() for tag in header.split(',')]
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range ``Range`` header into an inclusive (start, end) pair.
+
+    Returns None when the header should be ignored (absent, malformed or
+    multi-range) and raises ValueError when the range is unsatisfiable.
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("Unsatisfiable range")
+    return start, min(end, size - 1)
+
+
+def _read_range(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+async def _aread_range(path, start, end):
+    """_read_range for ASGI: file reads run in a thread so the event loop keeps serving"""
+    f = await asyncio.to_thread(open, path, 'rb')
+    try:
+        await asyncio.to_thread(f.seek, start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await asyncio.to_thread(f.read, min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await asyncio.to_thread(f.close)
+
+
+def _offload_response(storage_name, path, content_type):
+    """Hand the transfer to the front-end server so no worker streams the bytes"""
+    response = HttpResponse(content_type=content_type)
+    if settings.FILE_SERVE_MODE == 'x-accel-redirect':
+        prefix = settings.FILE_ACCEL_REDIRECT_PREFIX.rstrip('/')
+        response['X-Accel-Redirect'] = f"{prefix}/{storage_name}"
+    else:
+        response['X-Sendfile'] = path
+    return response
+
+
+def serve_file(request, path, storage_name, file_name, content_hash, asynchronous=False):
+    """
+    Serve a stored file with conditional GET and byte-range support.
+
+    The strong ETag is the file's SHA-256, so a matching If-None-Match gets a
+    304 without touching the file. With FILE_SERVE_MODE set to 'x-sendfile' or
+    'x-accel-redirect' the body is left to the front-end server, which then
+    also takes care of Range requests.
+
+    ``asynchronous`` streams the body from an async iterator, for async views
+    served over ASGI.
+    """
+    etag = quote_etag(content_hash)
+    content_type = guess_content_type(file_name)
+
+    if _etag_matches(request.headers.get('If-None-Match'), etag):
+        response = HttpResponse(status=304)
+        response['ETag'] = etag
+        response['Cache-Control'] = f'private, max-age={settings.FILE_CACHE_MAX_AGE}'
+        return response
+
+    if settings.FILE_SERVE_MODE in ('x-sendfile', 'x-accel-redirect'):
+        response = _offload_response(storage_name, path, content_type)
+    else:
+        size = os.path.getsize(path)
+        range_header = request.headers.get('Range')
+        if_range = request.headers.get('If-Range')
+        if if_range and not _etag_matches(if_range, etag):
+            # The client's partial copy is stale, send the whole file
+            range_header = None
+
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        if asynchronous:
+            start, end = byte_range or (0, size - 1)
+            response = StreamingHttpResponse(_aread_range(path, start, end), content_type=content_type,
+                                             status=200 if byte_range is None else 206)
+            response['Content-Length'] = str(end - start + 1)
+            if byte_range is not None:
+                response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        elif byte_range is None:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(_read_range(path, start, end),
+                                             status=206, content_type=content_type)
+            response['Content-Length'] = str(end - start + 1)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Accept-Ranges'] = 'bytes'
+
+    response['ETag'] = etag
+    response['Cache-Control'] = f'private, max-age={settings.FILE_CACHE_MAX_AGE}'
+    response['Content-Disposition'] = content_disposition_header(False, file_name)
+    return response
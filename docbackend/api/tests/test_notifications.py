@@ -0,0 +1,9 @@
+from django.test import TestCase
+from django.urls import reverse
+
+
+class NotificationStreamTests(TestCase):
+    def test_sync_stream_is_refused(self):
+        response = self.client.get(reverse('notification-stream'), HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 406)
+        self.assertIn('ASYNC_VIEWS', response.json()['error'])
@@ -0,0 +1,89 @@
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.models import ProcessingJob
+
+
+def upload(name, content=b'document'):
+    return SimpleUploadedFile(name, content)
+
+
+@override_settings(PROCESSING_MODE='queue')
+class UploadCleanupTests(TestCase):
+    """Nothing but the uploads recorded as jobs may be left in MEDIA_ROOT"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def stored_files(self):
+        return sorted(os.path.relpath(os.path.join(root, name), self.media_root)
+                      for root, _, files in os.walk(self.media_root) for name in files)
+
+    def test_extra_file_fields_are_not_stored(self):
+        response = self.client.post(reverse('document-process'), {
+            'file': upload('CERT.docx'),
+            'extra': upload('SERVICE-RECORD.docx'),
+        })
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.stored_files(), [ProcessingJob.objects.get().file])
+
+    def test_rejected_upload_leaves_nothing(self):
+        response = self.client.post(reverse('document-process'), {
+            'file': upload('CERT.exe'),
+            'extra': upload('CTC-DIPLOMA.docx'),
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stored_files(), [])
+
+    def test_repeated_file_parts_keep_only_the_accepted_one(self):
+        response = self.client.post(reverse('document-process'), {
+            'file': [upload('A.docx'), upload('B.docx')],
+        })
+        self.assertEqual(response.status_code, 202)
+        job = ProcessingJob.objects.get()
+        self.assertEqual(job.file_name, 'B.docx')
+        self.assertEqual(self.stored_files(), [job.file])
+
+    def test_long_file_names_fit_the_file_column(self):
+        response = self.client.post(reverse('document-process'), {'file': upload('A' * 150 + '.docx')})
+        self.assertEqual(response.status_code, 202)
+        job = ProcessingJob.objects.get()
+        self.assertLessEqual(len(job.file), 100)
+        self.assertEqual(self.stored_files(), [job.file])
+
+    @override_settings(BATCH_MAX_FILES=2, DATA_UPLOAD_MAX_NUMBER_FILES=2)
+    def test_batch_over_the_file_limit_is_rejected_and_removed(self):
+        response = self.client.post(reverse('batch-process'), {
+            'files': [upload(f'F{n}.docx') for n in range(3)],
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stored_files(), [])
+        self.assertFalse(ProcessingJob.objects.exists())
+
+    def test_batch_keeps_only_queued_files(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('member.docx', b'member')
+            zf.writestr('notes.txt', b'notes')
+        response = self.client.post(reverse('batch-process'), {
+            'files': [upload('A.docx'), upload('B.exe'), upload('docs.zip', archive.getvalue())],
+            'file': upload('IGNORED.docx'),
+        })
+        self.assertEqual(response.status_code, 202)
+        jobs = ProcessingJob.objects.order_by('file_name')
+        self.assertEqual([job.file_name for job in jobs], ['A.docx', 'member.docx'])
+        self.assertEqual(self.stored_files(), sorted(job.file for job in jobs))
+        self.assertEqual({item['file_name'] for item in response.json()['rejected']},
+                         {'B.exe', 'docs.zip/notes.txt'})
+
@@ -1,19 +1,55 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
     DocumentProcessView, 
+    BatchProcessView,
+    BatchDetailView,
     DocumentListView, 
+    DocumentSearchView,
+    DocumentSimilarView,
     DocumentStatusView, 
     NotificationView,
+    NotificationStreamView,
+    NotificationBulkReadView,
+    NotificationUnreadCountView,
     DocumentFileView,
-    DocumentDetailView
+    DocumentDetailView,
+    DocumentThumbnailView,
+    JobDetailView,
+    TimingStatsView
 )
 
+
+def view(sync_view, async_view=None):
+    """
+    The view for a route: with ASYNC_VIEWS, the named class from
+    api.async_views, and otherwise the sync view run on its thread pool so
+    sync views don't queue on Django's one sync thread.
+    """
+    if not settings.ASYNC_VIEWS:
+        return sync_view.as_view()
+    from . import async_views
+    if async_view:
+        return getattr(async_views, async_view).as_view()
+    return async_views.in_executor(sync_view.as_view())
+
+
 urlpatterns = [
-    path('documents/process/', DocumentProcessView.as_view(), name='document-process'),
-    path('documents/', DocumentListView.as_view(), name='document-list'),
-    path('documents/<str:document_id>/', DocumentDetailView.as_view(), name='document-detail'),
-    path('documents/<str:document_id>/file/', DocumentFileView.as_view(), name='document-file'),
-    path('documents/<str:document_id>/status/', DocumentStatusView.as_view(), name='document-status'),
-    path('notifications/', NotificationView.as_view(), name='notifications'),
-    path('notifications/<int:notification_id>/', NotificationView.as_view(), name='notification-update'),
+    path('documents/process/', view(DocumentProcessView), name='document-process'),
+    path('batches/', view(BatchProcessView), name='batch-process'),
+    path('batches/<str:batch_id>/', view(BatchDetailView), name='batch-detail'),
+    path('documents/', view(DocumentListView, 'AsyncDocumentListView'), name='document-list'),
+    path('documents/search/', view(DocumentSearchView), name='document-search'),
+    path('documents/<str:document_id>/', view(DocumentDetailView, 'AsyncDocumentDetailView'), name='document-detail'),
+    path('documents/<str:document_id>/file/', view(DocumentFileView, 'AsyncDocumentFileView'), name='document-file'),
+    path('documents/<str:document_id>/thumbnail/', view(DocumentThumbnailView), name='document-thumbnail'),
+    path('documents/<str:document_id>/similar/', view(DocumentSimilarView), name='document-similar'),
+    path('documents/<str:document_id>/status/', view(DocumentStatusView), name='document-status'),
+    path('notifications/', view(NotificationView, 'AsyncNotificationView'), name='notifications'),
+    path('notifications/read/', view(NotificationBulkReadView), name='notification-bulk-read'),
+    path('notifications/unread-count/', view(NotificationUnreadCountView), name='notification-unread-count'),
+    path('notifications/stream/', view(NotificationStreamView, 'AsyncNotificationStreamView'), name='notification-stream'),
+    path('notifications/<int:notification_id>/', view(NotificationView, 'AsyncNotificationView'), name='notification-update'),
+    path('jobs/<str:job_id>/', view(JobDetailView), name='job-detail'),
+    path('timings/', view(TimingStatsView), name='timings'),
 ]
\ No newline at end of file
@@ -3,23 +3,50 @@ from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework import status
 from django.shortcuts import get_object_or_404
-from core.services.document_processor import DocumentProcessor
-from core.services.cnn_classifier import DocumentClassifier
-from core.models import Document, Classification, Notification
+from core.services.thumbnail_service import ThumbnailService
+from core.services.notification_feed import NotificationFeed, serialize_notification
+from core.services.search_index import DocumentSearchIndex
+from core.services.extraction_executor import ExtractionQueueFull
+from core.services.scheduler import Overloaded
+from core.services.job_queue import LeaseLost, worker_name
+from core.services.document_pipeline import DocumentPipeline, UPLOADER_FIELDS
+from core.services.archive_ingestor import ArchiveIngestor, ARCHIVE_EXTENSIONS
+from core.models import Document, DocumentEmbedding, Notification, ProcessingBatch, ProcessingJob
 import os
-import tempfile
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from django.conf import settings
 import pytesseract
 from pdf2image import convert_from_path
 import docx2txt
-from django.http import FileResponse
 from django.core.cache import cache
-from django.db import transaction
-from core.utils import get_processing_lock, release_processing_lock
+from django.core.exceptions import RequestDataTooBig, TooManyFilesSent
+from django.http import HttpResponse
+from django.urls import reverse
+from django.db import connections, transaction
+from django.db.models import Count, Max
+from django.utils.dateparse import parse_datetime
+from core.utils import read_process_write_bytes, hash_file
+from core.upload_handlers import StorageUploadHandler
+from core.profiling import span, histograms
+from core import metrics
+from api.file_serving import serve_file
 
-document_processor = DocumentProcessor()
-document_classifier = DocumentClassifier()  # Remove weights parameter since we're using transformers
+thumbnail_service = ThumbnailService()
+notification_feed = NotificationFeed()
+search_index = DocumentSearchIndex()
+document_pipeline = DocumentPipeline()
+embedding_index = document_pipeline.embedding_index
+archive_ingestor = ArchiveIngestor()
+# Batch uploads are processed here one batch at a time (in 'inline' mode)
+batch_runner = ThreadPoolExecutor(max_workers=1, thread_name_prefix='docbackend-batch')
+_job_sweeper = None
+_job_sweeper_lock = threading.Lock()
+
+ALLOWED_EXTENSIONS = ['.pdf', '.doc', '.docx', '.jpg', '.jpeg', '.png', '.tif', '.tiff', '.heic', '.heif']
 
 class DocumentProcessView(APIView):
     parser_classes = (MultiPartParser, FormParser)
@@ -43,202 +70,471 @@ class DocumentProcessView(APIView):
             }
         })
 
+    def initialize_request(self, request, *args, **kwargs):
+        # Stream the upload straight to its final location in MEDIA_ROOT; any
+        # other file fields go to Django's usual temporary handlers
+        self.upload_handler = StorageUploadHandler(request, 'file')
+        request.upload_handlers = [self.upload_handler, *request.upload_handlers]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if request.method == 'POST':
+            metrics.record_upload(getattr(self, 'file_type', None), response.status_code)
+        return super().finalize_response(request, response, *args, **kwargs)
+
     def post(self, request, *args, **kwargs):
-        temp_path = None
-        lock_id = None
+        uploaded_file = None
+        stored = False
+        writes_before = read_process_write_bytes()
         
         try:
-            # Input validation
-            if 'file' not in request.FILES:
+            # Input validation; the multipart body is streamed to disk on first access
+            with span('upload'):
+                has_file = 'file' in request.FILES
+            if not has_file:
                 return Response({'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
 
             uploaded_file = request.FILES['file']
             file_extension = os.path.splitext(uploaded_file.name)[1].lower()
-            allowed_extensions = ['.pdf', '.doc', '.docx', '.jpg', '.jpeg', '.png']
-            
+            metadata = {name: request.data.get(name, '') for name in UPLOADER_FIELDS}
+            if file_extension in ARCHIVE_EXTENSIONS:
+                self.file_type = 'zip'
+                return self._queue_archive(uploaded_file, metadata)
+            allowed_extensions = ALLOWED_EXTENSIONS
+
+            # Unknown extensions share one metrics label so clients can't inflate its cardinality
+            self.file_type = file_extension[1:] if file_extension in allowed_extensions else 'other'
             if file_extension not in allowed_extensions:
                 return Response({
                     'error': f'Unsupported file type. Allowed types: {", ".join(allowed_extensions)}'
                 }, status=status.HTTP_400_BAD_REQUEST)
 
-            # Generate unique IDs for processing
-            processing_id = str(uuid.uuid4())
-            document_id = str(uuid.uuid4())
-            
-            # Create temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_file:
-                for chunk in uploaded_file.chunks():
-                    temp_file.write(chunk)
-                temp_path = temp_file.name
-
-            # Try to acquire processing lock
-            if not get_processing_lock(processing_id, timeout=settings.PROCESSING_LOCK_TIMEOUT,
-                                    max_retries=settings.PROCESSING_LOCK_MAX_RETRIES,
-                                    retry_delay=settings.PROCESSING_LOCK_RETRY_DELAY):
+            # Record the stored upload as a job first: from here on it is the
+            # job's, and survives this worker dying mid-processing
+            if settings.PROCESSING_MODE == 'queue':
+                job = document_pipeline.jobs.enqueue(uploaded_file, self.file_type, metadata)
+                stored = True
+                return Response({
+                    **serialize_job(job),
+                    'upload_stats': self._upload_stats(uploaded_file, writes_before),
+                    'message': 'Document queued for processing'
+                }, status=status.HTTP_202_ACCEPTED)
+
+            job = document_pipeline.jobs.enqueue(uploaded_file, self.file_type, metadata, worker=worker_name())
+            stored = True
+            try:
+                result = document_pipeline.process(job)
+            except LeaseLost:
+                # Ran past its lease and another worker took the job over
+                job.refresh_from_db()
+                return Response({
+                    **serialize_job(job),
+                    'message': 'Document is being processed'
+                }, status=status.HTTP_202_ACCEPTED)
+            except (Overloaded, ExtractionQueueFull, ValueError):
+                raise
+            except Exception as e:
+                if job.status != 'queued':
+                    raise
+                print(f"Error processing document, will retry: {str(e)}")  # Log the error
                 return Response({
-                    "error": "System is busy processing another document. Please try again in a few moments."
-                }, status=status.HTTP_429_TOO_MANY_REQUESTS)
+                    **serialize_job(job),
+                    'message': 'Processing failed and will be retried'
+                }, status=status.HTTP_202_ACCEPTED)
 
-            lock_id = processing_id
+            return Response({
+                **result,
+                'job_id': job.job_id,
+                'upload_stats': self._upload_stats(uploaded_file, writes_before),
+                'message': 'Document processed and classified successfully'
+            }, status=status.HTTP_200_OK)
 
-            # Process document within transaction
-            with transaction.atomic():
-                try:
-                    # Extract text using DocumentProcessor
-                    extracted_text = document_processor.extract_text(temp_path)
-                    
-                    if not extracted_text or not extracted_text.strip():
-                        raise ValueError("No text could be extracted from the document")
-
-                    # Classify document using CNNClassifier
-                    classifications = cnn_classifier.classify(extracted_text)
-                    
-                    if not classifications or classifications == ["unknown"]:
-                        raise ValueError("Could not determine document type")
-
-                    # Create document record
-                    document = Document.objects.create(
-                        file_id=document_id,
-                        file_name=uploaded_file.name,
-                        file_type=file_extension[1:],
-                        file=uploaded_file,
-                        extracted_text=extracted_text,
-                        uploader_first_name=request.data.get('first_name', ''),
-                        uploader_last_name=request.data.get('last_name', ''),
-                        uploader_email=request.data.get('email', ''),
-                        purpose=request.data.get('purpose', ''),
-                        description=request.data.get('description', ''),
-                        processed=True,
-                        status='pending'
-                    )
+        except Overloaded as busy:
+            response = Response({
+                'error': 'Too many documents are waiting to be processed. Please try again shortly.',
+                'work_class': busy.work_class,
+                'estimated_wait': round(busy.wait, 1),
+                'retry_after': busy.retry_after
+            }, status=status.HTTP_429_TOO_MANY_REQUESTS)
+            response['Retry-After'] = str(busy.retry_after)
+            return response
+        except ExtractionQueueFull as busy:
+            response = Response({
+                'error': 'Too many documents are waiting to be processed. Please try again shortly.',
+                'queue_depth': busy.depth,
+                'retry_after': busy.retry_after
+            }, status=status.HTTP_429_TOO_MANY_REQUESTS)
+            response['Retry-After'] = str(busy.retry_after)
+            return response
+        except (ValueError, TooManyFilesSent, RequestDataTooBig) as ve:
+            return Response({
+                'error': str(ve)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            print(f"Error processing document: {str(e)}")  # Log the error
+            return Response({
+                'error': 'An error occurred while processing the document. Please try again.'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        finally:
+            # Rejected uploads, extra 'file' parts and those cut off by a
+            # failed parse must not linger in MEDIA_ROOT
+            self.upload_handler.discard(keep=[uploaded_file] if stored else [])
+
+    def _queue_archive(self, archive, metadata):
+        """Expand a zip archive into a batch of its supported files"""
+        members, rejected = archive_ingestor.expand(archive.temporary_file_path())
+        if not members:
+            return Response({
+                'error': 'The archive has no supported files',
+                'rejected': rejected
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            batch = queue_batch(members, rejected, metadata)
+        except BaseException:
+            discard_uploads(member for member, _ in members)
+            raise
+        return Response({
+            **serialize_batch(batch),
+            'message': f'{len(members)} documents from the archive queued for processing'
+        }, status=status.HTTP_202_ACCEPTED)
 
-                    # Save classifications
-                    for category in classifications:
-                        Classification.objects.create(
-                            document=document,
-                            category=category,
-                            confidence=1.0  # We'll implement actual confidence scores later
-                        )
+    def _upload_stats(self, uploaded_file, writes_before):
+        """Disk write amplification of this upload: bytes hitting disk per byte uploaded"""
+        disk_bytes = None
+        writes_after = read_process_write_bytes()
+        if writes_before is not None and writes_after is not None:
+            disk_bytes = writes_after - writes_before
+        written = disk_bytes if disk_bytes else uploaded_file.bytes_written
+        return {
+            'size': uploaded_file.size,
+            'bytes_written': uploaded_file.bytes_written,
+            'disk_write_bytes': disk_bytes,
+            'write_amplification': round(written / uploaded_file.size, 3) if uploaded_file.size else None,
+        }
 
-                    # Create notification
-                    notification = Notification.objects.create(
-                        document=document,
-                        type='upload',
-                        message=f"New document '{document.file_name}' uploaded by {document.uploader_first_name} {document.uploader_last_name}"
-                    )
+def filter_documents(params):
+    """Documents matching the list filters in ``params``, latest first"""
+    # Start with all documents
+    documents = Document.objects.prefetch_related('classifications')
 
-                    return Response({
-                        'document_id': document.file_id,
-                        'classifications': classifications,
-                        'extracted_text': extracted_text[:500] + '...' if len(extracted_text) > 500 else extracted_text,
-                        'file_type': file_extension[1:],
-                        'message': 'Document processed and classified successfully'
-                    }, status=status.HTTP_200_OK)
+    # Filter by classification if specified
+    classification = params.get('classification', None)
+    if classification:
+        documents = documents.filter(classifications__category=classification)
 
-                except ValueError as ve:
-                    # Rollback will happen automatically on ValueError
-                    raise
+    # Filter by status if specified
+    status_filter = params.get('status', None)
+    if status_filter:
+        documents = documents.filter(status=status_filter)
 
-        except ValueError as ve:
+    # Filter by extracted field, e.g. ?field=position:Teacher III
+    field_filter = params.get('field', None)
+    if field_filter:
+        name, _, value = field_filter.partition(':')
+        documents = documents.filter(extracted_fields__name=name, extracted_fields__value=value)
+
+    # Order by latest first
+    return documents.order_by('-uploaded_at')
+
+def serialize_document_summary(doc):
+    """List representation of a document; classifications must be prefetched"""
+    return {
+        'id': doc.id,
+        'file_name': doc.file_name,
+        'file_type': doc.file_type,
+        'uploaded_at': doc.uploaded_at,
+        'classifications': [c.category for c in doc.classifications.all()],
+        'description': doc.description,
+        'uploader_name': f"{doc.uploader_first_name} {doc.uploader_last_name}".strip(),
+        'status': doc.status
+    }
+
+def serialize_document_detail(document, fields):
+    """Detail representation of a document with its extracted ``{name: [values]}``"""
+    return {
+        'id': document.file_id,
+        'file_name': document.file_name,
+        'file_type': document.file_type,
+        'description': document.description,
+        'status': document.status,
+        'fields': fields
+    }
+
+def serialize_job(job):
+    return {
+        'job_id': job.job_id,
+        'status': job.status,
+        'attempts': job.attempts,
+        'document_id': job.file_id if job.status == 'succeeded' else None,
+        'status_url': reverse('job-detail', args=[job.job_id]),
+    }
+
+def run_batch(batch):
+    """Process an uploaded batch in this process; runs on batch_runner"""
+    try:
+        document_pipeline.run_batch(batch, worker_name())
+    except Exception as e:
+        print(f"Error processing batch {batch.batch_id}: {str(e)}")
+    finally:
+        connections.close_all()
+
+def sweep_jobs():
+    """
+    In 'inline' mode the web processes stand in for process_jobs: every
+    JOB_SWEEP_SECONDS each picks up the jobs that are due, i.e. retries of
+    failed attempts and uploads or batches whose process died mid-way
+    """
+    worker = worker_name()
+    while True:
+        time.sleep(settings.JOB_SWEEP_SECONDS)
+        try:
+            document_pipeline.run_due(worker)
+        except Exception as e:
+            print(f"Error processing due jobs: {str(e)}")
+        finally:
+            connections.close_all()
+
+def start_job_sweeper():
+    """Run sweep_jobs in the background; called by the WSGI and ASGI entry points"""
+    global _job_sweeper
+    if settings.PROCESSING_MODE != 'inline' or settings.JOB_SWEEP_SECONDS <= 0:
+        return
+    with _job_sweeper_lock:
+        if _job_sweeper is None:
+            _job_sweeper = threading.Thread(target=sweep_jobs, name='docbackend-job-sweeper', daemon=True)
+            _job_sweeper.start()
+
+def queue_batch(uploads, rejected, metadata):
+    """Record stored ``(uploaded_file, file_type)`` uploads as a new batch and start on it"""
+    batch = ProcessingBatch(batch_id=str(uuid.uuid4()), metadata=metadata, rejected=rejected)
+    with transaction.atomic():
+        batch.save()
+        document_pipeline.jobs.enqueue_many(uploads, metadata, batch=batch)
+    if settings.PROCESSING_MODE == 'inline':
+        batch_runner.submit(run_batch, batch)
+    return batch
+
+class BatchProcessView(APIView):
+    parser_classes = (MultiPartParser, FormParser)
+
+    def initialize_request(self, request, *args, **kwargs):
+        # Every file is streamed straight to its final location, as for single uploads
+        self.upload_handler = StorageUploadHandler(request, 'files')
+        request.upload_handlers = [self.upload_handler, *request.upload_handlers]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def post(self, request, *args, **kwargs):
+        """Queue many files (multipart ``files`` fields, zip archives expanded) for processing as one batch"""
+        uploaded_files = []
+        uploads, rejected = [], []
+        queued = []
+
+        try:
+            with span('upload'):
+                uploaded_files = request.FILES.getlist('files')
+            if not uploaded_files:
+                return Response({'error': 'No files provided'}, status=status.HTTP_400_BAD_REQUEST)
+
+            for uploaded_file in uploaded_files:
+                file_extension = os.path.splitext(uploaded_file.name)[1].lower()
+                if file_extension in ARCHIVE_EXTENSIONS:
+                    self._expand(uploaded_file, uploads, rejected)
+                elif file_extension in ALLOWED_EXTENSIONS:
+                    uploads.append((uploaded_file, file_extension[1:]))
+                    metrics.record_upload(file_extension[1:], status.HTTP_202_ACCEPTED)
+                else:
+                    rejected.append({'file_name': uploaded_file.name, 'error': 'Unsupported file type'})
+                    metrics.record_upload('other', status.HTTP_400_BAD_REQUEST)
+            if not uploads:
+                return Response({
+                    'error': f'No supported files. Allowed types: {", ".join(ALLOWED_EXTENSIONS + list(ARCHIVE_EXTENSIONS))}',
+                    'rejected': rejected
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            metadata = {name: request.data.get(name, '') for name in UPLOADER_FIELDS}
+            batch = queue_batch(uploads, rejected, metadata)
+            queued = [uploaded_file for uploaded_file, _ in uploads]
+            return Response(serialize_batch(batch), status=status.HTTP_202_ACCEPTED)
+
+        except TooManyFilesSent:
             return Response({
-                'error': str(ve)
+                'error': f'Too many files. At most {settings.BATCH_MAX_FILES} files can be sent per batch.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except RequestDataTooBig as e:
+            return Response({
+                'error': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
-            print(f"Error processing document: {str(e)}")  # Log the error
+            print(f"Error queueing batch: {str(e)}")  # Log the error
             return Response({
-                'error': 'An error occurred while processing the document. Please try again.'
+                'error': 'An error occurred while queueing the documents. Please try again.'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         finally:
-            # Clean up resources
-            if lock_id:
-                try:
-                    release_processing_lock(lock_id)
-                except Exception as e:
-                    print(f"Error releasing lock: {str(e)}")
-                    
-            if temp_path and os.path.exists(temp_path):
-                try:
-                    os.unlink(temp_path)
-                except Exception as e:
-                    print(f"Error removing temp file: {str(e)}")
+            # Queued files now belong to their jobs; nothing else (archives
+            # included) may linger in MEDIA_ROOT
+            self.upload_handler.discard(keep=queued)
+            discard_uploads([member for member, _ in uploads if member not in uploaded_files], keep=queued)
+
+    def _expand(self, archive, uploads, rejected):
+        """Add ``archive``'s members to ``uploads``, or the reason they can't be read to ``rejected``"""
+        try:
+            members, skipped = archive_ingestor.expand(archive.temporary_file_path())
+        except ValueError as e:
+            rejected.append({'file_name': archive.name, 'error': str(e)})
+            metrics.record_upload('zip', status.HTTP_400_BAD_REQUEST)
+            return
+        uploads.extend(members)
+        rejected.extend({**item, 'file_name': f"{archive.name}/{item['file_name']}"} for item in skipped)
+        for _, file_type in members:
+            metrics.record_upload(file_type, status.HTTP_202_ACCEPTED)
+
+def discard_uploads(uploaded_files, keep=()):
+    """Remove stored uploads other than ``keep``, closing those"""
+    for uploaded_file in uploaded_files:
+        try:
+            if uploaded_file in keep:
+                uploaded_file.close()
+            else:
+                uploaded_file.discard()
+        except Exception as e:
+            print(f"Error removing stored upload: {str(e)}")
+
+def serialize_batch(batch, since=None):
+    """
+    Progress of a batch and its jobs. With ``since`` (a previous response's
+    ``cursor``) only the jobs that finished after it are listed.
+    """
+    jobs = batch.jobs.order_by('id')
+    counts = dict.fromkeys((choice for choice, _ in ProcessingJob.STATUS_CHOICES), 0)
+    counts.update(jobs.values_list('status').annotate(jobs=Count('id')).order_by())
+    cursor = jobs.aggregate(cursor=Max('finished_at'))['cursor']
+    if since is not None:
+        jobs = jobs.filter(finished_at__gt=since)
+    return {
+        'batch_id': batch.batch_id,
+        'created_at': batch.created_at,
+        'total': sum(counts.values()),
+        'counts': counts,
+        'done': not counts['queued'] and not counts['running'],
+        'rejected': batch.rejected,
+        'cursor': cursor,
+        'jobs': [{
+            'job_id': job.job_id,
+            'file_name': job.file_name,
+            'status': job.status,
+            'attempts': job.attempts,
+            'document_id': job.file_id if job.status == 'succeeded' else None,
+            'classifications': (job.result or {}).get('classifications'),
+            'error': job.last_error or None,
+        } for job in jobs.only('job_id', 'file_name', 'status', 'attempts', 'file_id', 'result', 'last_error')],
+    }
+
+class BatchDetailView(APIView):
+    def get(self, request, batch_id):
+        """Poll a batch; pass the last response's cursor as ?since= to get only newly finished jobs"""
+        batch = ProcessingBatch.objects.filter(batch_id=batch_id).first()
+        if batch is None:
+            return Response({'error': 'Batch not found'}, status=status.HTTP_404_NOT_FOUND)
+        since = request.query_params.get('since')
+        if since is not None:
+            since = parse_datetime(since)
+            if since is None:
+                return Response({'error': 'since must be a cursor from an earlier response'},
+                                status=status.HTTP_400_BAD_REQUEST)
+        return Response(serialize_batch(batch, since))
 
 class DocumentListView(APIView):
     def get(self, request):
-        # Get filter parameters
-        classification = request.query_params.get('classification', None)
-        status_filter = request.query_params.get('status', None)
-        
-        # Start with all documents
-        documents = Document.objects.all()
-        
-        # Filter by classification if specified
-        if classification:
-            documents = documents.filter(classifications__category=classification)
+        documents = filter_documents(request.query_params)
+        return Response([serialize_document_summary(doc) for doc in documents])
+
+class DocumentSearchView(APIView):
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': 'Query parameter q is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), 100)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            results = search_index.search(query, limit=limit)
+        except ValueError as ve:
+            return Response({'error': str(ve)}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Filter by status if specified
-        if status_filter:
-            documents = documents.filter(status=status_filter)
+        return Response([{
+            'id': result['id'],
+            'file_id': result['file_id'],
+            'file_name': result['file_name'],
+            'file_type': result['file_type'],
+            'uploaded_at': result['uploaded_at'],
+            'status': result['status'],
+            'snippet': result['snippet'],
+            'rank': result['rank']
+        } for result in results])
 
-        # Order by latest first
-        documents = documents.order_by('-uploaded_at')
+class DocumentSimilarView(APIView):
+    def get(self, request, document_id):
+        """Documents whose text embeddings are closest to this one's"""
+        document = get_object_or_404(Document, file_id=document_id)
+        embedding = DocumentEmbedding.objects.filter(document=document).values_list('vector', flat=True).first()
+        if embedding is None:
+            return Response({'error': 'No embedding available for this document'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
 
+        neighbours = embedding_index.neighbours(np.frombuffer(bytes(embedding), dtype=np.float16),
+                                                k=limit, exclude_id=document.id)
+        similarity = dict(neighbours)
+        documents = Document.objects.filter(id__in=similarity).prefetch_related('classifications')
+        documents = sorted(documents, key=lambda doc: similarity[doc.id], reverse=True)
         return Response([{
-            'id': doc.id,
+            'id': doc.file_id,
             'file_name': doc.file_name,
-            'file_type': doc.file_type,
-            'uploaded_at': doc.uploaded_at,
+            'status': doc.status,
             'classifications': [c.category for c in doc.classifications.all()],
-            'description': doc.description,
-            'uploader_name': f"{doc.uploader_first_name} {doc.uploader_last_name}".strip(),
-            'status': doc.status
+            'similarity': round(similarity[doc.id], 4)
         } for doc in documents])
 
 class DocumentStatusView(APIView):
     def put(self, request, document_id):
         try:
-            document = get_object_or_404(Document, id=document_id)
-            
-            # Try to acquire lock with retries
-            if not get_processing_lock(document.id, timeout=10, max_retries=3, retry_delay=0.5):
+            new_status = request.data.get('status')
+            if new_status not in [choice[0] for choice in Document.STATUS_CHOICES]:
                 return Response(
-                    {"error": "Document is being processed. Please try again in a few moments."},
-                    status=status.HTTP_429_TOO_MANY_REQUESTS
+                    {'error': 'Invalid status value'}, 
+                    status=status.HTTP_400_BAD_REQUEST
                 )
-            
-            try:
-                with transaction.atomic():
-                    new_status = request.data.get('status')
-                    
-                    if new_status not in [choice[0] for choice in Document.STATUS_CHOICES]:
-                        return Response(
-                            {'error': 'Invalid status value'}, 
-                            status=status.HTTP_400_BAD_REQUEST
-                        )
-                    
-                    document.status = new_status
-                    document.save()
-                    
-                    # Create status change notification
-                    status_messages = {
-                        'in_review': 'is now under review',
-                        'approved': 'has been approved',
-                        'rejected': 'has been rejected'
-                    }
-                    
-                    if new_status in status_messages:
-                        Notification.objects.create(
-                            document=document,
-                            type='status_change',
-                            message=f"Document '{document.file_name}' {status_messages[new_status]}"
-                        )
-                    
-                    return Response({
-                        'id': document.id,
-                        'file_name': document.file_name,
-                        'status': document.status
-                    })
-            finally:
-                release_processing_lock(document.id)
+
+            with transaction.atomic():
+                # Concurrent updates of one document queue on its row instead of
+                # failing on a lock after fixed sleeps
+                document = get_object_or_404(Document.objects.select_for_update(), id=document_id)
+                document.status = new_status
+                document.save(update_fields=['status'])
+                
+                # Create status change notification
+                status_messages = {
+                    'in_review': 'is now under review',
+                    'approved': 'has been approved',
+                    'rejected': 'has been rejected'
+                }
+                
+                if new_status in status_messages:
+                    Notification.objects.create(
+                        document=document,
+                        type='status_change',
+                        message=f"Document '{document.file_name}' {status_messages[new_status]}"
+                    )
+                
+                return Response({
+                    'id': document.id,
+                    'file_name': document.file_name,
+                    'status': document.status
+                })
                 
         except Exception as e:
             return Response(
@@ -248,34 +544,155 @@ class DocumentStatusView(APIView):
 
 class NotificationView(APIView):
     def get(self, request):
-        notifications = Notification.objects.all().order_by('-created_at')[:50]  # Get last 50 notifications
-        return Response([{
-            'id': notif.id,
-            'type': notif.type,
-            'message': notif.message,
-            'created_at': notif.created_at,
-            'is_read': notif.is_read,
-            'document': {
-                'id': notif.document.id,
-                'file_name': notif.document.file_name,
-                'status': notif.document.status
-            }
-        } for notif in notifications])
+        since = request.query_params.get('since')
+        if since is None:
+            notifications = notification_feed.recent(50)  # Get last 50 notifications
+            return Response([serialize_notification(notif) for notif in notifications])
+
+        # Incremental feed: only notifications after the cursor, optionally long-polling
+        try:
+            cursor = int(since)
+            wait = min(float(request.query_params.get('wait', 0)), settings.NOTIFICATION_LONG_POLL_MAX_SECONDS)
+        except ValueError:
+            return Response({'error': 'since and wait must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if wait > 0:
+            notifications = notification_feed.poll(cursor, wait)
+        else:
+            notifications = notification_feed.since(cursor)
+        return Response([serialize_notification(notif) for notif in notifications])
     
     def put(self, request, notification_id):
-        notification = get_object_or_404(Notification, id=notification_id)
-        notification.is_read = True
-        notification.save()
+        # Single UPDATE of the one column, no SELECT + full-row save
+        if not Notification.objects.filter(id=notification_id).update(is_read=True):
+            return Response({'error': 'Notification not found'}, status=status.HTTP_404_NOT_FOUND)
         return Response({'status': 'success'})
 
+class NotificationBulkReadView(APIView):
+    def post(self, request):
+        """Mark many notifications read in one UPDATE, by id list or everything up to a cursor"""
+        ids = request.data.get('ids')
+        up_to = request.data.get('up_to')
+        unread = Notification.objects.filter(is_read=False)
+
+        try:
+            if ids is not None:
+                if hasattr(request.data, 'getlist'):
+                    # Form-encoded: ids=1&ids=2
+                    ids = request.data.getlist('ids')
+                if not isinstance(ids, list):
+                    raise TypeError("ids must be a list")
+                unread = unread.filter(id__in=[int(notif_id) for notif_id in ids])
+            elif up_to is not None:
+                unread = unread.filter(id__lte=int(up_to))
+            else:
+                return Response({'error': 'Provide either ids or up_to'}, status=status.HTTP_400_BAD_REQUEST)
+        except (TypeError, ValueError):
+            return Response({'error': 'ids and up_to must be notification ids'}, status=status.HTTP_400_BAD_REQUEST)
+
+        updated = unread.update(is_read=True)
+        return Response({'status': 'success', 'updated': updated})
+
+class NotificationUnreadCountView(APIView):
+    def get(self, request):
+        # Served from the partial index on unread notifications
+        return Response({'unread': Notification.objects.filter(is_read=False).count()})
+
+class MetricsView(APIView):
+    def get(self, request):
+        """Prometheus scrape endpoint, aggregated across worker processes"""
+        try:
+            body, content_type = metrics.render()
+        except ImportError:
+            return Response({'error': 'Metrics are unavailable: prometheus_client is not installed'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return HttpResponse(body, content_type=content_type)
+
+class TimingStatsView(APIView):
+    def get(self, request):
+        # Latency histograms of each pipeline stage and the upload queues, for this worker process only
+        return Response({'pid': os.getpid(), 'stages': histograms.snapshot(),
+                         'queues': document_pipeline.scheduler.snapshot(),
+                         'jobs': document_pipeline.jobs.counts()})
+
+class JobDetailView(APIView):
+    def get(self, request, job_id):
+        """Progress of a processing job, and its result once it succeeded"""
+        job = ProcessingJob.objects.filter(job_id=job_id).first()
+        if job is None:
+            return Response({'error': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            **serialize_job(job),
+            'file_name': job.file_name,
+            'created_at': job.created_at,
+            'started_at': job.started_at,
+            'finished_at': job.finished_at,
+            'duration': job.duration,
+            'retry_at': job.available_at if job.status == 'queued' and job.attempts else None,
+            'last_error': job.last_error or None,
+            'result': job.result,
+        })
+
+def ensure_content_hash(document):
+    """Hash documents stored before uploads were hashed, once"""
+    if not document.content_hash:
+        document.content_hash = hash_file(document.file.path)
+        document.save(update_fields=['content_hash'])
+
+class NotificationStreamView(APIView):
+    def perform_content_negotiation(self, request, force=False):
+        # EventSource clients accept only text/event-stream; explain in JSON anyway
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request):
+        """
+        Server-Sent Events are only served by the ASGI views (ASYNC_VIEWS):
+        here each open stream would hold a worker thread for its whole life
+        """
+        return Response({
+            'error': 'Notification streams need the ASGI server with ASYNC_VIEWS enabled. '
+                     'Long-poll notifications/?since=<id>&wait=<seconds> instead.'
+        }, status=status.HTTP_406_NOT_ACCEPTABLE)
+
 class DocumentFileView(APIView):
     def get(self, request, document_id):
         try:
             document = get_object_or_404(Document, file_id=document_id)
             if not document.file:
                 return Response({'error': 'No file available'}, status=status.HTTP_404_NOT_FOUND)
-            
-            return FileResponse(document.file, content_type=f'application/{document.file_type}')
+
+            ensure_content_hash(document)
+            return serve_file(request, document.file.path, document.file.name,
+                              document.file_name, document.content_hash)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class DocumentThumbnailView(APIView):
+    def get(self, request, document_id):
+        try:
+            document = get_object_or_404(Document, file_id=document_id)
+            if not document.file:
+                return Response({'error': 'No file available'}, status=status.HTTP_404_NOT_FOUND)
+
+            try:
+                page = int(request.query_params.get('page', 1))
+                size = int(request.query_params.get('size', settings.THUMBNAIL_SIZES[0]))
+            except ValueError:
+                return Response({'error': 'page and size must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+            if page < 1 or size not in settings.THUMBNAIL_SIZES:
+                return Response({
+                    'error': f'page must be >= 1 and size one of {", ".join(map(str, settings.THUMBNAIL_SIZES))}'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            ensure_content_hash(document)
+            try:
+                path = thumbnail_service.get_thumbnail(document.file.path, document.content_hash, page, size)
+            except ValueError as ve:
+                return Response({'error': str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+
+            stem = os.path.splitext(document.file_name)[0]
+            return serve_file(request, path, os.path.relpath(path, settings.MEDIA_ROOT),
+                              f"{stem}-p{page}-{size}.jpg", f"{document.content_hash}-p{page}-{size}")
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -283,12 +700,9 @@ class DocumentDetailView(APIView):
     def get(self, request, document_id):
         try:
             document = get_object_or_404(Document, file_id=document_id)
-            return Response({
-                'id': document.file_id,
-                'file_name': document.file_name,
-                'file_type': document.file_type,
-                'description': document.description,
-                'status': document.status
-            })
+            fields = {}
+            for field in document.extracted_fields.all():
+                fields.setdefault(field.name, []).append(field.value)
+            return Response(serialize_document_detail(document, fields))
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
@@ -0,0 +1,194 @@
+"""
+Load generator for a running docbackend server.
+
+Replays a mix of PDF/DOCX/image uploads alongside document-list and
+notification polling at fixed arrival rates (open loop, Poisson arrivals),
+stepping the upload rate through ``--upload-rates`` to draw a throughput
+curve. Each step reports achieved throughput, p50/p95/p99 latency and the
+error and 429 rates per operation.
+
+    python manage.py runserver --noreload &        # or gunicorn with N workers
+    python -m benchmarks.loadgen --url http://127.0.0.1:8000 --upload-rates 1,5,10,20
+
+Requires httpx.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+from benchmarks.synthetic import KINDS, make_corpus
+
+CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'png': 'image/png',
+}
+
+# Read traffic replayed next to uploads, as (name, path, weight)
+POLL_REQUESTS = (
+    ('list', '/api/documents/', 2),
+    ('notifications', '/api/notifications/', 3),
+    ('unread_count', '/api/notifications/unread-count/', 5),
+)
+
+
+class LoadGenerator:
+    def __init__(self, base_url, corpus, max_in_flight=200, timeout=120.0, seed=0):
+        self.base_url = base_url.rstrip('/')
+        self.corpus = corpus
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.samples = []
+
+    async def _request(self, operation, send):
+        start = time.perf_counter()
+        try:
+            response = await send()
+            status = response.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        self.samples.append((operation, start, time.perf_counter() - start, status))
+
+    def _upload(self, client, kind_weights):
+        kind = self.rng.choices(list(kind_weights), weights=list(kind_weights.values()))[0]
+        path = self.rng.choice(self.corpus[kind])
+        with open(path, 'rb') as f:
+            body = f.read()
+        files = {'file': (os.path.basename(path), body, CONTENT_TYPES[kind])}
+        data = {'first_name': 'Load', 'last_name': 'Test', 'purpose': 'load test'}
+        return f'upload_{kind}', lambda: client.post('/api/documents/process/', files=files, data=data)
+
+    def _poll(self, client):
+        name, path, _ = self.rng.choices(POLL_REQUESTS, weights=[weight for *_, weight in POLL_REQUESTS])[0]
+        return name, lambda: client.get(path)
+
+    async def _arrivals(self, rate, make_request, deadline, tasks, slots):
+        """Start requests at Poisson-distributed times until ``deadline``"""
+        if rate <= 0:
+            return
+        while True:
+            await asyncio.sleep(self.rng.expovariate(rate))
+            if time.perf_counter() >= deadline:
+                return
+            operation, send = make_request()
+            if slots.locked():
+                # The client itself is saturated; count it rather than silently slowing down
+                self.samples.append((operation, time.perf_counter(), 0.0, 'client_saturated'))
+                continue
+
+            async def run(operation=operation, send=send):
+                async with slots:
+                    await self._request(operation, send)
+
+            tasks.append(asyncio.create_task(run()))
+
+    async def run_step(self, upload_rate, poll_rate, duration, kind_weights):
+        """Drive one load step and return its samples"""
+        self.samples = []
+        slots = asyncio.Semaphore(self.max_in_flight)
+        tasks = []
+        limits = httpx.Limits(max_connections=self.max_in_flight, max_keepalive_connections=self.max_in_flight)
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=limits) as client:
+            deadline = time.perf_counter() + duration
+            await asyncio.gather(
+                self._arrivals(upload_rate, lambda: self._upload(client, kind_weights), deadline, tasks, slots),
+                self._arrivals(poll_rate, lambda: self._poll(client), deadline, tasks, slots),
+            )
+            # Let requests already in flight finish so slow responses are counted
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - (deadline - duration)
+        return self.samples, elapsed
+
+
+def summarize(samples, elapsed):
+    """Per-operation latency percentiles, throughput and error rates of one step"""
+    operations = {}
+    for operation, _, latency, status in samples:
+        operations.setdefault(operation, []).append((latency, status))
+    operations['all_uploads'] = [(latency, status) for operation, _, latency, status in samples
+                                 if operation.startswith('upload_')]
+
+    summary = {}
+    for operation, results in operations.items():
+        if not results:
+            continue
+        completed = [latency * 1000 for latency, status in results if isinstance(status, int)]
+        ok = sum(1 for _, status in results if isinstance(status, int) and status < 400)
+        summary[operation] = {
+            'requests': len(results),
+            'throughput_per_sec': round(ok / elapsed, 2),
+            'p50_ms': round(float(np.percentile(completed, 50)), 1) if completed else None,
+            'p95_ms': round(float(np.percentile(completed, 95)), 1) if completed else None,
+            'p99_ms': round(float(np.percentile(completed, 99)), 1) if completed else None,
+            'error_rate': round(1 - ok / len(results), 3),
+            'rate_429': round(sum(1 for _, status in results if status == 429) / len(results), 3),
+            'failures': sorted({str(status) for _, status in results
+                                if not isinstance(status, int) or status >= 400}),
+        }
+    return summary
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(','):
+        kind, _, weight = part.partition('=')
+        if kind.strip() not in KINDS:
+            raise SystemExit(f"Unknown document kind '{kind}'; expected one of {', '.join(KINDS)}")
+        weights[kind.strip()] = float(weight or 1)
+    return weights
+
+
+def print_step(upload_rate, summary):
+    print(f"\nupload rate {upload_rate}/s")
+    print(f"  {'operation':<16}{'req':>6}{'ok/s':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'err':>7}{'429':>7}")
+    for operation, stats in summary.items():
+        print(f"  {operation:<16}{stats['requests']:>6}{stats['throughput_per_sec']:>8}{stats['p50_ms']!s:>10}"
+              f"{stats['p95_ms']!s:>10}{stats['p99_ms']!s:>10}{stats['error_rate']:>7}{stats['rate_429']:>7}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Soak test the upload endpoint of a running server")
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--upload-rates', default='1,5,10,20',
+                        help="Comma-separated upload arrivals per second, one load step each")
+    parser.add_argument('--poll-rate', type=float, default=10.0,
+                        help="List/notification requests per second during every step")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds per step")
+    parser.add_argument('--mix', default='pdf=2,docx=2,png=1', help="Upload format weights")
+    parser.add_argument('--documents', type=int, default=5, help="Synthetic documents per class and format")
+    parser.add_argument('--max-in-flight', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write all steps as JSON to this path")
+    args = parser.parse_args(argv)
+
+    kind_weights = parse_mix(args.mix)
+    corpus_dir = tempfile.mkdtemp(prefix='docload-')
+    corpus = {kind: [] for kind in kind_weights}
+    for path, _ in make_corpus(corpus_dir, kinds=tuple(kind_weights), per_label=args.documents, seed=args.seed):
+        corpus[path.rsplit('.', 1)[1]].append(path)
+
+    generator = LoadGenerator(args.url, corpus, max_in_flight=args.max_in_flight, seed=args.seed)
+    steps = []
+    for upload_rate in (float(rate) for rate in args.upload_rates.split(',') if rate.strip()):
+        samples, elapsed = asyncio.run(generator.run_step(upload_rate, args.poll_rate, args.duration, kind_weights))
+        summary = summarize(samples, elapsed)
+        print_step(upload_rate, summary)
+        steps.append({'upload_rate': upload_rate, 'poll_rate': args.poll_rate,
+                      'duration': round(elapsed, 2), 'operations': summary})
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'url': args.url, 'mix': kind_weights, 'steps': steps}, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
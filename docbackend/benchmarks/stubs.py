@@ -0,0 +1,35 @@
+"""Stand-ins for the heavy models, so benchmarks can isolate the rest of the pipeline"""
+import re
+from core.profiling import span
+
+KEYWORDS = {
+    'academic credentials': ('academic credentials', 'authenticated', 'diploma'),
+    'certification': ('certification', 'earned', 'units'),
+    'transcript of records': ('transcript', 'weighted average', 'grades'),
+    'service record': ('service record', 'rendered services', 'appointment'),
+}
+
+class KeywordClassifier:
+    """Drop-in for DocumentClassifier that picks the label with the most keyword hits"""
+
+    def __init__(self):
+        self.candidate_labels = list(KEYWORDS)
+
+    def scores(self, text):
+        text = ' '.join(re.sub(r'[^a-z0-9]+', ' ', (text or '').lower()).split())
+        hits = {label: sum(text.count(word) for word in words) for label, words in KEYWORDS.items()}
+        total = sum(hits.values())
+        return {label: (count / total if total else 0.0) for label, count in hits.items()}
+
+    def _label(self, text):
+        scores = self.scores(text)
+        label = max(scores, key=scores.get)
+        return label if scores[label] > 0 else "unknown"
+
+    @span('classify')
+    def classify_text(self, text):
+        return self._label(text)
+
+    @span('classify')
+    def classify_texts(self, texts):
+        return [self._label(text) for text in texts]
@@ -0,0 +1,138 @@
+"""Synthetic credential documents for benchmarks, generated on the fly"""
+import os
+import random
+import textwrap
+import docx
+from PIL import Image, ImageDraw, ImageFont
+
+KINDS = ('pdf', 'docx', 'png')
+
+FIRST_NAMES = ('Juan', 'Maria', 'Jose', 'Ana', 'Pedro', 'Rosa', 'Carlos', 'Liza', 'Ramon', 'Elena')
+LAST_NAMES = ('Dela Cruz', 'Santos', 'Reyes', 'Garcia', 'Mendoza', 'Bautista', 'Villanueva', 'Ramos')
+SCHOOLS = ('University of the Philippines', 'College of Saint Benilde', 'Institute of Technology Manila',
+           'University of Santo Tomas')
+DEGREES = ('Bachelor of Science in Education', 'Bachelor of Arts in English', 'Master of Arts in Teaching',
+           'Bachelor of Elementary Education')
+POSITIONS = ('Teacher I', 'Teacher III', 'Master Teacher II', 'Head Teacher I', 'Principal I')
+MONTHS = ('January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September',
+          'October', 'November', 'December')
+
+# Sentences per classifier label; each document draws a random subset so
+# consecutive uploads are not near-duplicates of each other
+TEMPLATES = {
+    'academic credentials': (
+        "Authenticated copies of academic credentials of {name}.",
+        "This is to certify that the attached diploma and transcript are true copies of the originals.",
+        "{name} graduated with the degree of {degree} from the {school} on {date}.",
+        "The documents were authenticated by the Office of the Registrar.",
+        "Issued upon the request of the graduate for employment purposes.",
+        "Verified against the records on file by the registrar.",
+    ),
+    'certification': (
+        "Certification of earned units.",
+        "This is to certify that {name} has earned {units} units in {degree} at the {school}.",
+        "The units were completed during the school year ending {date}.",
+        "This certification is issued for reclassification and promotion purposes.",
+        "Certified correct by the Dean of the Graduate School.",
+        "Not valid without the seal of the institution.",
+    ),
+    'transcript of records': (
+        "Official transcript of records.",
+        "Name: {name}",
+        "Degree: {degree}, {school}.",
+        "General weighted average: {gpa}",
+        "Subjects, grades and credits earned are listed below for each semester.",
+        "Date of graduation: {date}.",
+        "Entrance data and records of preliminary education are on file.",
+    ),
+    'service record': (
+        "Service record.",
+        "Name: {name}",
+        "This is to certify that the employee named above actually rendered services in this office.",
+        "Position: {position}",
+        "Appointment status permanent, salary grade 11, station Division of City Schools, from {date}.",
+        "Leave of absence without pay: none.",
+        "Issued in compliance with Executive Order No. 54 dated {date}.",
+    ),
+}
+
+LABELS = tuple(TEMPLATES)
+
+def synthetic_text(label, rng):
+    """Text for a document of class ``label``, varied by ``rng``"""
+    values = {
+        'name': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        'school': rng.choice(SCHOOLS),
+        'degree': rng.choice(DEGREES),
+        'position': rng.choice(POSITIONS),
+        'date': f"{rng.choice(MONTHS)} {rng.randint(1, 28)}, {rng.randint(1995, 2024)}",
+        'units': rng.choice((18, 24, 36, 42)),
+        'gpa': f"{rng.uniform(1.0, 2.5):.2f}",
+    }
+    sentences = TEMPLATES[label]
+    # The first sentence names the document, as real headers do
+    chosen = [sentences[0]] + rng.sample(sentences[1:], k=max(2, len(sentences) - 2))
+    # Record numbers keep otherwise similar documents apart
+    chosen.append(f"Control number {rng.randint(10 ** 7, 10 ** 8)}, series of {rng.randint(1995, 2024)}.")
+    return '\n'.join(sentence.format(**values) for sentence in chosen)
+
+def write_docx(path, text):
+    document = docx.Document()
+    for line in text.split('\n'):
+        document.add_paragraph(line)
+    document.save(path)
+
+def _pdf_escape(line):
+    return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def write_pdf(path, text):
+    """Single-page PDF with a real text layer, written without extra dependencies"""
+    lines = [wrapped for line in text.split('\n') for wrapped in textwrap.wrap(line, 90) or ['']]
+    content = 'BT /F1 11 Tf 14 TL 72 720 Td ' + ' '.join(f'({_pdf_escape(line)}) Tj T*' for line in lines) + ' ET'
+    objects = [
+        '<< /Type /Catalog /Pages 2 0 R >>',
+        '<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        '<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+        '/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>',
+        '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+        f'<< /Length {len(content)} >>\nstream\n{content}\nendstream',
+    ]
+    body = b'%PDF-1.4\n'
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(body))
+        body += f'{number} 0 obj\n{obj}\nendobj\n'.encode('latin-1')
+    xref = len(body)
+    body += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode()
+    body += ''.join(f'{offset:010d} 00000 n \n' for offset in offsets).encode()
+    body += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode()
+    with open(path, 'wb') as f:
+        f.write(body)
+
+def write_image(path, text):
+    """Letter-size page at 200 dpi with the text rendered on it, like a clean scan"""
+    image = Image.new('L', (1700, 2200), 255)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=32)
+    y = 200
+    for line in text.split('\n'):
+        for wrapped in textwrap.wrap(line, 70) or ['']:
+            draw.text((150, y), wrapped, fill=0, font=font)
+            y += 48
+        y += 16
+    image.save(path)
+
+WRITERS = {'pdf': write_pdf, 'docx': write_docx, 'png': write_image}
+
+def make_document(directory, kind, label, index, seed=0):
+    """Write one synthetic document and return its path; same arguments give the same file"""
+    rng = random.Random(f"{seed}-{kind}-{label}-{index}")
+    path = os.path.join(directory, f"{label.replace(' ', '-')}-{index}.{kind}")
+    WRITERS[kind](path, synthetic_text(label, rng))
+    return path
+
+def make_corpus(directory, kinds=KINDS, per_label=2, seed=0):
+    """``[(path, label)]`` with ``per_label`` documents of every label in every format"""
+    os.makedirs(directory, exist_ok=True)
+    return [(make_document(directory, kind, label, index, seed), label)
+            for index in range(per_label) for kind in kinds for label in LABELS]
@@ -0,0 +1,274 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+
+from core.utils import read_peak_rss, reset_peak_rss
+
+# Metrics compared against a baseline, and whether higher values are worse
+COMPARED_METRICS = {
+    'p50_ms': True,
+    'p95_ms': True,
+    'queries': True,
+    'peak_rss_bytes': True,
+    'docs_per_sec': False,
+}
+
+# Latency changes smaller than this are noise at benchmark sample sizes
+MIN_LATENCY_DELTA_MS = 5.0
+
+
+def _percentile(values, q):
+    return round(float(np.percentile(values, q)), 2) if values else None
+
+
+def _parse_server_timing(header):
+    """``{stage: milliseconds}`` from a Server-Timing header"""
+    stages = {}
+    for metric in filter(None, (part.strip() for part in (header or '').split(','))):
+        name, _, params = metric.partition(';')
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip() == 'dur':
+                stages[name] = float(value)
+    return stages
+
+
+class Command(BaseCommand):
+    help = ("Benchmark the document pipeline in-process on synthetic documents: per-stage latency, "
+            "throughput under concurrency, peak RSS and queries per endpoint")
+    # The URL checks import the views, which would load the classifier before
+    # --stub-classifier can swap it out
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=8,
+                            help="Requests per endpoint and per concurrent client")
+        parser.add_argument('--concurrency', default='1,4,8',
+                            help="Comma-separated numbers of concurrent upload clients")
+        parser.add_argument('--kinds', default='pdf,docx,png',
+                            help="Comma-separated synthetic document formats to upload")
+        parser.add_argument('--stub-classifier', action='store_true',
+                            help="Use a keyword classifier instead of BART and skip embeddings")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Write the results as JSON to this path")
+        parser.add_argument('--save-baseline', help="Write the results as the new baseline to this path")
+        parser.add_argument('--compare', help="Fail if results regress against this baseline JSON")
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help="Allowed relative regression against the baseline (default 0.25)")
+
+    def handle(self, *args, **options):
+        from benchmarks.synthetic import make_corpus
+
+        workdir = tempfile.mkdtemp(prefix='docbench-')
+        self._configure(workdir, options)
+        setup_test_environment()
+        old_name = self._create_database(workdir)
+        try:
+            kinds = [kind.strip() for kind in options['kinds'].split(',') if kind.strip()]
+            corpus = make_corpus(os.path.join(workdir, 'corpus'), kinds=kinds,
+                                 per_label=max(1, options['iterations']), seed=options['seed'])
+
+            results = {
+                'meta': {
+                    'iterations': options['iterations'],
+                    'kinds': kinds,
+                    'classifier': settings.DOCUMENT_CLASSIFIER,
+                    'embeddings': settings.EMBEDDINGS_ENABLED,
+                    'database': connection.vendor,
+                    'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                },
+                'endpoints': self._benchmark_endpoints(corpus, kinds, options['iterations']),
+                'throughput': self._benchmark_throughput(
+                    corpus, [int(level) for level in options['concurrency'].split(',') if level.strip()],
+                    options['iterations']),
+            }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        self._report(results)
+        for path in filter(None, (options['output'], options['save_baseline'])):
+            with open(path, 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Wrote {path}")
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            regressions = self._compare(baseline, results, options['threshold'])
+            if regressions:
+                raise CommandError("Performance regressions against baseline:\n  " + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regressions against baseline"))
+
+    def _configure(self, workdir, options):
+        """Keep files, caches and models out of the real deployment's way"""
+        settings.MEDIA_ROOT = os.path.join(workdir, 'media')
+        settings.OCR_CACHE_DIR = os.path.join(workdir, 'ocr_cache')
+        settings.THUMBNAIL_CACHE_DIR = os.path.join(workdir, 'thumbnails')
+        settings.PROFILE_SAMPLE_RATE = 0.0
+        settings.SERVER_TIMING_HEADER = True
+        # Every upload should run the full pipeline rather than reuse an earlier label
+        settings.NEAR_DUPLICATE_REUSE_CLASSIFICATION = False
+        if 'testserver' not in settings.ALLOWED_HOSTS and '*' not in settings.ALLOWED_HOSTS:
+            settings.ALLOWED_HOSTS = list(settings.ALLOWED_HOSTS) + ['testserver']
+        if options['stub_classifier']:
+            settings.DOCUMENT_CLASSIFIER = 'benchmarks.stubs.KeywordClassifier'
+            settings.EMBEDDINGS_ENABLED = False
+
+    def _create_database(self, workdir):
+        """Fresh test database; on SQLite a file, so concurrent clients share it"""
+        if connection.vendor == 'sqlite':
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+            connection.settings_dict.setdefault('OPTIONS', {}).setdefault('timeout', 30)
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        return old_name
+
+    def _measure(self, client, requests):
+        """Run ``requests`` (callables taking a client) sequentially and summarize them"""
+        latencies, statuses, stages = [], {}, {}
+        if requests:
+            # Unmeasured warm-up, so lazy imports and first-use caches don't skew small samples
+            requests[0](client)
+        reset_peak_rss()
+        with CaptureQueriesContext(connection) as queries:
+            for make_request in requests:
+                start = time.perf_counter()
+                response = make_request(client)
+                if hasattr(response, 'streaming_content'):
+                    b''.join(response.streaming_content)
+                latencies.append((time.perf_counter() - start) * 1000)
+                statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+                for stage, duration in _parse_server_timing(response.get('Server-Timing')).items():
+                    stages.setdefault(stage, []).append(duration)
+
+        return {
+            'count': len(latencies),
+            'p50_ms': _percentile(latencies, 50),
+            'p95_ms': _percentile(latencies, 95),
+            'mean_ms': round(float(np.mean(latencies)), 2) if latencies else None,
+            'statuses': statuses,
+            'errors': sum(count for code, count in statuses.items() if int(code) >= 400),
+            'queries': round(len(queries) / max(1, len(latencies)), 2),
+            'peak_rss_bytes': read_peak_rss(),
+            'stages_ms': {stage: round(float(np.mean(values)), 2) for stage, values in stages.items()},
+        }
+
+    def _upload(self, path):
+        def request(client):
+            with open(path, 'rb') as f:
+                return client.post('/api/documents/process/', {
+                    'file': f, 'first_name': 'Bench', 'last_name': 'Mark', 'purpose': 'benchmark'})
+        return request
+
+    def _benchmark_endpoints(self, corpus, kinds, iterations):
+        from django.test import Client
+        from core.models import Document
+
+        client = Client()
+        endpoints = {}
+        for kind in kinds:
+            paths = [path for path, _ in corpus if path.endswith(f'.{kind}')][:iterations]
+            endpoints[f'upload_{kind}'] = self._measure(client, [self._upload(path) for path in paths])
+            self.stdout.write(f"upload_{kind}: {endpoints[f'upload_{kind}']['p50_ms']} ms p50")
+
+        document = Document.objects.order_by('id').first()
+        reads = {
+            'list': lambda c: c.get('/api/documents/'),
+            'search': lambda c: c.get('/api/documents/search/', {'q': 'certify'}),
+            'notifications': lambda c: c.get('/api/notifications/'),
+            'unread_count': lambda c: c.get('/api/notifications/unread-count/'),
+        }
+        if document is not None:
+            reads['detail'] = lambda c: c.get(f'/api/documents/{document.file_id}/')
+            reads['file'] = lambda c: c.get(f'/api/documents/{document.file_id}/file/')
+            if settings.EMBEDDINGS_ENABLED:
+                reads['similar'] = lambda c: c.get(f'/api/documents/{document.file_id}/similar/')
+
+        for name, make_request in reads.items():
+            endpoints[name] = self._measure(client, [make_request] * iterations)
+            self.stdout.write(f"{name}: {endpoints[name]['p50_ms']} ms p50")
+        return endpoints
+
+    def _benchmark_throughput(self, corpus, levels, iterations):
+        from django.test import Client
+
+        # Levels reuse the corpus; with classification reuse off, repeats still run the whole pipeline
+        throughput = {}
+        for level in levels:
+            latencies, errors = [], []
+            lock = threading.Lock()
+
+            def client_run(worker):
+                client = Client()
+                try:
+                    for index in range(iterations):
+                        path, _ = corpus[(worker * iterations + index) % len(corpus)]
+                        start = time.perf_counter()
+                        response = self._upload(path)(client)
+                        with lock:
+                            latencies.append((time.perf_counter() - start) * 1000)
+                            if response.status_code >= 400:
+                                errors.append(response.status_code)
+                finally:
+                    connections.close_all()
+
+            reset_peak_rss()
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=level) as executor:
+                list(executor.map(client_run, range(level)))
+            elapsed = time.perf_counter() - start
+
+            throughput[str(level)] = {
+                'requests': len(latencies),
+                'docs_per_sec': round(len(latencies) / elapsed, 2) if elapsed else None,
+                'p50_ms': _percentile(latencies, 50),
+                'p95_ms': _percentile(latencies, 95),
+                'error_rate': round(len(errors) / max(1, len(latencies)), 3),
+                'peak_rss_bytes': read_peak_rss(),
+            }
+            self.stdout.write(f"{level} clients: {throughput[str(level)]['docs_per_sec']} docs/s")
+        return throughput
+
+    def _report(self, results):
+        self.stdout.write('')
+        self.stdout.write(f"{'endpoint':<16}{'p50 ms':>10}{'p95 ms':>10}{'queries':>9}{'errors':>8}{'peak RSS MB':>13}")
+        for name, stats in results['endpoints'].items():
+            rss = stats['peak_rss_bytes'] / 2 ** 20 if stats['peak_rss_bytes'] else 0
+            self.stdout.write(f"{name:<16}{stats['p50_ms']!s:>10}{stats['p95_ms']!s:>10}"
+                              f"{stats['queries']:>9}{stats['errors']:>8}{rss:>13.1f}")
+        self.stdout.write('')
+        self.stdout.write(f"{'clients':<16}{'docs/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+        for level, stats in results['throughput'].items():
+            self.stdout.write(f"{level:<16}{stats['docs_per_sec']!s:>10}{stats['p50_ms']!s:>10}"
+                              f"{stats['p95_ms']!s:>10}{stats['error_rate']:>8}")
+
+    def _compare(self, baseline, results, threshold):
+        """Descriptions of every compared metric that regressed past ``threshold``"""
+        regressions = []
+        for section in ('endpoints', 'throughput'):
+            for name, stats in results.get(section, {}).items():
+                old_stats = baseline.get(section, {}).get(name)
+                if not old_stats:
+                    continue
+                for metric, higher_is_worse in COMPARED_METRICS.items():
+                    old, new = old_stats.get(metric), stats.get(metric)
+                    if not old or new is None:
+                        continue
+                    change = (new - old) / old if higher_is_worse else (old - new) / old
+                    if metric.endswith('_ms') and abs(new - old) < MIN_LATENCY_DELTA_MS:
+                        continue
+                    if change > threshold:
+                        regressions.append(f"{section}.{name}.{metric}: {old} -> {new} ({change:+.0%})")
+        return regressions
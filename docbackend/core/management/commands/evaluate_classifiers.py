@@ -0,0 +1,261 @@
+import json
+import os
+import pickle
+import re
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services.document_processor import DocumentProcessor
+from core.services.field_extractor import LABEL_CLASSES
+from core.utils import read_peak_rss, read_rss, reset_peak_rss
+
+DEFAULT_DOCS_DIR = os.path.join(settings.BASE_DIR, 'test_docs')
+CNN_MODEL_DIR = os.path.join(settings.BASE_DIR, 'ml_models', 'weights')
+
+# Trainer classes -> API labels; the zero-shot labels count diplomas as certifications
+CLASS_LABELS = {document_class: label for label, document_class in LABEL_CLASSES.items()}
+CLASS_LABELS['diploma'] = 'certification'
+
+
+def label_from_filename(filename):
+    """
+    Expected label of a test document, derived from its file name the way
+    DocumentCNNTrainer._get_label_from_filename does (that module needs
+    TensorFlow just to import).
+    """
+    filename = filename.lower()
+    if 'academic' in filename or 'credentials' in filename:
+        document_class = 'academic_credentials'
+    elif 'certification' in filename or 'earned-units' in filename:
+        document_class = 'certification'
+    elif 'tor' in filename or 'transcript' in filename:
+        document_class = 'transcript'
+    elif 'service' in filename:
+        document_class = 'service_record'
+    elif 'diploma' in filename or 'ctc-diploma' in filename:
+        document_class = 'diploma'
+    else:
+        return None
+    return CLASS_LABELS[document_class]
+
+
+class KerasCNNClassifier:
+    """The model trained by train_cnn_model.py, loaded from ml_models/weights"""
+
+    def __init__(self, model_dir=CNN_MODEL_DIR):
+        import tensorflow as tf
+        from core.services.document_feature_extractor import DocumentFeatureExtractor
+
+        model_path = os.path.join(model_dir, 'cnn_model.keras')
+        preprocessing_path = os.path.join(model_dir, 'preprocessing.pkl')
+        for path in (model_path, preprocessing_path):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"{path} not found; train it with train_cnn_model.py")
+
+        self.model = tf.keras.models.load_model(model_path)
+        with open(preprocessing_path, 'rb') as f:
+            preprocessing = pickle.load(f)
+        self.tokenizer = preprocessing['tokenizer']
+        self.label_encoder = preprocessing['label_encoder']
+        self.feature_scaler = preprocessing['feature_scaler']
+        self.feature_extractor = DocumentFeatureExtractor()
+        self.max_length = self.model.inputs[0].shape[1]
+
+    def classify_file(self, file_path, text):
+        import numpy as np
+        from tensorflow.keras.preprocessing.sequence import pad_sequences
+
+        # Same preprocessing and features as DocumentCNNTrainer.prepare_data
+        text = re.sub(r'\.+', '.', re.sub(r'\s+', ' ', re.sub(r'[^a-z0-9\s.,!?-]', ' ', text.lower()))).strip()
+        features = self.feature_extractor.normalize_features(self.feature_extractor.extract_features(text, file_path))
+        feature_list = [value for _, value in sorted(features.items()) if isinstance(value, (int, float))]
+        sequences = pad_sequences(self.tokenizer.texts_to_sequences([text]), maxlen=self.max_length)
+        prediction = self.model.predict(
+            [sequences, self.feature_scaler.transform(np.array([feature_list]))], verbose=0)
+        document_class = self.label_encoder.inverse_transform([int(np.argmax(prediction[0]))])[0]
+        return CLASS_LABELS.get(document_class, document_class)
+
+
+class CascadeClassifier:
+    """Keyword classifier when it is confident, zero-shot BART otherwise"""
+
+    def __init__(self, min_keyword_score=0.6):
+        from benchmarks.stubs import KeywordClassifier
+        from core.services.cnn_classifier import DocumentClassifier
+
+        self.keywords = KeywordClassifier()
+        self.fallback = DocumentClassifier()
+        self.min_keyword_score = min_keyword_score
+        self.fallbacks = 0
+
+    def classify_text(self, text):
+        scores = self.keywords.scores(text)
+        label = max(scores, key=scores.get)
+        if scores[label] >= self.min_keyword_score:
+            return label
+        self.fallbacks += 1
+        return self.fallback.classify_text(text)
+
+
+def _text_backend(factory):
+    def load():
+        classifier = factory()
+        return classifier, lambda path, text: classifier.classify_text(text)
+    return load
+
+
+def _load_cnn():
+    classifier = KerasCNNClassifier()
+    return classifier, classifier.classify_file
+
+
+def _import(path):
+    from django.utils.module_loading import import_string
+    return lambda: import_string(path)()
+
+
+BACKENDS = {
+    'zero-shot': _text_backend(_import('core.services.cnn_classifier.DocumentClassifier')),
+    'quantized': _text_backend(_import('core.services.cnn_classifier.QuantizedDocumentClassifier')),
+    'cnn': _load_cnn,
+    'keyword': _text_backend(_import('benchmarks.stubs.KeywordClassifier')),
+    'cascade': _text_backend(CascadeClassifier),
+}
+
+
+class Command(BaseCommand):
+    help = ("Compare classifier backends on labelled documents: accuracy, per-class F1, "
+            "docs/sec and memory, running each backend once per document")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--docs-dir', default=DEFAULT_DOCS_DIR,
+                            help="Labelled documents; labels come from the file names")
+        parser.add_argument('--backends', default=','.join(BACKENDS),
+                            help=f"Comma-separated backends out of {', '.join(BACKENDS)}")
+        parser.add_argument('--synthetic', type=int, default=0,
+                            help="Also evaluate this many synthetic PDF/DOCX documents per class")
+        parser.add_argument('--output', help="Write the results as JSON to this path")
+        parser.add_argument('--compare', help="Fail if accuracy drops against this earlier --output")
+        parser.add_argument('--max-accuracy-drop', type=float, default=0.0,
+                            help="Allowed absolute accuracy drop against --compare (default 0)")
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options['backends'].split(',') if name.strip()]
+        unknown = [name for name in names if name not in BACKENDS]
+        if unknown:
+            raise CommandError(f"Unknown backends: {', '.join(unknown)}")
+
+        samples = self._load_samples(options['docs_dir'], options['synthetic'])
+        if not samples:
+            raise CommandError("No labelled documents to evaluate")
+        self.stdout.write(f"Evaluating {len(samples)} documents")
+
+        results = {}
+        for name in names:
+            results[name] = self._evaluate(name, samples)
+        self._report(results)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Wrote {options['output']}")
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            drops = [f"{name}: {baseline[name]['accuracy']} -> {stats['accuracy']}"
+                     for name, stats in results.items()
+                     if stats.get('accuracy') is not None and baseline.get(name, {}).get('accuracy') is not None
+                     and baseline[name]['accuracy'] - stats['accuracy'] > options['max_accuracy_drop']]
+            if drops:
+                raise CommandError("Accuracy dropped against baseline:\n  " + '\n  '.join(drops))
+            self.stdout.write(self.style.SUCCESS("No accuracy drops against baseline"))
+
+    def _load_samples(self, docs_dir, synthetic):
+        """``[(path, text, label)]``; text is extracted once and shared by every backend"""
+        paths = [(os.path.join(docs_dir, name), label_from_filename(name))
+                 for name in sorted(os.listdir(docs_dir))] if os.path.isdir(docs_dir) else []
+        if synthetic:
+            from benchmarks.synthetic import make_corpus
+            paths += make_corpus(tempfile.mkdtemp(prefix='doceval-'), kinds=('pdf', 'docx'), per_label=synthetic)
+
+        processor = DocumentProcessor()
+        samples = []
+        for path, label in paths:
+            if label is None:
+                self.stdout.write(f"Skipping {os.path.basename(path)}: no label in its name")
+                continue
+            try:
+                samples.append((path, processor.extract_text(path), label))
+            except ValueError as e:
+                self.stdout.write(f"Skipping {os.path.basename(path)}: {e}")
+        return samples
+
+    def _evaluate(self, name, samples):
+        rss_before = read_rss()
+        start = time.perf_counter()
+        try:
+            classifier, predict = BACKENDS[name]()
+        except Exception as e:
+            self.stdout.write(self.style.WARNING(f"{name}: unavailable ({e})"))
+            return {'unavailable': str(e)}
+        load_seconds = time.perf_counter() - start
+        rss_loaded = read_rss()
+
+        reset_peak_rss()
+        predictions = []
+        start = time.perf_counter()
+        for path, text, _ in samples:
+            predictions.append(predict(path, text))
+        elapsed = time.perf_counter() - start
+
+        labels = [label for _, _, label in samples]
+        stats = {
+            'accuracy': round(sum(p == l for p, l in zip(predictions, labels)) / len(labels), 4),
+            'per_class': self._per_class(labels, predictions),
+            'docs_per_sec': round(len(samples) / elapsed, 2) if elapsed else None,
+            'load_seconds': round(load_seconds, 2),
+            'model_rss_bytes': rss_loaded - rss_before if rss_loaded is not None and rss_before is not None else None,
+            'peak_rss_bytes': read_peak_rss(),
+            'mistakes': [{'file': os.path.basename(path), 'expected': label, 'predicted': prediction}
+                         for (path, _, label), prediction in zip(samples, predictions) if prediction != label],
+        }
+        if isinstance(classifier, CascadeClassifier):
+            stats['fallback_rate'] = round(classifier.fallbacks / len(samples), 4)
+        self.stdout.write(f"{name}: accuracy {stats['accuracy']}, {stats['docs_per_sec']} docs/s")
+        return stats
+
+    def _per_class(self, labels, predictions):
+        per_class = {}
+        for label in sorted(set(labels)):
+            true_positive = sum(p == label and l == label for p, l in zip(predictions, labels))
+            predicted = sum(p == label for p in predictions)
+            actual = sum(l == label for l in labels)
+            precision = true_positive / predicted if predicted else 0.0
+            recall = true_positive / actual if actual else 0.0
+            f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+            per_class[label] = {'precision': round(precision, 3), 'recall': round(recall, 3),
+                                'f1': round(f1, 3), 'support': actual}
+        return per_class
+
+    def _report(self, results):
+        available = {name: stats for name, stats in results.items() if 'unavailable' not in stats}
+        if not available:
+            return
+        self.stdout.write('')
+        header = f"{'':<24}" + ''.join(f"{name:>14}" for name in available)
+        self.stdout.write(header)
+        rows = [
+            ('accuracy', lambda s: s['accuracy']),
+            ('docs/sec', lambda s: s['docs_per_sec']),
+            ('load seconds', lambda s: s['load_seconds']),
+            ('model RSS MB', lambda s: round(s['model_rss_bytes'] / 2 ** 20, 1) if s['model_rss_bytes'] is not None else None),
+            ('peak RSS MB', lambda s: round(s['peak_rss_bytes'] / 2 ** 20, 1) if s['peak_rss_bytes'] else None),
+        ]
+        classes = sorted({label for stats in available.values() for label in stats['per_class']})
+        rows += [(f"F1 {label}", lambda s, label=label: s['per_class'].get(label, {}).get('f1')) for label in classes]
+        for title, value in rows:
+            self.stdout.write(f"{title:<24}" + ''.join(f"{value(stats)!s:>14}" for stats in available.values()))
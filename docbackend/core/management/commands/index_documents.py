@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.models import Document
+from core.services.embedding_index import EmbeddingIndex, TextEmbedder
+from core.services.near_duplicate import NearDuplicateDetector
+
+
+class Command(BaseCommand):
+    help = "Build near-duplicate signatures and embeddings for documents that don't have them yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--skip-embeddings', action='store_true',
+                            help="Only build near-duplicate signatures")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        documents = Document.objects.exclude(extracted_text='').only('id', 'extracted_text')
+
+        detector = NearDuplicateDetector()
+        self._index(documents.filter(signature__isnull=True), batch_size, 'signatures',
+                    lambda document: detector.index(document, detector.signature(document.extracted_text)))
+
+        if settings.EMBEDDINGS_ENABLED and not options['skip_embeddings']:
+            embedder, index = TextEmbedder(), EmbeddingIndex()
+            self._index(documents.filter(embedding__isnull=True), batch_size, 'embeddings',
+                        lambda document: index.add(document, embedder.embed(document.extracted_text)))
+
+    def _index(self, pending, batch_size, what, index_document):
+        total = pending.count()
+        done = 0
+        for document in pending.iterator(chunk_size=batch_size):
+            index_document(document)
+            done += 1
+            if done % batch_size == 0:
+                self.stdout.write(f"Built {what} for {done}/{total} documents")
+        self.stdout.write(self.style.SUCCESS(f"Built {what} for {done} documents"))
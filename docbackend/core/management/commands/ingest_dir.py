@@ -0,0 +1,296 @@
+import hashlib
+import os
+import queue
+import signal
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Document, ProcessingJob
+from core.services.archive_ingestor import ARCHIVE_EXTENSIONS, CHUNK_SIZE, MEMBER_EXTENSIONS, ArchiveIngestor
+from core.services.document_pipeline import DocumentPipeline, UPLOADER_FIELDS
+from core.services.extraction_executor import ExtractionExecutor
+from core.services.job_queue import worker_name
+from core.services.scheduler import ProcessingScheduler
+from core.upload_handlers import StoredUploadedFile, open_storage_file
+from core.utils import hash_file
+
+
+class Command(BaseCommand):
+    help = ("Import the documents in a directory, or keep watching it for new ones. Files already "
+            "imported (by path or content hash) are skipped, so an interrupted run can simply be restarted")
+
+    # The system checks import the URLconf and with it the views, which would
+    # load a second classifier next to this command's own
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--watch', action='store_true',
+                            help="Keep scanning for new files until stopped")
+        parser.add_argument('--interval', type=float, default=10.0,
+                            help="Seconds between scans with --watch")
+        parser.add_argument('--settle', type=float, default=5.0,
+                            help="With --watch, skip files modified this recently (still being written)")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Extraction worker processes (default: EXTRACTION_WORKERS)")
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Files extracted, classified and inserted together (default: BATCH_PROCESS_SIZE)")
+        parser.add_argument('--move', action='store_true',
+                            help="Move files into MEDIA_ROOT instead of copying them")
+        for name in UPLOADER_FIELDS:
+            parser.add_argument(f"--{name.replace('_', '-')}", default='',
+                                help=f"{name.replace('_', ' ').capitalize()} recorded on every document")
+
+    def handle(self, *args, **options):
+        self.directory = os.path.abspath(options['directory'])
+        if not os.path.isdir(self.directory):
+            raise CommandError(f"{self.directory} is not a directory")
+        workers = settings.EXTRACTION_WORKERS if options['workers'] is None else options['workers']
+        self.batch_size = max(options['batch_size'] or settings.BATCH_PROCESS_SIZE, 1)
+        self.watch = options['watch']
+        self.interval = options['interval']
+        self.settle = options['settle']
+        self.move = options['move']
+        self.metadata = {name: options[name] for name in UPLOADER_FIELDS}
+
+        self.pipeline = DocumentPipeline(scheduler=ProcessingScheduler(slots=max(workers, 1)),
+                                         extraction_executor=ExtractionExecutor(workers=workers))
+        self.archive_ingestor = ArchiveIngestor()
+        self.worker = worker_name()
+        self.counts = Counter()
+        self.stopping = threading.Event()
+        self.started = time.monotonic()
+
+        # Finish the batch in hand on SIGTERM/SIGINT; files not yet processed
+        # are handed back and picked up by the next run
+        def stop(signum, frame):
+            if self.stopping.is_set():
+                raise KeyboardInterrupt
+            self.stdout.write("Stopping after the current batch")
+            self.stopping.set()
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        prefix = self.directory + os.sep
+        sources = ProcessingJob.objects.filter(source__startswith=prefix)
+        self.seen = set(sources.values_list('source', flat=True))
+        self.known_hashes = set(Document.objects.exclude(content_hash='').values_list('content_hash', flat=True))
+        self.known_hashes.update(ProcessingJob.objects.exclude(status='failed').exclude(content_hash='')
+                                 .values_list('content_hash', flat=True))
+        self.stdout.write(f"Importing {self.directory}: {len(self.seen)} files already imported, "
+                          f"{len(self.known_hashes)} known documents")
+        if self.move:
+            # Sources of a run stopped between recording their jobs and removing
+            # them. Archives are left: whether all their members were stored
+            # isn't recorded
+            self._remove_sources(path for path in sources.exclude(status='failed').values_list('source', flat=True)
+                                 if os.path.splitext(path)[1].lower() not in ARCHIVE_EXTENSIONS
+                                 and os.path.exists(path))
+
+        try:
+            # Jobs left behind by an interrupted run
+            while not self.stopping.is_set():
+                jobs = self.pipeline.jobs.claim(self.worker, self.batch_size, source__startswith=prefix)
+                if not jobs:
+                    break
+                self._process(jobs)
+            leased = sources.filter(status__in=['queued', 'running']).count()
+            if leased:
+                self.stdout.write(f"{leased} files of an earlier run are still leased or waiting to be "
+                                  f"retried; they are processed once due (also by process_jobs)")
+
+            # Files are stored and recorded in one thread while the previous batch is processed
+            batches = queue.Queue(maxsize=2)
+            producer = threading.Thread(target=self._produce, args=(batches,), name='ingest-scan', daemon=True)
+            producer.start()
+            while True:
+                jobs = batches.get()
+                if jobs is None:
+                    break
+                if self.stopping.is_set():
+                    for job in jobs:
+                        self.pipeline.jobs.release(job)
+                    continue
+                self._process(jobs)
+            producer.join()
+        finally:
+            self.pipeline.extraction_executor.shutdown()
+        self._report(final=True)
+
+    def _produce(self, batches):
+        """Scan, store and record new files as claimed jobs, ``batch_size`` per queue entry"""
+        try:
+            uploads, paths, consumed = [], [], []
+            while not self.stopping.is_set():
+                for path in self._scan():
+                    if self.stopping.is_set():
+                        break
+                    members, stored = self._store(path)
+                    for upload in members:
+                        uploads.append(upload)
+                        paths.append(path)
+                    if stored and self.move:
+                        consumed.append(path)
+                    if len(uploads) >= self.batch_size:
+                        batches.put(self._enqueue(uploads, paths, consumed))
+                        uploads, paths, consumed = [], [], []
+                if uploads:
+                    batches.put(self._enqueue(uploads, paths, consumed))
+                    uploads, paths, consumed = [], [], []
+                # Archives whose members were all duplicates
+                self._remove_sources(consumed)
+                consumed = []
+                if not self.watch:
+                    break
+                self.stopping.wait(self.interval)
+        except Exception as e:
+            self.stderr.write(f"Error scanning {self.directory}: {str(e)}")
+            self.stopping.set()
+        finally:
+            batches.put(None)
+
+    def _scan(self):
+        """Paths of the files not seen yet, in a stable order"""
+        for root, dirs, files in os.walk(self.directory):
+            dirs[:] = sorted(name for name in dirs if not name.startswith('.'))
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                if name.startswith('.') or path in self.seen:
+                    continue
+                extension = os.path.splitext(name)[1].lower()
+                if extension not in MEMBER_EXTENSIONS and extension not in ARCHIVE_EXTENSIONS:
+                    self.seen.add(path)
+                    self.counts['unsupported'] += 1
+                    continue
+                try:
+                    if self.watch and time.time() - os.path.getmtime(path) < self.settle:
+                        continue  # Still being written; next scan
+                except FileNotFoundError:
+                    continue
+                self.seen.add(path)
+                yield path
+
+    def _store(self, path):
+        """
+        ``(members, stored)`` of a new file: its ``[(StoredUploadedFile, file_type)]``
+        (an archive's members) minus duplicates, and whether all its content is
+        in storage now, so that --move may remove it once the jobs are recorded
+        """
+        extension = os.path.splitext(path)[1].lower()
+        rejected = []
+        try:
+            if extension in ARCHIVE_EXTENSIONS:
+                members, rejected = self.archive_ingestor.expand(path)
+                self.counts['unsupported'] += len(rejected)
+                if rejected and self.move:
+                    self.stderr.write(f"Keeping {path}, not all of it was imported: " + '; '.join(
+                        f"{item['file_name']}: {item['error']}" for item in rejected))
+            else:
+                upload = self._store_file(path)
+                members = [(upload, extension[1:])] if upload else []
+                if not upload:
+                    self.counts['duplicates'] += 1
+        except (OSError, ValueError) as e:
+            self.stderr.write(f"Skipping {path}: {str(e)}")
+            self.counts['unreadable'] += 1
+            return [], False
+        # An archive is only all in storage if none of its members were rejected
+        stored = not rejected if extension in ARCHIVE_EXTENSIONS else bool(members)
+
+        new = []
+        for upload, file_type in members:
+            if upload.content_hash in self.known_hashes:
+                upload.discard()
+                self.counts['duplicates'] += 1
+            else:
+                self.known_hashes.add(upload.content_hash)
+                new.append((upload, file_type))
+        return new, stored
+
+    def _store_file(self, path):
+        """
+        Copy ``path`` into storage, hashing it on the way. With --move it is
+        hashed first and, unless it is a duplicate (None, left in place),
+        hard-linked into storage; the source is only removed once its job
+        is recorded (see _enqueue), so a crash in between loses nothing.
+        """
+        content_hash = None
+        if self.move:
+            content_hash = hash_file(path)
+            if content_hash in self.known_hashes:
+                return None
+
+        name = os.path.basename(path)
+        file, storage_name = open_storage_file(name)
+        try:
+            with file:
+                if self.move:
+                    link = f"{file.name}.link"
+                    try:
+                        os.link(path, link)
+                    except OSError:
+                        # MEDIA_ROOT is on another filesystem, or one without hard links
+                        self._copy(path, file)
+                    else:
+                        os.replace(link, file.name)
+                else:
+                    content_hash = self._copy(path, file)
+        except BaseException:
+            default_storage.delete(storage_name)
+            raise
+        if default_storage.file_permissions_mode is not None:
+            os.chmod(file.name, default_storage.file_permissions_mode)
+        size = os.path.getsize(file.name)
+        return StoredUploadedFile(file=file, name=name, storage_name=storage_name, content_type=None,
+                                  size=size, charset=None, content_hash=content_hash, bytes_written=size)
+
+    def _copy(self, path, file):
+        """Copy ``path`` into ``file``, returning its SHA-256"""
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as source:
+            while chunk := source.read(CHUNK_SIZE):
+                file.write(chunk)
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def _enqueue(self, uploads, paths, consumed):
+        """Record ``uploads`` as claimed jobs, then remove the --move sources they came from"""
+        jobs = self.pipeline.jobs.enqueue_many(uploads, self.metadata, worker=self.worker, sources=paths)
+        # Claimed now but processed after the batches ahead of them
+        self.pipeline.jobs.hold(jobs)
+        self._remove_sources(consumed)
+        return jobs
+
+    def _remove_sources(self, paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                self.stderr.write(f"Could not remove {path}: {str(e)}")
+
+    def _process(self, jobs):
+        outcomes = self.pipeline.process_batch(jobs, bulk=True)
+        for job in jobs:
+            outcome = outcomes[job.job_id]
+            if isinstance(outcome, Exception):
+                self.counts['retrying' if job.status == 'queued' else 'failed'] += 1
+                kept = f" (stored as {job.file})" if job.status == 'failed' else ''
+                self.stderr.write(f"{job.source}: {str(outcome)}{kept}")
+            else:
+                self.counts['imported'] += 1
+        self._report()
+
+    def _report(self, final=False):
+        processed = self.counts['imported'] + self.counts['failed'] + self.counts['retrying']
+        elapsed = time.monotonic() - self.started
+        rate = processed / elapsed if elapsed else 0.0
+        summary = ', '.join(f"{count} {label}" for label, count in sorted(self.counts.items()) if count)
+        message = f"{processed} files processed in {elapsed:.0f}s ({rate:.1f} files/s): {summary or 'nothing new'}"
+        self.stdout.write(self.style.SUCCESS(message) if final else message)
@@ -0,0 +1,157 @@
+import signal
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.services.document_pipeline import DocumentPipeline
+from core.services.job_queue import LeaseLost, worker_name
+
+
+class Command(BaseCommand):
+    help = ("Process queued uploads until stopped. Jobs are claimed under a lease, so any number "
+            "of these can run side by side, on one host or several, without processing a job twice")
+
+    # The system checks import the URLconf and with it the views, which would
+    # load a second classifier next to this command's own
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help="Jobs processed at once (default: PROCESSING_SLOTS)")
+        parser.add_argument('--batch-size', type=int, default=1,
+                            help="Jobs each thread claims and processes together, classifying them "
+                                 "in one batched model call (e.g. BATCH_PROCESS_SIZE)")
+        parser.add_argument('--burst', action='store_true',
+                            help="Exit once no job is due instead of waiting for more")
+        parser.add_argument('--max-jobs', type=int, default=None,
+                            help="Exit after this many jobs")
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help="Seconds between claims while the queue is empty (default: JOB_POLL_SECONDS)")
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency'] or settings.PROCESSING_SLOTS
+        if concurrency < 1:
+            raise CommandError("--concurrency must be at least 1")
+        self.poll_interval = options['poll_interval'] or settings.JOB_POLL_SECONDS
+        self.batch_size = max(options['batch_size'], 1)
+        self.burst = options['burst']
+        self.remaining = options['max_jobs']
+        self.pipeline = DocumentPipeline()
+        self.outcomes = Counter()
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.crashed = 0
+
+        # Finish the jobs in hand on SIGTERM/SIGINT; whatever is cut short by a
+        # second signal is retried by another worker once its lease expires
+        def stop(signum, frame):
+            if self.stopping.is_set():
+                raise KeyboardInterrupt
+            self.stdout.write("Stopping after the current jobs")
+            self.stopping.set()
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.stdout.write(f"Processing jobs with {concurrency} threads")
+        threads = [threading.Thread(target=self._work, name=f'process-jobs-{n}', daemon=True)
+                   for n in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        try:
+            # Joined with a timeout so the main thread keeps receiving signals
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=0.5)
+        finally:
+            self.pipeline.extraction_executor.shutdown()
+
+        summary = ', '.join(f"{count} {outcome}" for outcome, count in sorted(self.outcomes.items()))
+        if self.crashed == concurrency:
+            raise CommandError(f"Every worker thread stopped on an error: {summary or 'no jobs'}")
+        if self.crashed:
+            self.stderr.write(f"{self.crashed} of {concurrency} worker threads stopped on an error")
+        self.stdout.write(self.style.SUCCESS(f"Done: {summary or 'no jobs'}"))
+
+    def _take(self):
+        """Reserve up to --batch-size of the --max-jobs left, 0 once they are used up"""
+        with self.lock:
+            if self.remaining is None:
+                return self.batch_size
+            taken = min(self.batch_size, self.remaining)
+            self.remaining -= taken
+            return taken
+
+    def _release(self, count):
+        with self.lock:
+            if self.remaining is not None:
+                self.remaining += count
+
+    def _work(self):
+        worker = worker_name()
+        crashed = True
+        try:
+            while not self.stopping.is_set():
+                limit = self._take()
+                if not limit:
+                    break
+                jobs = []
+                try:
+                    jobs = self.pipeline.jobs.claim(worker, limit)
+                    self._release(limit - len(jobs))
+                    if not jobs:
+                        if self.burst:
+                            break
+                        self.stopping.wait(self.poll_interval)
+                        continue
+                    if len(jobs) == 1:
+                        outcomes = {jobs[0].job_id: self._process(jobs[0])}
+                    else:
+                        outcomes = self.pipeline.process_batch(jobs)
+                    for job in jobs:
+                        self._report(job, outcomes[job.job_id])
+                except Exception as e:
+                    # e.g. 'database is locked': keep the thread, retry after a pause
+                    self.stderr.write(f"Error processing jobs: {str(e)}")
+                    if not jobs:
+                        self._release(limit)
+                    self._abandon(jobs, e)
+                    connections.close_all()
+                    self.stopping.wait(self.poll_interval)
+            crashed = False
+        finally:
+            if crashed:
+                with self.lock:
+                    self.crashed += 1
+            connections.close_all()
+
+    def _abandon(self, jobs, error):
+        """Record a failed attempt for those of ``jobs`` still held, rather than wait out their leases"""
+        for job in jobs:
+            try:
+                self.pipeline.jobs.fail(job, str(error))
+            except Exception as e:
+                self.stderr.write(f"Error failing job {job.job_id}: {str(e)}")
+
+    def _process(self, job):
+        try:
+            return self.pipeline.process(job, shed=False)
+        except Exception as e:
+            return e
+
+    def _report(self, job, outcome):
+        """Log a job's result, or the exception it failed with"""
+        if isinstance(outcome, LeaseLost):
+            label = 'lost'
+            self.stderr.write(f"Job {job.job_id}: lease expired, another worker took it over")
+        elif isinstance(outcome, Exception):
+            label = 'retrying' if job.status == 'queued' else 'failed'
+            self.stderr.write(f"Job {job.job_id} ({job.file_name}) {label} after attempt "
+                              f"{job.attempts}/{job.max_attempts}: {str(outcome)}")
+        else:
+            label = 'succeeded'
+            self.stdout.write(f"Job {job.job_id} ({job.file_name}): {', '.join(outcome['classifications'])}")
+        with self.lock:
+            self.outcomes[label] += 1
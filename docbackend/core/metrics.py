@@ -0,0 +1,145 @@
+import os
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from core.utils import read_rss
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float('inf'))
+
+try:
+    # Optional: without it every recording function below is a no-op
+    import prometheus_client
+    from prometheus_client import Counter, Gauge, Histogram
+except ImportError:
+    prometheus_client = None
+
+if prometheus_client is not None:
+    UPLOADS = Counter('docbackend_uploads_total', 'Document uploads by file type and outcome',
+                      ['file_type', 'outcome'])
+    STAGE_SECONDS = Histogram('docbackend_stage_duration_seconds', 'Time spent in each pipeline stage',
+                              ['stage'], buckets=LATENCY_BUCKETS)
+    ADMISSIONS = Counter('docbackend_processing_admissions_total',
+                         'Uploads admitted to or shed by the processing scheduler', ['work_class', 'result'])
+    PROCESSING_QUEUE = Gauge('docbackend_processing_queue_depth', 'Uploads waiting for a processing slot',
+                             ['work_class'], multiprocess_mode='livesum')
+    RESPONSES = Counter('docbackend_http_responses_total', 'HTTP responses by method and status code',
+                        ['method', 'status'])
+    IN_PROGRESS = Gauge('docbackend_requests_in_progress', 'Requests currently being handled',
+                        multiprocess_mode='livesum')
+    MODEL_LOAD_SECONDS = Gauge('docbackend_model_load_seconds', 'Time taken to load each model',
+                               ['model'], multiprocess_mode='max')
+    RESIDENT_MEMORY = Gauge('docbackend_process_resident_memory_bytes', 'Resident memory of each worker',
+                            multiprocess_mode='liveall')
+    EXTRACTION_QUEUE = Gauge('docbackend_extraction_queue_depth',
+                             'Extractions submitted to the process pool and not yet finished',
+                             multiprocess_mode='livesum')
+
+# Upload outcomes by response status
+UPLOAD_OUTCOMES = {200: 'processed', 202: 'queued', 400: 'rejected', 429: 'busy', 500: 'error'}
+
+def observe_stage(stage, seconds):
+    if prometheus_client is not None:
+        STAGE_SECONDS.labels(stage=stage).observe(seconds)
+
+def record_upload(file_type, status_code):
+    if prometheus_client is not None:
+        UPLOADS.labels(file_type=file_type or 'none',
+                       outcome=UPLOAD_OUTCOMES.get(status_code, str(status_code))).inc()
+
+def record_admission(work_class, admitted):
+    if prometheus_client is not None:
+        ADMISSIONS.labels(work_class=work_class, result='admitted' if admitted else 'shed').inc()
+
+def set_processing_queue(depths):
+    if prometheus_client is not None:
+        for work_class, depth in depths.items():
+            PROCESSING_QUEUE.labels(work_class=work_class).set(depth)
+
+def set_extraction_queue(depth):
+    if prometheus_client is not None:
+        EXTRACTION_QUEUE.set(depth)
+
+def record_model_load(model, seconds):
+    if prometheus_client is not None:
+        MODEL_LOAD_SECONDS.labels(model=model).set(seconds)
+
+class timed_model_load:
+    """Context manager recording how long loading ``model`` takes"""
+
+    def __init__(self, model):
+        self.model = model
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            record_model_load(self.model, time.perf_counter() - self.start)
+        return False
+
+def render():
+    """``(body, content_type)`` of the metrics of all workers in Prometheus text format"""
+    if prometheus_client is None:
+        raise ImportError("prometheus_client is not installed")
+    from prometheus_client import CollectorRegistry, CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        # Each worker writes its samples to files in the shared directory;
+        # aggregate them all rather than reporting only the worker that was hit
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+class MetricsMiddleware:
+    """Count responses by status, track in-flight requests and worker memory"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if prometheus_client is None:
+            return self.get_response(request)
+
+        IN_PROGRESS.inc()
+        try:
+            response = self.get_response(request)
+        finally:
+            self._finish()
+        RESPONSES.labels(method=request.method, status=str(response.status_code)).inc()
+        return response
+
+    async def __acall__(self, request):
+        if prometheus_client is None:
+            return await self.get_response(request)
+
+        IN_PROGRESS.inc()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self._finish()
+        RESPONSES.labels(method=request.method, status=str(response.status_code)).inc()
+        return response
+
+    def _finish(self):
+        IN_PROGRESS.dec()
+        rss = read_rss()
+        if rss is not None:
+            RESIDENT_MEMORY.set(rss)
+
+def mark_process_dead(pid):
+    """Drop a dead worker's live gauges; call from the server's worker-exit hook"""
+    if prometheus_client is not None and os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,70 @@
+from django.db import migrations
+
+# On SQLite, any migration that rebuilds core_document (most AlterField
+# operations) drops these triggers; such a migration has to recreate them.
+SQLITE_CREATE = [
+    """CREATE VIRTUAL TABLE core_document_fts USING fts5(
+        file_name, extracted_text,
+        content='core_document', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER core_document_fts_ai AFTER INSERT ON core_document BEGIN
+        INSERT INTO core_document_fts(rowid, file_name, extracted_text)
+        VALUES (new.id, new.file_name, new.extracted_text);
+    END""",
+    """CREATE TRIGGER core_document_fts_ad AFTER DELETE ON core_document BEGIN
+        INSERT INTO core_document_fts(core_document_fts, rowid, file_name, extracted_text)
+        VALUES ('delete', old.id, old.file_name, old.extracted_text);
+    END""",
+    """CREATE TRIGGER core_document_fts_au AFTER UPDATE OF file_name, extracted_text ON core_document BEGIN
+        INSERT INTO core_document_fts(core_document_fts, rowid, file_name, extracted_text)
+        VALUES ('delete', old.id, old.file_name, old.extracted_text);
+        INSERT INTO core_document_fts(rowid, file_name, extracted_text)
+        VALUES (new.id, new.file_name, new.extracted_text);
+    END""",
+    # Index the documents that already exist
+    "INSERT INTO core_document_fts(core_document_fts) VALUES ('rebuild')",
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS core_document_fts_ai",
+    "DROP TRIGGER IF EXISTS core_document_fts_ad",
+    "DROP TRIGGER IF EXISTS core_document_fts_au",
+    "DROP TABLE IF EXISTS core_document_fts",
+]
+
+POSTGRES_CREATE = [
+    # Generated column, so Postgres keeps it current on every insert/update
+    """ALTER TABLE core_document ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(file_name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(extracted_text, '')), 'B')
+    ) STORED""",
+    "CREATE INDEX core_document_search_idx ON core_document USING GIN (search_vector)",
+]
+
+POSTGRES_DROP = [
+    "DROP INDEX IF EXISTS core_document_search_idx",
+    "ALTER TABLE core_document DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def create_search_index(apps, schema_editor):
+    statements = {'sqlite': SQLITE_CREATE, 'postgresql': POSTGRES_CREATE}
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    statements = {'sqlite': SQLITE_DROP, 'postgresql': POSTGRES_DROP}
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_notification_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
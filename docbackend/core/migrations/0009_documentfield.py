@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-19 06:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_document_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentField',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('value', models.CharField(max_length=255)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='extracted_fields', to='core.document')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['name', 'value'], name='document_field_lookup_idx')],
+            },
+        ),
+    ]
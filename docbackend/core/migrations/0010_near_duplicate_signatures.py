@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-19 07:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_documentfield'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSignature',
+            fields=[
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='core.document')),
+                ('minhash', models.BinaryField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='near_duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='near_duplicates', to='core.document'),
+        ),
+        migrations.CreateModel(
+            name='LSHBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('key', models.BigIntegerField(db_index=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lsh_buckets', to='core.document')),
+            ],
+        ),
+    ]
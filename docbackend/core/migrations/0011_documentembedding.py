@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-19 07:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_near_duplicate_signatures'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentEmbedding',
+            fields=[
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='embedding', serialize=False, to='core.document')),
+                ('vector', models.BinaryField()),
+            ],
+        ),
+    ]
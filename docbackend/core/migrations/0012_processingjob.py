@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-19 07:26
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_documentembedding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessingJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.CharField(max_length=36, unique=True)),
+                ('file_id', models.CharField(max_length=255, unique=True)),
+                ('file', models.CharField(max_length=255)),
+                ('file_name', models.CharField(max_length=255)),
+                ('file_type', models.CharField(max_length=50)),
+                ('content_hash', models.CharField(blank=True, max_length=64)),
+                ('size', models.BigIntegerField(default=0)),
+                ('metadata', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=3)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('leased_by', models.CharField(blank=True, max_length=100)),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('duration', models.FloatField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('document', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='processing_job', to='core.document')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'available_at'], name='processing_job_claim_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-19 07:31
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_processingjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessingBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch_id', models.CharField(max_length=36, unique=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('metadata', models.JSONField(blank=True, default=dict)),
+                ('rejected', models.JSONField(blank=True, default=list)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='core.processingbatch'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 07:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_processingbatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingjob',
+            name='source',
+            field=models.CharField(blank=True, db_index=True, max_length=1024),
+        ),
+    ]
@@ -15,6 +15,9 @@ class Document(models.Model):
     file_name = models.CharField(max_length=255)
     file_type = models.CharField(max_length=50)
     file = models.FileField(upload_to='documents/%Y/%m/%d/', null=True, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)  # SHA-256 of the stored file
+    near_duplicate_of = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True,
+                                          related_name='near_duplicates')
     uploaded_at = models.DateTimeField(default=timezone.now)
     processed = models.BooleanField(default=False)
     extracted_text = models.TextField(blank=True)
@@ -43,6 +46,36 @@ class Classification(models.Model):
     def __str__(self):
         return f"{self.document.file_name} - {self.category}"
 
+class DocumentField(models.Model):
+    """A typed value (name, date, position, GPA, ...) extracted from a document's text"""
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='extracted_fields')
+    name = models.CharField(max_length=50)
+    value = models.CharField(max_length=255)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['name', 'value'], name='document_field_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.document.file_name} - {self.name}: {self.value}"
+
+class DocumentSignature(models.Model):
+    """MinHash signature of a document's extracted text"""
+    document = models.OneToOneField(Document, on_delete=models.CASCADE, primary_key=True, related_name='signature')
+    minhash = models.BinaryField()
+
+class LSHBucket(models.Model):
+    """One LSH band of a document's signature, for sublinear near-duplicate lookups"""
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='lsh_buckets')
+    band = models.PositiveSmallIntegerField()
+    key = models.BigIntegerField(db_index=True)
+
+class DocumentEmbedding(models.Model):
+    """Sentence embedding of a document's extracted text, stored as float16 bytes"""
+    document = models.OneToOneField(Document, on_delete=models.CASCADE, primary_key=True, related_name='embedding')
+    vector = models.BinaryField()
+
 class Notification(models.Model):
     NOTIFICATION_TYPES = [
         ('upload', 'Document Upload'),
@@ -57,6 +90,71 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='notification_created_idx'),
+            # Partial index: the unread badge counts only unread rows
+            models.Index(fields=['is_read'], name='notification_unread_idx', condition=models.Q(is_read=False)),
+        ]
+
+    def __str__(self):
+        return f"{self.type} - {self.message[:50]}..."
+
+class ProcessingBatch(models.Model):
+    """Files uploaded together through the batch endpoint"""
+    batch_id = models.CharField(max_length=36, unique=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    metadata = models.JSONField(default=dict, blank=True)  # Uploader fields shared by every file
+    rejected = models.JSONField(default=list, blank=True)  # [{'file_name', 'error'}] refused on upload
+
+    def __str__(self):
+        return self.batch_id
+
+class ProcessingJob(models.Model):
+    """
+    An upload waiting for or going through the processing pipeline.
+
+    The row is written as soon as the upload is stored, so work that was in
+    flight when a worker died is picked up again once its lease expires.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    job_id = models.CharField(max_length=36, unique=True)
+    file_id = models.CharField(max_length=255, unique=True)  # file_id of the document it creates
+    document = models.OneToOneField(Document, on_delete=models.SET_NULL, null=True, blank=True,
+                                    related_name='processing_job')
+    file = models.CharField(max_length=255)  # Storage name of the stored upload
+    file_name = models.CharField(max_length=255)
+    file_type = models.CharField(max_length=50)
+    content_hash = models.CharField(max_length=64, blank=True)
+    size = models.BigIntegerField(default=0)
+    metadata = models.JSONField(default=dict, blank=True)  # Uploader fields from the request
+    batch = models.ForeignKey(ProcessingBatch, on_delete=models.CASCADE, null=True, blank=True,
+                              related_name='jobs')
+    source = models.CharField(max_length=1024, blank=True, db_index=True)  # Original path, for ingest_dir
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    available_at = models.DateTimeField(default=timezone.now)  # Not claimed before this (retry backoff)
+    leased_by = models.CharField(max_length=100, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True)  # Seconds spent in the last attempt
+    last_error = models.TextField(blank=True)
+    result = models.JSONField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='processing_job_claim_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.type} - {self.message[:50]}..."
\ No newline at end of file
+        return f"{self.file_name} - {self.status}"
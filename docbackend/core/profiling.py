@@ -0,0 +1,228 @@
+import bisect
+import cProfile
+import functools
+import os
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from core.metrics import LATENCY_BUCKETS, observe_stage
+
+# Stage timings of the request being handled in this thread / task
+_request_timings = ContextVar('request_timings', default=None)
+# Stages measured in an extraction worker, handed back to the web process
+_collected_stages = ContextVar('collected_stages', default=None)
+
+class StageHistograms:
+    """Process-wide latency histograms, one per stage name"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                stage = self._stages[name] = {'counts': [0] * len(self.buckets), 'count': 0, 'sum': 0.0}
+            stage['counts'][bisect.bisect_left(self.buckets, seconds)] += 1
+            stage['count'] += 1
+            stage['sum'] += seconds
+
+    def _quantile(self, stage, q):
+        # Upper bound of the bucket holding the q-th observation
+        rank = q * stage['count']
+        seen = 0
+        for bound, count in zip(self.buckets, stage['counts']):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def snapshot(self):
+        """``{stage: {count, sum, buckets, p50, p95}}`` with times in seconds"""
+        with self._lock:
+            stages = {name: {'counts': list(stage['counts']), 'count': stage['count'], 'sum': stage['sum']}
+                      for name, stage in self._stages.items()}
+        return {
+            name: {
+                'count': stage['count'],
+                'sum': round(stage['sum'], 6),
+                'buckets': {str(bound): count for bound, count in zip(self.buckets, stage['counts'])},
+                'p50': self._quantile(stage, 0.5),
+                'p95': self._quantile(stage, 0.95),
+            }
+            for name, stage in stages.items()
+        }
+
+histograms = StageHistograms()
+
+def record(name, seconds):
+    """Add one stage timing to the current request and the process histograms"""
+    collected = _collected_stages.get()
+    if collected is not None:
+        collected.append((name, seconds))
+        return
+    histograms.observe(name, seconds)
+    observe_stage(name, seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        total, count = timings.get(name, (0.0, 0))
+        timings[name] = (total + seconds, count + 1)
+
+class collect_stages:
+    """
+    Gather the spans timed inside this block into a list instead of recording
+    them, for code running in another process; the caller passes the list to
+    ``replay`` so they count towards its request and histograms.
+    """
+
+    def __enter__(self):
+        self.stages = []
+        self._token = _collected_stages.set(self.stages)
+        return self.stages
+
+    def __exit__(self, exc_type, exc, tb):
+        _collected_stages.reset(self._token)
+        return False
+
+def replay(stages):
+    """Record ``[(name, seconds)]`` gathered by collect_stages"""
+    for name, seconds in stages:
+        record(name, seconds)
+
+class span:
+    """
+    Time a pipeline stage, as a context manager or a decorator::
+
+        with span('db.write'):
+            ...
+
+        @span('classify')
+        def classify_text(self, text):
+            ...
+
+    Repeated stages within one request (e.g. OCR of each page) are summed.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._starts = threading.local()
+
+    def __enter__(self):
+        starts = self._starts.__dict__.setdefault('stack', [])
+        starts.append(time.perf_counter())
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.name, time.perf_counter() - self._starts.stack.pop())
+        return False
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self:
+                return func(*args, **kwargs)
+        return wrapper
+
+class ServerTimingMiddleware:
+    """
+    Collect stage spans for each request, report them in a ``Server-Timing``
+    header, and profile a sample of requests when PROFILE_SAMPLE_RATE is set.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    # Only one profiler can be attached at a time in a process
+    _profiling = threading.Lock()
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timings = {}
+        token = _request_timings.set(timings)
+        profiler = self._start_profiler()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_timings.reset(token)
+            if profiler is not None:
+                self._finish_profiler(profiler, request)
+        return self._add_timings(response, timings, elapsed)
+
+    async def __acall__(self, request):
+        # No sampled profiling here: a profiler on the event loop thread would
+        # mix in every other request interleaved with this one
+        timings = {}
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_timings.reset(token)
+        return self._add_timings(response, timings, elapsed)
+
+    def _add_timings(self, response, timings, elapsed):
+        histograms.observe('request', elapsed)
+        observe_stage('request', elapsed)
+        if settings.SERVER_TIMING_HEADER:
+            metrics = [f'{re.sub(r"[^A-Za-z0-9_.-]", "_", name)};dur={total * 1000:.1f}'
+                       + (f';desc="{count}x"' if count > 1 else '')
+                       for name, (total, count) in timings.items()]
+            metrics.append(f'total;dur={elapsed * 1000:.1f}')
+            response['Server-Timing'] = ', '.join(metrics)
+        return response
+
+    def _start_profiler(self):
+        if settings.PROFILE_SAMPLE_RATE <= 0 or random.random() >= settings.PROFILE_SAMPLE_RATE:
+            return None
+        if not self._profiling.acquire(blocking=False):
+            return None
+
+        try:
+            if settings.PROFILER == 'pyinstrument':
+                try:
+                    from pyinstrument import Profiler
+                except ImportError:
+                    print("pyinstrument is not installed; falling back to cProfile")
+                else:
+                    profiler = Profiler()
+                    profiler.start()
+                    return profiler
+
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+        except Exception:
+            self._profiling.release()
+            raise
+
+    def _finish_profiler(self, profiler, request):
+        try:
+            os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.method}-{re.sub(r'[^A-Za-z0-9]+', '_', request.path).strip('_')}"
+            if isinstance(profiler, cProfile.Profile):
+                profiler.disable()
+                profiler.dump_stats(os.path.join(settings.PROFILE_DIR, f'{name}.prof'))
+            else:
+                profiler.stop()
+                with open(os.path.join(settings.PROFILE_DIR, f'{name}.html'), 'w') as f:
+                    f.write(profiler.output_html())
+        except Exception as e:
+            print(f"Error saving request profile: {str(e)}")
+        finally:
+            self._profiling.release()
@@ -0,0 +1,124 @@
+import hashlib
+import os
+import zipfile
+import zlib
+from django.conf import settings
+from django.core.files.storage import default_storage
+from core.profiling import span
+from core.services.document_processor import IMAGE_EXTENSIONS
+from core.upload_handlers import StoredUploadedFile, open_storage_file
+
+ARCHIVE_EXTENSIONS = ('.zip',)
+
+# Member types the extraction pipeline can read
+MEMBER_EXTENSIONS = ('.pdf', '.docx') + IMAGE_EXTENSIONS
+
+CHUNK_SIZE = 64 * 1024
+
+# Small files may compress extremely well (a blank page); the ratio limit
+# only applies above this size
+RATIO_CHECK_MIN_BYTES = 1024 * 1024
+
+class ArchiveIngestor:
+    """
+    Expand a zip archive into stored uploads, one member at a time.
+
+    Each supported member is decompressed in CHUNK_SIZE chunks straight to
+    its final storage location, as StorageUploadHandler does for uploads, so
+    memory stays flat whatever the size of the archive and nothing else is
+    extracted. The central directory is checked against the member count
+    and total size limits before anything is written; encrypted, nested,
+    oversized or suspiciously compressed members are skipped and reported.
+    """
+
+    def __init__(self, max_members=None, max_total_mb=None, max_member_mb=None, max_ratio=None):
+        self.max_members = max_members or settings.ARCHIVE_MAX_MEMBERS
+        self.max_total_bytes = (max_total_mb or settings.ARCHIVE_MAX_TOTAL_MB) * 2 ** 20
+        self.max_member_bytes = (max_member_mb or settings.ARCHIVE_MAX_MEMBER_MB) * 2 ** 20
+        self.max_ratio = max_ratio or settings.ARCHIVE_MAX_RATIO
+
+    @span('archive.expand')
+    def expand(self, file_path):
+        """
+        ``(uploads, rejected)`` of the archive at ``file_path``: stored members
+        as ``(StoredUploadedFile, file_type)`` pairs, and ``{'file_name', 'error'}``
+        of the members skipped. Raises ValueError if the archive is unreadable
+        or over its limits.
+        """
+        try:
+            archive = zipfile.ZipFile(file_path)
+        except (zipfile.BadZipFile, zipfile.LargeZipFile, OSError):
+            raise ValueError("Not a valid zip archive")
+
+        uploads, rejected = [], []
+        with archive:
+            members = [info for info in archive.infolist() if not info.is_dir()]
+            if len(members) > self.max_members:
+                raise ValueError(f"Archive has {len(members)} files; at most {self.max_members} are allowed")
+            total = sum(info.file_size for info in members)
+            if total > self.max_total_bytes:
+                raise ValueError(f"Archive expands to {total / 2 ** 20:.0f} MB; "
+                                 f"at most {self.max_total_bytes / 2 ** 20:.0f} MB is allowed")
+
+            try:
+                for info in members:
+                    name = os.path.basename(info.filename)
+                    # Finder and resource-fork metadata, not documents
+                    if info.filename.startswith('__MACOSX/') or name.startswith('.'):
+                        continue
+                    error = self._check(info)
+                    if error:
+                        rejected.append({'file_name': info.filename, 'error': error})
+                        continue
+                    try:
+                        uploads.append((self._store(archive, info, name),
+                                        os.path.splitext(name)[1].lower()[1:]))
+                    except (zipfile.BadZipFile, zlib.error, EOFError, NotImplementedError) as e:
+                        rejected.append({'file_name': info.filename, 'error': f"Could not read file: {str(e)}"})
+            except BaseException:
+                for upload, _ in uploads:
+                    upload.discard()
+                raise
+        return uploads, rejected
+
+    def _check(self, info):
+        """Why ``info``'s member can't be ingested, or None"""
+        extension = os.path.splitext(info.filename)[1].lower()
+        if extension in ARCHIVE_EXTENSIONS:
+            return "Nested archives are not supported"
+        if extension not in MEMBER_EXTENSIONS:
+            return "Unsupported file type"
+        if info.flag_bits & 0x1:
+            return "Encrypted files are not supported"
+        if info.file_size > self.max_member_bytes:
+            return f"File is larger than {self.max_member_bytes / 2 ** 20:.0f} MB"
+        if info.file_size > RATIO_CHECK_MIN_BYTES and info.file_size > info.compress_size * self.max_ratio:
+            return "File is compressed more than allowed"
+        return None
+
+    def _store(self, archive, info, name):
+        file, storage_name = open_storage_file(name)
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            # ZipExtFile stops at the declared size and checks the CRC at the end
+            with file, archive.open(info) as member:
+                while chunk := member.read(CHUNK_SIZE):
+                    file.write(chunk)
+                    hasher.update(chunk)
+                    size += len(chunk)
+        except BaseException:
+            default_storage.delete(storage_name)
+            raise
+        if default_storage.file_permissions_mode is not None:
+            os.chmod(file.name, default_storage.file_permissions_mode)
+        return StoredUploadedFile(
+            file=file,
+            name=name,
+            storage_name=storage_name,
+            content_type=None,
+            size=size,
+            charset=None,
+            content_hash=hasher.hexdigest(),
+            bytes_written=size,
+        )
@@ -6,6 +6,9 @@ from docx import Document
 import numpy as np
 from collections import Counter
 
+# Numeric (01/02/2020) and day-month-name (2 June 2020) dates
+DATE_PATTERN = r'\d{1,2}[-/]\d{1,2}[-/]\d{2,4}|\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\.?\s+\d{2,4}'
+
 class DocumentFeatureExtractor:
     """Extract document-specific features for improved classification"""
     
@@ -150,7 +153,7 @@ class DocumentFeatureExtractor:
         # Check for common document parts
         features['has_header'] = bool(re.search(r'^[^\n]{1,100}$', text.split('\n')[0]))
         features['has_footer'] = bool(re.search(r'^[^\n]{1,100}$', text.split('\n')[-1]))
-        features['has_date'] = bool(re.search(r'\d{1,2}[-/]\d{1,2}[-/]\d{2,4}|\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\.?\s+\d{2,4}', text))
+        features['has_date'] = bool(re.search(DATE_PATTERN, text))
         
         # Section detection
         sections = text.split('\n\n')
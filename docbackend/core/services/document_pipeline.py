@@ -0,0 +1,342 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from core.models import Document, Classification, DocumentField, Notification
+from core.profiling import span
+from core.services.document_processor import IMAGE_EXTENSIONS
+from core.services.embedding_index import EmbeddingIndex, TextEmbedder
+from core.services.extraction_executor import ExtractionExecutor, ExtractionQueueFull
+from core.services.field_extractor import DocumentFieldExtractor
+from core.services.job_queue import JobQueue, LeaseLost
+from core.services.near_duplicate import NearDuplicateDetector
+from core.services.notification_feed import NotificationFeed
+from core.services.scheduler import ProcessingScheduler, Overloaded
+
+# Form fields of an upload kept on its job, for the document created from it
+UPLOADER_FIELDS = ('first_name', 'last_name', 'email', 'purpose', 'description')
+
+class DocumentPipeline:
+    """
+    Turns a claimed ProcessingJob into a classified Document: extraction in
+    the scheduler's slot, then near-duplicate lookup, classification, field
+    extraction and the notification, committed together with the job's
+    success so a crash at any point leaves the job to be retried.
+
+    Used by the upload views for inline processing and by ``process_jobs``
+    workers; each owns one pipeline (and one classifier) per process.
+    """
+
+    def __init__(self, job_queue=None, scheduler=None, extraction_executor=None):
+        self.jobs = job_queue or JobQueue()
+        self.scheduler = scheduler or ProcessingScheduler()
+        self.extraction_executor = extraction_executor or ExtractionExecutor()
+        self.classifier = import_string(settings.DOCUMENT_CLASSIFIER)()
+        self.near_duplicate_detector = NearDuplicateDetector()
+        self.text_embedder = TextEmbedder()
+        self.embedding_index = EmbeddingIndex()
+        self.field_extractor = DocumentFieldExtractor()
+
+    def process(self, job, shed=True):
+        """
+        Process ``job`` and return its result, recording the outcome on the job.
+
+        Unreadable or unclassifiable documents (ValueError) fail the job for
+        good; other errors leave it queued for a retry unless it is out of
+        attempts. With ``shed``, an upload the scheduler or extraction pool
+        turns away cancels the job and raises Overloaded or
+        ExtractionQueueFull; without it the job waits for its turn.
+        """
+        started = time.monotonic()
+        with self.jobs.leased([job]):
+            try:
+                extracted_text, ocr_stats = self._extract(job, shed)
+                prepared = self._prepare(extracted_text)
+                if not prepared['classification']:
+                    prepared['classification'] = self.classifier.classify_text(extracted_text)
+                return self._store(job, extracted_text, ocr_stats, prepared, started)
+            except LeaseLost:
+                raise
+            except Exception as e:
+                self._record_failure(job, e, started, shed)
+                raise
+
+    def process_batch(self, jobs, bulk=False):
+        """
+        Process claimed ``jobs`` together, returning ``{job_id: result or exception}``.
+
+        Extraction runs for up to ``scheduler.slots`` jobs at once, and the
+        documents not classified by a near-duplicate or embedding vote go
+        through the classifier in one batched call. Each document is
+        committed with its own job, so one failure doesn't hold back the
+        rest, unless ``bulk``: then all of them are inserted in one
+        transaction with bulk inserts, for imports where throughput matters
+        more than the first results appearing early. The jobs' leases are
+        renewed until the last one is done.
+        """
+        with self.jobs.leased(jobs):
+            return self._process_batch(jobs, bulk)
+
+    def _process_batch(self, jobs, bulk):
+        started = time.monotonic()
+        outcomes = {}
+        with ThreadPoolExecutor(max_workers=min(self.scheduler.slots, len(jobs)) or 1,
+                                thread_name_prefix='docbackend-extract') as pool:
+            futures = {job.job_id: pool.submit(self._extract, job, False) for job in jobs}
+        extracted = {}
+        for job in jobs:
+            try:
+                extracted[job.job_id] = futures[job.job_id].result()
+            except Exception as e:
+                outcomes[job.job_id] = e
+
+        prepared = {}
+        for job in jobs:
+            if job.job_id in extracted:
+                try:
+                    prepared[job.job_id] = self._prepare(extracted[job.job_id][0])
+                except Exception as e:
+                    outcomes[job.job_id] = e
+
+        unclassified = [job_id for job_id, values in prepared.items() if not values['classification']]
+        if unclassified:
+            texts = [extracted[job_id][0] for job_id in unclassified]
+            classify_texts = getattr(self.classifier, 'classify_texts', None)
+            if classify_texts is not None:
+                labels = classify_texts(texts)
+            else:
+                labels = [self.classifier.classify_text(text) for text in texts]
+            for job_id, label in zip(unclassified, labels):
+                prepared[job_id]['classification'] = label
+
+        if bulk:
+            outcomes.update(self._store_many([(job, *extracted[job.job_id], prepared[job.job_id])
+                                              for job in jobs if job.job_id in prepared], started))
+        for job in jobs:
+            if job.job_id in prepared and not bulk:
+                extracted_text, ocr_stats = extracted[job.job_id]
+                try:
+                    outcomes[job.job_id] = self._store(job, extracted_text, ocr_stats, prepared[job.job_id], started)
+                except Exception as e:
+                    outcomes[job.job_id] = e
+            if isinstance(outcomes[job.job_id], Exception) and not isinstance(outcomes[job.job_id], LeaseLost):
+                self._record_failure(job, outcomes[job.job_id], started, shed=False)
+        return outcomes
+
+    def run_batch(self, batch, worker, size=None):
+        """
+        Process ``batch``'s jobs ``size`` at a time until none is left,
+        waiting out the backoff of failed attempts in between.
+        """
+        size = size or settings.BATCH_PROCESS_SIZE
+        while True:
+            jobs = self.jobs.claim(worker, size, batch=batch)
+            if jobs:
+                self.process_batch(jobs)
+                continue
+            retry_at = batch.jobs.filter(status='queued').aggregate(retry_at=Min('available_at'))['retry_at']
+            if retry_at is None:
+                return
+            time.sleep(min(max((retry_at - timezone.now()).total_seconds(), 0.0), settings.JOB_POLL_SECONDS))
+
+    def run_due(self, worker, size=None):
+        """
+        Claim and process due jobs ``size`` at a time until none is left,
+        returning how many were claimed
+        """
+        size = size or settings.BATCH_PROCESS_SIZE
+        claimed = 0
+        while True:
+            jobs = self.jobs.claim(worker, size)
+            if not jobs:
+                return claimed
+            claimed += len(jobs)
+            self.process_batch(jobs)
+
+    def _record_failure(self, job, error, started, shed):
+        duration = time.monotonic() - started
+        if isinstance(error, (Overloaded, ExtractionQueueFull)):
+            if shed:
+                self.jobs.cancel(job)
+            else:
+                self.jobs.fail(job, "Extraction pool is full", duration)
+        elif isinstance(error, ValueError):
+            self.jobs.fail(job, str(error), duration, permanent=True)
+        else:
+            self.jobs.fail(job, str(error) or type(error).__name__, duration)
+
+    def _extract(self, job, shed):
+        """``(text, ocr_stats)`` of the job's upload, extracted in a scheduler slot"""
+        # Outside any transaction, so no database lock is held while it runs
+        file_path = default_storage.path(job.file)
+        estimate = self.scheduler.estimate(file_path, job.size)
+        with self.scheduler.slot(estimate, shed=shed):
+            extracted_text, ocr_stats = self.extraction_executor.extract(file_path)
+        if not extracted_text or not extracted_text.strip():
+            raise ValueError("No text could be extracted from the document")
+        return extracted_text, ocr_stats
+
+    def _prepare(self, extracted_text):
+        """Near-duplicate lookup, embedding and the classification they settle, if any"""
+        detector = self.near_duplicate_detector
+        # Look for an earlier upload of (nearly) the same document
+        signature = detector.signature(extracted_text)
+        duplicate_id, similarity = detector.find_duplicate(signature)
+        classification = None
+        if duplicate_id and settings.NEAR_DUPLICATE_REUSE_CLASSIFICATION:
+            classification = (Classification.objects.filter(document_id=duplicate_id)
+                              .values_list('category', flat=True).first())
+
+        # Fast path: a clear vote from the nearest approved documents
+        vector = self.text_embedder.embed(extracted_text) if settings.EMBEDDINGS_ENABLED else None
+        if not classification and vector is not None:
+            classification = self.embedding_index.vote(vector)
+        return {'signature': signature, 'duplicate_id': duplicate_id, 'similarity': similarity,
+                'vector': vector, 'classification': classification}
+
+    def _store(self, job, extracted_text, ocr_stats, prepared, started):
+        """Create the job's document and complete the job, in one transaction"""
+        classification = self._check_classification(prepared)
+        with transaction.atomic():
+            # Create document record, pointing at the already stored file
+            with span('db.write'):
+                document = self._new_document(job, extracted_text, prepared)
+                document.save(force_insert=True)
+                self.near_duplicate_detector.index(document, prepared['signature'])
+                if prepared['vector'] is not None:
+                    self.embedding_index.add(document, prepared['vector'])
+
+                Classification.objects.create(
+                    document=document,
+                    category=classification,
+                    confidence=1.0  # We'll implement actual confidence scores later
+                )
+
+                # Store typed fields so documents can be filtered without scanning text
+                fields = self.field_extractor.extract(extracted_text, classification)
+                DocumentField.objects.bulk_create(self._fields(document, fields))
+
+                Notification.objects.create(document=document, type='upload', message=self._message(document))
+
+            duplicate_file_id = document.near_duplicate_of.file_id if prepared['duplicate_id'] else None
+            result = self._result(job, document, extracted_text, ocr_stats, prepared, fields, duplicate_file_id)
+            # Raises LeaseLost, rolling the document back, if another worker took the job over
+            self.jobs.complete(job, document, result, time.monotonic() - started)
+        return result
+
+    def _store_many(self, items, started):
+        """
+        _store() for many ``(job, extracted_text, ocr_stats, prepared)`` at
+        once, with one insert per table; ``{job_id: result or exception}``.
+        If that fails, e.g. because a job's lease was lost, the documents
+        are stored one by one instead.
+        """
+        outcomes, valid = {}, []
+        for item in items:
+            try:
+                self._check_classification(item[3])
+                valid.append(item)
+            except ValueError as e:
+                outcomes[item[0].job_id] = e
+        if not valid:
+            return outcomes
+
+        try:
+            with transaction.atomic():
+                with span('db.write'):
+                    documents = Document.objects.bulk_create([
+                        self._new_document(job, extracted_text, prepared)
+                        for job, extracted_text, _, prepared in valid
+                    ])
+                    self.near_duplicate_detector.index_many(
+                        documents, [prepared['signature'] for _, _, _, prepared in valid])
+                    embedded = [(document, prepared['vector']) for document, (_, _, _, prepared)
+                                in zip(documents, valid) if prepared['vector'] is not None]
+                    if embedded:
+                        self.embedding_index.add_many(*zip(*embedded))
+
+                    Classification.objects.bulk_create([
+                        Classification(document=document, category=prepared['classification'], confidence=1.0)
+                        for document, (_, _, _, prepared) in zip(documents, valid)
+                    ])
+                    fields = [self.field_extractor.extract(extracted_text, prepared['classification'])
+                              for _, extracted_text, _, prepared in valid]
+                    DocumentField.objects.bulk_create([
+                        field for document, document_fields in zip(documents, fields)
+                        for field in self._fields(document, document_fields)
+                    ])
+                    notifications = Notification.objects.bulk_create([
+                        Notification(document=document, type='upload', message=self._message(document))
+                        for document in documents
+                    ])
+                    # bulk_create sends no post_save; wake feed listeners as the signal would
+                    latest = max(notification.id for notification in notifications)
+                    transaction.on_commit(lambda: NotificationFeed.publish(latest))
+
+                duplicates = dict(Document.objects.filter(
+                    id__in={prepared['duplicate_id'] for _, _, _, prepared in valid if prepared['duplicate_id']}
+                ).values_list('id', 'file_id'))
+                for document, document_fields, (job, extracted_text, ocr_stats, prepared) in zip(documents, fields, valid):
+                    result = self._result(job, document, extracted_text, ocr_stats, prepared, document_fields,
+                                          duplicates.get(prepared['duplicate_id']))
+                    self.jobs.complete(job, document, result, time.monotonic() - started)
+                    outcomes[job.job_id] = result
+        except Exception:
+            # A lost lease or one bad row; store them one by one so only that job fails
+            for job, extracted_text, ocr_stats, prepared in valid:
+                job.status = 'running'
+                try:
+                    outcomes[job.job_id] = self._store(job, extracted_text, ocr_stats, prepared, started)
+                except Exception as e:
+                    outcomes[job.job_id] = e
+        return outcomes
+
+    def _check_classification(self, prepared):
+        classification = prepared['classification']
+        if not classification or classification == "unknown":
+            raise ValueError("Could not determine document type")
+        return classification
+
+    def _new_document(self, job, extracted_text, prepared):
+        metadata = job.metadata or {}
+        return Document(
+            file_id=job.file_id,
+            file_name=job.file_name,
+            file_type=job.file_type,
+            file=job.file,
+            content_hash=job.content_hash,
+            extracted_text=extracted_text,
+            uploader_first_name=metadata.get('first_name', ''),
+            uploader_last_name=metadata.get('last_name', ''),
+            uploader_email=metadata.get('email', ''),
+            purpose=metadata.get('purpose', ''),
+            description=metadata.get('description', ''),
+            processed=True,
+            status='pending',
+            near_duplicate_of_id=prepared['duplicate_id']
+        )
+
+    def _fields(self, document, fields):
+        return [DocumentField(document=document, name=name, value=value)
+                for name, values in fields.items() for value in values]
+
+    def _message(self, document):
+        return f"New document '{document.file_name}' uploaded by {document.uploader_first_name} {document.uploader_last_name}"
+
+    def _result(self, job, document, extracted_text, ocr_stats, prepared, fields, duplicate_file_id):
+        return {
+            'document_id': document.file_id,
+            'classifications': [prepared['classification']],
+            'fields': fields,
+            'near_duplicate_of': {
+                'id': duplicate_file_id,
+                'similarity': round(prepared['similarity'], 3)
+            } if prepared['duplicate_id'] else None,
+            'extracted_text': extracted_text[:500] + '...' if len(extracted_text) > 500 else extracted_text,
+            'file_type': job.file_type,
+            'ocr_stats': ocr_stats if f'.{job.file_type}' in IMAGE_EXTENSIONS else None,
+        }
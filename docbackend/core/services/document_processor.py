@@ -1,17 +1,27 @@
 import docx2txt
 import PyPDF2
 from django.conf import settings
+from .ocr_service import OCRService
+from core.profiling import span
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tif', '.tiff', '.heic', '.heif')
 
 class DocumentProcessor:
+    def __init__(self):
+        self.ocr_service = OCRService()
+
     def extract_text(self, file_path):
         """Extract text from document files"""
         if file_path.lower().endswith('.docx'):
             return self._extract_text_from_docx(file_path)
         elif file_path.lower().endswith('.pdf'):
             return self._extract_text_from_pdf(file_path)
+        elif file_path.lower().endswith(IMAGE_EXTENSIONS):
+            return self.ocr_service.extract_text(file_path)
         else:
             raise ValueError("Unsupported file format")
 
+    @span('extract.docx')
     def _extract_text_from_docx(self, file_path):
         """Extract text from DOCX files"""
         try:
@@ -25,11 +35,15 @@ class DocumentProcessor:
         """Extract text from PDF files"""
         try:
             text = ""
-            with open(file_path, 'rb') as file:
+            with span('extract.pdf'), open(file_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
                 for page in pdf_reader.pages:
                     text += page.extract_text() + " "
-            return text.strip()
         except Exception as e:
             print(f"Error processing PDF {file_path}: {str(e)}")
-            raise ValueError(f"Could not process PDF file: {str(e)}")
\ No newline at end of file
+            raise ValueError(f"Could not process PDF file: {str(e)}")
+
+        # Scanned PDFs have no text layer; fall back to OCR of the rendered pages
+        if not text.strip():
+            return self.ocr_service.extract_text_from_pdf(file_path)
+        return text.strip()
\ No newline at end of file
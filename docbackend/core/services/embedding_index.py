@@ -0,0 +1,173 @@
+import threading
+import time
+from collections import defaultdict
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from core.models import Classification, Document, DocumentEmbedding
+from core.profiling import span
+from core.metrics import timed_model_load
+
+class TextEmbedder:
+    """Sentence embeddings from a small transformer, mean-pooled and L2-normalized"""
+
+    def __init__(self, model_name=None):
+        self.model_name = model_name or settings.EMBEDDING_MODEL
+        self._pipeline = None
+
+    @property
+    def pipeline(self):
+        # Loaded on first use so workers that never embed don't pay for the model
+        if self._pipeline is None:
+            from transformers import pipeline
+            with timed_model_load(self.model_name):
+                self._pipeline = pipeline("feature-extraction", model=self.model_name, device=settings.MODEL_DEVICE)
+        return self._pipeline
+
+    @span('embed')
+    def embed(self, text):
+        """float16 unit vector for ``text``"""
+        tokens = np.asarray(self.pipeline(text or ' ', truncation=True)[0], dtype=np.float32)
+        vector = tokens.mean(axis=0)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.astype(np.float16)
+
+class EmbeddingIndex:
+    """
+    Exact nearest-neighbour index over stored document embeddings.
+
+    Vectors live in the database as float16 bytes and are held in memory as
+    one contiguous float16 matrix. Searches compute cosine similarity in
+    float32 chunks, so the resident copy stays half the size. New rows and
+    review status changes from other workers are picked up every
+    EMBEDDING_INDEX_REFRESH_SECONDS.
+    """
+
+    CHUNK_ROWS = 4096
+    # Rows committed out of id order by other workers are caught by rescanning
+    # this many ids below the highest one already loaded
+    REFRESH_OVERLAP = 1000
+
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = None
+        self.approved = np.empty(0, dtype=bool)
+        self.labels = {}  # document id -> (status, category) for reviewed documents
+        self._known = set()
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _append(self, ids, vectors):
+        self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+        self.vectors = vectors if self.vectors is None else np.vstack([self.vectors, vectors])
+        self.approved = np.concatenate([self.approved, np.zeros(len(ids), dtype=bool)])
+        self._known.update(ids)
+
+    def _refresh(self, force=False):
+        with self._lock:
+            if not force and self._loaded_at is not None and \
+                    time.monotonic() - self._loaded_at < settings.EMBEDDING_INDEX_REFRESH_SECONDS:
+                return
+
+            embeddings = DocumentEmbedding.objects.order_by('document_id')
+            if self._known:
+                watermark = int(self.ids.max()) - self.REFRESH_OVERLAP
+                recent = embeddings.filter(document_id__gt=watermark).values_list('document_id', flat=True)
+                missing = [doc_id for doc_id in recent if doc_id not in self._known]
+                embeddings = embeddings.filter(document_id__in=missing) if missing else embeddings.none()
+
+            rows = list(embeddings.values_list('document_id', 'vector'))
+            if rows:
+                self._append([row[0] for row in rows],
+                             np.vstack([np.frombuffer(bytes(row[1]), dtype=np.float16) for row in rows]))
+
+            # Review outcomes change after upload, so labels are always reloaded
+            categories = dict(Classification.objects.filter(document__status__in=['approved', 'rejected'])
+                              .values_list('document_id', 'category'))
+            self.labels = {
+                doc_id: (doc_status, categories.get(doc_id))
+                for doc_id, doc_status in Document.objects.filter(status__in=['approved', 'rejected'])
+                .values_list('id', 'status')
+            }
+            self.approved = np.fromiter(
+                (self.labels.get(doc_id, (None,))[0] == 'approved' for doc_id in self.ids.tolist()),
+                dtype=bool, count=self.ids.size)
+            self._loaded_at = time.monotonic()
+
+    def add(self, document, vector):
+        """Store a document's embedding and make it searchable in this process once committed"""
+        DocumentEmbedding.objects.update_or_create(document=document, defaults={'vector': vector.tobytes()})
+        transaction.on_commit(lambda: self._add_rows([(document.id, vector)]))
+
+    def add_many(self, documents, vectors):
+        """add() for newly created documents, in one insert"""
+        DocumentEmbedding.objects.bulk_create([
+            DocumentEmbedding(document=document, vector=vector.tobytes())
+            for document, vector in zip(documents, vectors)
+        ])
+        rows = [(document.id, vector) for document, vector in zip(documents, vectors)]
+        # Only once the documents exist: a rolled back insert must not leave ids behind
+        transaction.on_commit(lambda: self._add_rows(rows))
+
+    def _add_rows(self, rows):
+        with self._lock:
+            new = [(doc_id, vector) for doc_id, vector in rows if doc_id not in self._known]
+            if self._loaded_at is not None and new:
+                self._append([doc_id for doc_id, _ in new],
+                             np.vstack([vector.reshape(1, -1) for _, vector in new]).astype(np.float16))
+
+    def neighbours(self, vector, k=10, exclude_id=None, approved_only=False):
+        """``[(document_id, similarity)]`` of the ``k`` most similar documents"""
+        self._refresh()
+        with self._lock:
+            ids, vectors, approved = self.ids, self.vectors, self.approved
+        if vectors is None or not ids.size:
+            return []
+
+        query = vector.astype(np.float32)
+        scores = np.empty(ids.size, dtype=np.float32)
+        buffer = np.empty((min(self.CHUNK_ROWS, ids.size), vectors.shape[1]), dtype=np.float32)
+        for start in range(0, ids.size, self.CHUNK_ROWS):
+            chunk = vectors[start:start + self.CHUNK_ROWS]
+            rows = buffer[:chunk.shape[0]]
+            np.copyto(rows, chunk)
+            np.dot(rows, query, out=scores[start:start + chunk.shape[0]])
+
+        if exclude_id is not None:
+            scores[ids == exclude_id] = -np.inf
+        if approved_only:
+            scores[~approved] = -np.inf
+
+        k = min(k, ids.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    @span('knn')
+    def vote(self, vector):
+        """
+        Label from the nearest approved documents, or None when they disagree.
+
+        Only approved documents vote: a rejection may mean the document was
+        misclassified, so its category is not trusted as a label.
+        """
+        neighbours = [(doc_id, similarity) for doc_id, similarity
+                      in self.neighbours(vector, k=settings.KNN_NEIGHBOURS, approved_only=True)
+                      if similarity >= settings.KNN_MIN_SIMILARITY]
+        if len(neighbours) < settings.KNN_MIN_VOTES:
+            return None
+
+        weights = defaultdict(float)
+        for doc_id, similarity in neighbours:
+            category = self.labels.get(doc_id, (None, None))[1]
+            if category:
+                weights[category] += similarity
+        if not weights:
+            return None
+
+        category, weight = max(weights.items(), key=lambda item: item[1])
+        if weight / sum(weights.values()) >= settings.KNN_VOTE_THRESHOLD:
+            return category
+        return None
@@ -0,0 +1,210 @@
+import math
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from core import metrics
+from core.profiling import collect_stages, replay
+
+# Settings copied into the workers, so runtime overrides (tests, benchmarks)
+# reach the OCR there as well
+WORKER_SETTING_PREFIXES = ('OCR_', 'TESSERACT_')
+
+# Extra time the web process waits past the workers' own timeout before it
+# gives up on a worker that cannot be interrupted (stuck in C code)
+HARD_TIMEOUT_GRACE = 10
+
+# The OCR children's deadline comes this long before the worker's own
+# timeout interrupt, so they are killed by their own timeouts first rather
+# than orphaned by an exception unwinding past them
+CHILD_TIMEOUT_MARGIN = 1
+
+# The worker process' DocumentProcessor, created by _init_worker
+_processor = None
+
+class ExtractionQueueFull(Exception):
+    """Raised instead of queueing an extraction when the pool is saturated"""
+
+    def __init__(self, depth, retry_after):
+        super().__init__(f"{depth} documents are already waiting for extraction")
+        self.depth = depth
+        self.retry_after = retry_after
+
+class _SoftTimeout(BaseException):
+    # Not an Exception, so the extractors' "except Exception" handlers let it through
+    pass
+
+def _on_timeout(signum, frame):
+    raise _SoftTimeout()
+
+def _init_worker(overrides, memory_limit):
+    """Set up Django, apply the memory cap and import the extraction stack once"""
+    global _processor
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'docbackend.settings')
+    django.setup()
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+
+    if memory_limit:
+        import resource
+        # Address space, not RSS: a decompression bomb fails allocating
+        # instead of pushing the host into swap
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    signal.signal(signal.SIGALRM, _on_timeout)
+
+    from core.services.document_processor import DocumentProcessor
+    _processor = DocumentProcessor()
+    # A worker runs one task at a time, so its peak RSS is this document's
+    _processor.ocr_service.measure_rss = True
+
+def _extract(file_path, timeout):
+    """Runs in a worker: ``(text, ocr_stats, stages, started)``"""
+    started = time.monotonic()
+    _processor.ocr_service.deadline = started + max(timeout - CHILD_TIMEOUT_MARGIN, 0)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        with collect_stages() as stages:
+            text = _processor.extract_text(file_path)
+        return text, _processor.ocr_service.last_stats, stages, started
+    except _SoftTimeout:
+        raise ValueError(f"Document took longer than {timeout:g}s to extract")
+    except (MemoryError, ValueError) as e:
+        if time.monotonic() >= _processor.ocr_service.deadline:
+            # A Tesseract or pdftoppm child killed at its deadline
+            raise ValueError(f"Document took longer than {timeout:g}s to extract")
+        # The extractors report every failure as a ValueError; find the cause under it
+        cause = e
+        while cause is not None and not isinstance(cause, MemoryError):
+            cause = cause.__cause__ or cause.__context__
+        if cause is None:
+            raise
+        raise ValueError("Document needs more memory to extract than allowed")
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        _processor.ocr_service.deadline = None
+
+def _ready():
+    return os.getpid()
+
+class ExtractionExecutor:
+    """
+    Text extraction (PDF parsing, docx2txt, OCR) in a bounded pool of worker
+    processes, so a large document holds a worker's GIL instead of the web
+    process'.
+
+    Workers are started on first use and reused across requests; each
+    imports the extraction stack once and runs under an address space cap.
+    Tasks time out inside the worker (ValueError, like any unreadable
+    document); a worker that cannot be interrupted is killed and the pool
+    restarted. When ``workers + max_queue`` extractions are outstanding,
+    ``extract`` raises ExtractionQueueFull with the queue depth rather than
+    letting requests pile up. With ``workers=0`` extraction runs in the
+    calling thread.
+    """
+
+    def __init__(self, workers=None, max_queue=None, timeout=None, memory_limit_mb=None):
+        self.workers = settings.EXTRACTION_WORKERS if workers is None else workers
+        self.max_queue = settings.EXTRACTION_MAX_QUEUE if max_queue is None else max_queue
+        self.timeout = timeout or settings.EXTRACTION_TIMEOUT
+        memory_limit_mb = settings.EXTRACTION_MEMORY_LIMIT_MB if memory_limit_mb is None else memory_limit_mb
+        self.memory_limit = memory_limit_mb * 2 ** 20
+        self._pool = None
+        self._processor = None
+        self._lock = threading.Lock()
+        self._depth = 0
+        # Moving average of task seconds, for Retry-After estimates
+        self._average_seconds = 1.0
+
+    @property
+    def queue_depth(self):
+        """Extractions submitted by this process and not yet finished"""
+        return self._depth
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                overrides = {name: getattr(settings, name) for name in dir(settings)
+                             if name.startswith(WORKER_SETTING_PREFIXES)}
+                # spawn rather than fork: the web process has threads and
+                # possibly a loaded model that children must not inherit
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker, initargs=(overrides, self.memory_limit))
+                # Workers are otherwise spawned one at a time as load rises, each
+                # paying its startup inside a request; start them all now
+                for _ in range(self.workers):
+                    self._pool.submit(_ready)
+            return self._pool
+
+    def _restart_pool(self, pool):
+        with self._lock:
+            if self._pool is not pool:
+                return
+            self._pool = None
+        # ProcessPoolExecutor can't cancel a running task; kill its workers
+        for process in list((pool._processes or {}).values()):
+            process.kill()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _admit(self):
+        """Count a new extraction in, returning how many were already outstanding"""
+        with self._lock:
+            depth = self._depth
+            if depth >= self.workers + self.max_queue:
+                retry_after = math.ceil(depth / self.workers * self._average_seconds)
+                raise ExtractionQueueFull(depth, max(1, retry_after))
+            self._depth += 1
+            metrics.set_extraction_queue(self._depth)
+            return depth
+
+    def _finish(self, task_seconds):
+        with self._lock:
+            self._depth -= 1
+            if task_seconds is not None:
+                self._average_seconds = 0.8 * self._average_seconds + 0.2 * task_seconds
+            metrics.set_extraction_queue(self._depth)
+
+    def extract(self, file_path):
+        """``(text, ocr_stats)`` of a stored document, ocr_stats as OCRService.last_stats"""
+        if not self.workers:
+            if self._processor is None:
+                from core.services.document_processor import DocumentProcessor
+                self._processor = DocumentProcessor()
+            return self._processor.extract_text(file_path), self._processor.ocr_service.last_stats
+
+        ahead = self._admit()
+        submitted = time.monotonic()
+        task_seconds = None
+        try:
+            pool = self._get_pool()
+            future = pool.submit(_extract, file_path, self.timeout)
+            try:
+                # The worker's own timer only starts once the queue ahead has drained
+                text, ocr_stats, stages, started = future.result(
+                    timeout=self.timeout * (ahead // self.workers + 1) + HARD_TIMEOUT_GRACE)
+            except FutureTimeoutError:
+                self._restart_pool(pool)
+                raise ValueError(f"Document took longer than {self.timeout:g}s to extract")
+            except BrokenProcessPool:
+                # A worker died (e.g. killed by the kernel); the next request gets a fresh pool
+                self._restart_pool(pool)
+                raise RuntimeError("Extraction worker exited unexpectedly")
+            task_seconds = time.monotonic() - started
+        finally:
+            self._finish(task_seconds)
+
+        replay(stages)
+        # Both clocks are CLOCK_MONOTONIC, shared by every process on the host
+        replay([('extract.wait', max(0.0, started - submitted))])
+        return text, ocr_stats
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
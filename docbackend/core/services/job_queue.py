@@ -0,0 +1,267 @@
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, connections, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from core.models import ProcessingJob
+
+class LeaseLost(Exception):
+    """The job's lease expired and another worker claimed it; drop this attempt"""
+
+def worker_name():
+    """Identifies this process and thread in ``leased_by``"""
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+class JobQueue:
+    """
+    Processing jobs stored in the database, claimed under a lease.
+
+    A claimed job is 'running' until it completes or fails, or its lease
+    expires: a worker that dies mid-job leaves the row behind, and once the
+    lease runs out the job is claimed again. Every claim increments
+    ``attempts``, which doubles as a fencing token: a worker only completes
+    or fails the job if the row still carries its claim, so a worker that
+    overran its lease cannot overwrite the result of the one that took over.
+
+    Claims use ``SELECT ... FOR UPDATE SKIP LOCKED`` where the database
+    supports it (PostgreSQL, MySQL 8), so concurrent workers never wait on
+    each other's rows. SQLite has no row locks; there each candidate is
+    claimed with a conditional UPDATE that only matches while the row is
+    still claimable, and a worker that loses the race moves on to the next.
+
+    Jobs a worker holds (see leased()) have their lease renewed every third
+    of a lease from a background thread, so a long batch never outruns it;
+    the lease only bounds how long the jobs of a dead process wait.
+    """
+
+    def __init__(self, lease_seconds=None, max_attempts=None, backoff_seconds=None, max_backoff_seconds=None):
+        self.lease = timedelta(seconds=lease_seconds or settings.JOB_LEASE_SECONDS)
+        self.max_attempts = max_attempts or settings.JOB_MAX_ATTEMPTS
+        self.backoff_seconds = backoff_seconds or settings.JOB_RETRY_BACKOFF_SECONDS
+        self.max_backoff_seconds = max_backoff_seconds or settings.JOB_RETRY_MAX_BACKOFF_SECONDS
+        # Jobs being worked on in this process, by id, and the thread renewing their leases
+        self._held = {}
+        self._held_lock = threading.Lock()
+        self._renewer = None
+
+    def enqueue(self, uploaded_file, file_type, metadata, worker=None):
+        """
+        Record a stored upload as a job. With ``worker`` the job is created
+        already claimed by it, for processing within the request.
+        """
+        job = self._new_job(uploaded_file, file_type, metadata, worker)
+        job.save()
+        return job
+
+    def enqueue_many(self, uploads, metadata, batch=None, worker=None, sources=None):
+        """
+        Record ``(uploaded_file, file_type)`` pairs as jobs, in one insert:
+        queued, or claimed by ``worker`` like enqueue(). ``sources`` are the
+        files' original paths, if they were ingested from a directory.
+        """
+        sources = sources or [''] * len(uploads)
+        jobs = [self._new_job(uploaded_file, file_type, metadata, worker, batch, source)
+                for (uploaded_file, file_type), source in zip(uploads, sources)]
+        return ProcessingJob.objects.bulk_create(jobs)
+
+    def _new_job(self, uploaded_file, file_type, metadata, worker=None, batch=None, source=''):
+        now = timezone.now()
+        job = ProcessingJob(
+            job_id=str(uuid.uuid4()),
+            file_id=str(uuid.uuid4()),
+            file=uploaded_file.storage_name,
+            file_name=uploaded_file.name,
+            file_type=file_type,
+            content_hash=uploaded_file.content_hash,
+            size=uploaded_file.size,
+            metadata=metadata,
+            batch=batch,
+            source=source,
+            max_attempts=self.max_attempts,
+            created_at=now,
+            available_at=now,
+        )
+        if worker:
+            job.status = 'running'
+            job.attempts = 1
+            job.leased_by = worker
+            job.lease_expires_at = now + self.lease
+            job.started_at = now
+        return job
+
+    def _claimable(self, now):
+        return (Q(status='queued', available_at__lte=now)
+                | Q(status='running', lease_expires_at__lt=now, attempts__lt=F('max_attempts')))
+
+    def claim(self, worker, limit=1, **filters):
+        """Claim up to ``limit`` jobs that are due, oldest first, optionally only those matching ``filters``"""
+        now = timezone.now()
+        self._fail_abandoned(now)
+        claim = {'status': 'running', 'leased_by': worker, 'lease_expires_at': now + self.lease, 'started_at': now}
+        due = ProcessingJob.objects.filter(self._claimable(now), **filters)
+
+        if connection.features.has_select_for_update_skip_locked:
+            with transaction.atomic():
+                jobs = list(due.select_for_update(skip_locked=True).order_by('available_at', 'id')[:limit])
+                for job in jobs:
+                    job.attempts += 1
+                    for name, value in claim.items():
+                        setattr(job, name, value)
+                    job.save(update_fields=['attempts', *claim])
+            return jobs
+
+        claimed = []
+        # A few spare candidates, as other workers may win some of them
+        candidates = due.order_by('available_at', 'id').values_list('id', 'attempts')[:limit * 4]
+        for job_id, attempts in candidates:
+            if ProcessingJob.objects.filter(self._claimable(now), id=job_id, attempts=attempts).update(
+                    attempts=attempts + 1, **claim):
+                claimed.append(ProcessingJob.objects.get(id=job_id))
+                if len(claimed) == limit:
+                    break
+        return claimed
+
+    @contextmanager
+    def leased(self, jobs):
+        """Keep renewing the leases of claimed ``jobs`` while working on them"""
+        self.hold(jobs)
+        try:
+            yield
+        finally:
+            self._drop(jobs)
+
+    def hold(self, jobs):
+        """
+        Renew the leases of claimed ``jobs``, e.g. while they wait for their
+        turn, until they are finished or a leased() block around them ends
+        """
+        with self._held_lock:
+            for job in jobs:
+                self._held[job.id] = job
+            if self._held and self._renewer is None:
+                self._renewer = threading.Thread(target=self._renew_leases, name='docbackend-leases', daemon=True)
+                self._renewer.start()
+
+    def _drop(self, jobs):
+        with self._held_lock:
+            for job in jobs:
+                self._held.pop(job.id, None)
+
+    def _renew_leases(self):
+        """Runs while jobs are held, renewing their leases every third of a lease"""
+        try:
+            while True:
+                time.sleep(self.lease.total_seconds() / 3)
+                with self._held_lock:
+                    if not self._held:
+                        self._renewer = None
+                        return
+                    jobs = list(self._held.values())
+                try:
+                    self.renew(jobs)
+                except Exception as e:
+                    # Retried next round, well before the lease runs out
+                    print(f"Error renewing job leases: {str(e)}")
+        finally:
+            connections.close_all()
+
+    def renew(self, jobs):
+        """Extend the leases of claimed ``jobs`` to a full lease from now, returning those already lost"""
+        expires = timezone.now() + self.lease
+        lost = []
+        for job in jobs:
+            if self._owned(job).update(lease_expires_at=expires):
+                job.lease_expires_at = expires
+            else:
+                lost.append(job)
+        self._drop(lost)
+        return lost
+
+    def _fail_abandoned(self, now):
+        """Fail jobs whose last allowed attempt died with its worker"""
+        abandoned = ProcessingJob.objects.filter(status='running', lease_expires_at__lt=now,
+                                                 attempts__gte=F('max_attempts'))
+        for job in abandoned:
+            if self._owned(job).update(status='failed', finished_at=now, lease_expires_at=None,
+                                       last_error=job.last_error or 'Worker stopped during the last attempt'):
+                self._discard_file(job)
+
+    def _owned(self, job):
+        """The job's row, as long as it still carries this claim"""
+        return ProcessingJob.objects.filter(id=job.id, status='running', attempts=job.attempts,
+                                            leased_by=job.leased_by)
+
+    def complete(self, job, document, result, duration):
+        """
+        Mark the job succeeded. Call inside the transaction that creates the
+        document, so a lost lease rolls the document back too.
+        """
+        if not self._owned(job).update(status='succeeded', document=document, result=result,
+                                       finished_at=timezone.now(), duration=duration,
+                                       lease_expires_at=None, last_error=''):
+            raise LeaseLost(f"Job {job.job_id} was claimed by another worker")
+        job.status = 'succeeded'
+
+    def fail(self, job, error, duration=None, permanent=False):
+        """
+        Record a failed attempt: retried after an exponential backoff, or
+        failed for good when ``permanent`` or out of attempts, and its upload
+        deleted unless it came from ingest_dir. Returns the job's new status,
+        or None if the lease was lost.
+        """
+        self._drop([job])
+        now = timezone.now()
+        if permanent or job.attempts >= job.max_attempts:
+            if not self._owned(job).update(status='failed', last_error=error, finished_at=now,
+                                           duration=duration, lease_expires_at=None):
+                return None
+            self._discard_file(job)
+            job.status = 'failed'
+            return job.status
+
+        delay = min(self.backoff_seconds * 2 ** (job.attempts - 1), self.max_backoff_seconds)
+        # Jitter, so jobs that failed together (e.g. a database outage) don't retry together
+        delay *= random.uniform(0.75, 1.25)
+        if not self._owned(job).update(status='queued', last_error=error, duration=duration, leased_by='',
+                                       lease_expires_at=None, available_at=now + timedelta(seconds=delay)):
+            return None
+        job.status = 'queued'
+        return job.status
+
+    def release(self, job):
+        """Hand a claimed job back unprocessed, e.g. when its worker is shutting down"""
+        self._drop([job])
+        self._owned(job).update(status='queued', attempts=F('attempts') - 1, leased_by='',
+                                lease_expires_at=None)
+
+    def cancel(self, job):
+        """Forget a job that was never worked on, e.g. one refused by the scheduler"""
+        self._drop([job])
+        if self._owned(job).delete()[0]:
+            self._discard_file(job)
+
+    def _discard_file(self, job):
+        if job.source:
+            # Imported by ingest_dir, whose --move may have removed the original;
+            # the stored copy stays with the failed job so nothing is lost
+            return
+        try:
+            default_storage.delete(job.file)
+        except Exception as e:
+            print(f"Error removing stored upload {job.file}: {str(e)}")
+
+    def counts(self):
+        """``{status: jobs}``, plus how many queued jobs are due now"""
+        counts = dict.fromkeys(status for status, _ in ProcessingJob.STATUS_CHOICES)
+        counts.update(ProcessingJob.objects.values_list('status').annotate(jobs=Count('id')).order_by())
+        counts = {status: jobs or 0 for status, jobs in counts.items()}
+        counts['due'] = ProcessingJob.objects.filter(self._claimable(timezone.now())).count()
+        return counts
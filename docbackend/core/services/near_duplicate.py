@@ -0,0 +1,115 @@
+import hashlib
+import re
+import zlib
+import numpy as np
+from django.conf import settings
+from core.models import DocumentSignature, LSHBucket
+from core.profiling import span
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+class NearDuplicateDetector:
+    """
+    Flag documents whose extracted text is nearly identical to an existing one.
+
+    Text is reduced to character shingles and a MinHash signature, which is
+    banded into LSH buckets stored in the database. Lookups only compare
+    against documents sharing at least one bucket, so the cost depends on the
+    number of similar documents rather than the size of the corpus.
+    Character shingles are used because rescans differ by scattered OCR
+    character errors, which break word shingles far more often.
+    """
+
+    def __init__(self, num_perm=128, bands=16, shingle_size=5, threshold=None, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold or settings.NEAR_DUPLICATE_THRESHOLD
+
+        # Universal hash functions (a * x + b) mod p; a, b < 2^32 so a * x + b fits in 64 bits
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def _shingles(self, text):
+        """Hashed character shingles of the normalized text"""
+        text = ' '.join(re.sub(r'[^a-z0-9]+', ' ', text.lower()).split())
+        k = self.shingle_size
+        if len(text) < k:
+            return np.array([zlib.crc32(text.encode())], dtype=np.uint64) if text else np.array([], dtype=np.uint64)
+        encoded = text.encode()
+        hashes = {zlib.crc32(encoded[i:i + k]) for i in range(len(encoded) - k + 1)}
+        return np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+
+    @span('near_duplicate.signature')
+    def signature(self, text):
+        """MinHash signature (uint32 array of length num_perm) of ``text``"""
+        shingles = self._shingles(text or '')
+        if shingles.size == 0:
+            return np.full(self.num_perm, MAX_HASH, dtype=np.uint32)
+
+        signature = np.full(self.num_perm, MAX_HASH, dtype=np.uint64)
+        # Chunk so the (shingles x permutations) matrix stays small
+        for start in range(0, shingles.size, 2048):
+            chunk = shingles[start:start + 2048, np.newaxis]
+            hashed = ((chunk * self.a + self.b) % MERSENNE_PRIME) & MAX_HASH
+            np.minimum(signature, hashed.min(axis=0), out=signature)
+        return signature.astype(np.uint32)
+
+    def bucket_keys(self, signature):
+        """One signed 64-bit key per LSH band"""
+        keys = []
+        for band in range(self.bands):
+            rows = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            digest = hashlib.blake2b(bytes([band]) + rows, digest_size=8).digest()
+            keys.append(int.from_bytes(digest, 'big', signed=True))
+        return keys
+
+    @span('near_duplicate.lookup')
+    def find_duplicate(self, signature, exclude_id=None):
+        """Return ``(document_id, similarity)`` of the closest match above threshold, or ``(None, 0.0)``"""
+        candidates = LSHBucket.objects.filter(key__in=self.bucket_keys(signature))
+        if exclude_id is not None:
+            candidates = candidates.exclude(document_id=exclude_id)
+        candidate_ids = set(candidates.values_list('document_id', flat=True))
+        if not candidate_ids:
+            return None, 0.0
+
+        best_id, best_similarity = None, 0.0
+        for document_id, minhash in DocumentSignature.objects.filter(
+                document_id__in=candidate_ids).values_list('document_id', 'minhash'):
+            other = np.frombuffer(bytes(minhash), dtype=np.uint32)
+            # Fraction of equal MinHash values estimates Jaccard similarity
+            similarity = float(np.mean(other == signature))
+            if similarity > best_similarity:
+                best_id, best_similarity = document_id, similarity
+
+        if best_similarity >= self.threshold:
+            return best_id, best_similarity
+        return None, best_similarity
+
+    def index(self, document, signature):
+        """Store the document's signature and LSH buckets"""
+        DocumentSignature.objects.update_or_create(
+            document=document, defaults={'minhash': signature.astype(np.uint32).tobytes()})
+        LSHBucket.objects.filter(document=document).delete()
+        LSHBucket.objects.bulk_create([
+            LSHBucket(document=document, band=band, key=key)
+            for band, key in enumerate(self.bucket_keys(signature))
+        ])
+
+    def index_many(self, documents, signatures):
+        """Store the signatures and LSH buckets of newly created documents, in two inserts"""
+        DocumentSignature.objects.bulk_create([
+            DocumentSignature(document=document, minhash=signature.astype(np.uint32).tobytes())
+            for document, signature in zip(documents, signatures)
+        ])
+        LSHBucket.objects.bulk_create([
+            LSHBucket(document=document, band=band, key=key)
+            for document, signature in zip(documents, signatures)
+            for band, key in enumerate(self.bucket_keys(signature))
+        ])
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max
+from core.models import Notification
+
+LATEST_ID_CACHE_KEY = 'notifications_latest_id'
+
+def serialize_notification(notif):
+    """API representation of a notification and its document"""
+    return {
+        'id': notif.id,
+        'type': notif.type,
+        'message': notif.message,
+        'created_at': notif.created_at,
+        'is_read': notif.is_read,
+        'document': {
+            'id': notif.document.id,
+            'file_name': notif.document.file_name,
+            'status': notif.document.status
+        }
+    }
+
+class NotificationFeed:
+    """
+    Incremental notification feed keyed on the notification id.
+
+    Waiting clients only compare the cursor with a "latest id" marker in the
+    cache, which is bumped whenever a notification is created. With a
+    per-process cache the marker can miss notifications created by other
+    workers, so the database is also checked every few polls.
+
+    The ``a``-prefixed methods are the async equivalents used by the ASGI
+    views; they wait with ``asyncio.sleep`` so an idle long-poll or stream
+    holds no thread. Streams are only served that way.
+    """
+
+    def __init__(self, poll_interval=None, db_check_every=None):
+        self.poll_interval = poll_interval or settings.NOTIFICATION_POLL_INTERVAL
+        self.db_check_every = db_check_every or settings.NOTIFICATION_DB_CHECK_EVERY
+
+    @staticmethod
+    def publish(notification_id):
+        """Record that a notification with this id now exists"""
+        latest = cache.get(LATEST_ID_CACHE_KEY)
+        if latest is None or notification_id > latest:
+            cache.set(LATEST_ID_CACHE_KEY, notification_id, None)
+
+    def latest_id(self):
+        latest = cache.get(LATEST_ID_CACHE_KEY)
+        if latest is None:
+            latest = self._latest_id_from_db()
+        return latest
+
+    def _latest_id_from_db(self):
+        latest = Notification.objects.aggregate(latest=Max('id'))['latest'] or 0
+        self.publish(latest)
+        return latest
+
+    def recent(self, limit=50):
+        """Most recent notifications, newest first"""
+        return list(Notification.objects.select_related('document').order_by('-created_at')[:limit])
+
+    def since(self, cursor, limit=100):
+        """Notifications created after ``cursor``, oldest first"""
+        return list(Notification.objects.select_related('document')
+                    .filter(id__gt=cursor).order_by('id')[:limit])
+
+    def wait(self, cursor, timeout):
+        """Block for up to ``timeout`` seconds until a notification newer than ``cursor`` exists"""
+        deadline = time.monotonic() + timeout
+        polls = 0
+        while True:
+            if self.latest_id() > cursor:
+                return True
+            polls += 1
+            if polls % self.db_check_every == 0 and self._latest_id_from_db() > cursor:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.poll_interval, remaining))
+
+    def _clamp_latest_id(self):
+        """
+        Pull the marker back to the table's latest id when it is ahead of it
+        (e.g. notifications were deleted), so waiting goes back to checking
+        the cache alone. A notification published meanwhile is still found
+        by the periodic database check.
+        """
+        latest = Notification.objects.aggregate(latest=Max('id'))['latest'] or 0
+        cache.set(LATEST_ID_CACHE_KEY, latest, None)
+
+    def poll(self, cursor, timeout):
+        """Notifications after ``cursor``, waiting up to ``timeout`` seconds for some to appear"""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if not self.wait(cursor, max(remaining, 0)):
+                return []
+            notifications = self.since(cursor)
+            if notifications:
+                return notifications
+            self._clamp_latest_id()
+            if deadline - time.monotonic() <= 0:
+                return []
+
+    @staticmethod
+    async def apublish(notification_id):
+        latest = await cache.aget(LATEST_ID_CACHE_KEY)
+        if latest is None or notification_id > latest:
+            await cache.aset(LATEST_ID_CACHE_KEY, notification_id, None)
+
+    async def alatest_id(self):
+        latest = await cache.aget(LATEST_ID_CACHE_KEY)
+        if latest is None:
+            latest = await self._alatest_id_from_db()
+        return latest
+
+    async def _alatest_id_from_db(self):
+        latest = (await Notification.objects.aaggregate(latest=Max('id')))['latest'] or 0
+        await self.apublish(latest)
+        return latest
+
+    async def arecent(self, limit=50):
+        return [notif async for notif in
+                Notification.objects.select_related('document').order_by('-created_at')[:limit]]
+
+    async def asince(self, cursor, limit=100):
+        return [notif async for notif in
+                Notification.objects.select_related('document').filter(id__gt=cursor).order_by('id')[:limit]]
+
+    async def await_new(self, cursor, timeout):
+        # wait(); "await" itself is a keyword
+        deadline = time.monotonic() + timeout
+        polls = 0
+        while True:
+            if await self.alatest_id() > cursor:
+                return True
+            polls += 1
+            if polls % self.db_check_every == 0 and await self._alatest_id_from_db() > cursor:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(self.poll_interval, remaining))
+
+    async def _aclamp_latest_id(self):
+        latest = (await Notification.objects.aaggregate(latest=Max('id')))['latest'] or 0
+        await cache.aset(LATEST_ID_CACHE_KEY, latest, None)
+
+    async def apoll(self, cursor, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if not await self.await_new(cursor, max(remaining, 0)):
+                return []
+            notifications = await self.asince(cursor)
+            if notifications:
+                return notifications
+            await self._aclamp_latest_id()
+            if deadline - time.monotonic() <= 0:
+                return []
+
+    async def astream(self, cursor, max_seconds=None, keepalive=15):
+        """
+        Yield Server-Sent Events for notifications newer than ``cursor``.
+
+        Only served by the ASGI views, where an idle stream holds no thread.
+        The stream ends after ``max_seconds``; clients reconnect with the
+        Last-Event-ID header and resume where they left off.
+        """
+        max_seconds = max_seconds or settings.NOTIFICATION_STREAM_MAX_SECONDS
+        deadline = time.monotonic() + max_seconds
+        yield f"retry: {int(self.poll_interval * 1000)}\n\n"
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            notifications = await self.apoll(cursor, min(keepalive, remaining))
+            for notif in notifications:
+                data = json.dumps(serialize_notification(notif), cls=DjangoJSONEncoder)
+                yield f"id: {notif.id}\nevent: notification\ndata: {data}\n\n"
+                cursor = notif.id
+            if not notifications:
+                yield ": keepalive\n\n"
@@ -0,0 +1,71 @@
+import hashlib
+import os
+import tempfile
+from django.conf import settings
+from core.utils import CacheBudget
+
+class OCRResultCache:
+    """
+    On-disk cache of recognized text per rasterized page.
+
+    Entries are keyed by a hash of the page's decoded pixels together with
+    everything that changes Tesseract's output (the OCR and preprocessing
+    settings, language and the preprocessing version), so a re-uploaded
+    scan only sends its changed pages to OCR. Pixels rather than file bytes are hashed because a scan
+    re-exported with one page replaced still decodes its other pages to
+    identical pixels.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir or settings.OCR_CACHE_DIR
+        self.max_bytes = max_bytes or settings.OCR_CACHE_MAX_BYTES
+        self.budget = CacheBudget(self.cache_dir, self.max_bytes)
+
+    def key(self, page, config, lang, version):
+        """Cache key of one page image and OCR configuration"""
+        hasher = hashlib.sha256(f"{config}|{lang}|{version}|{page.mode}|{page.size}".encode())
+        hasher.update(page.tobytes())
+        return hasher.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.txt")
+
+    def get(self, key):
+        """Cached text for ``key``, or None"""
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                text = f.read()
+        except FileNotFoundError:
+            return None
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"Error reading OCR cache entry {path}: {str(e)}")
+            return None
+        try:
+            # Touch on hit so eviction drops the least recently used pages
+            os.utime(path)
+        except OSError:
+            pass
+        return text
+
+    def set(self, key, text):
+        """
+        Store the text recognized for ``key``. Best effort: a full or
+        read-only cache directory is logged, never fails the OCR.
+        """
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(text)
+                os.replace(tmp_path, path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+
+            self.budget.added(len(text.encode('utf-8')))
+        except OSError as e:
+            print(f"Error writing OCR cache entry {path}: {str(e)}")
@@ -1,16 +1,79 @@
 import pytesseract
-from PIL import Image, ImageEnhance
+import PyPDF2
+from pdf2image import convert_from_path
+from PIL import Image, ImageEnhance, ImageOps
+import math
 import os
+import threading
+import time
 from django.conf import settings
 import numpy as np
+from core.utils import reset_peak_rss, read_peak_rss
+from core.profiling import span
+from .ocr_cache import OCRResultCache
+
+try:
+    # Optional: lets Pillow open HEIC/HEIF phone photos
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+except ImportError:
+    pass
+
+# Bytes Pillow holds per pixel for an image's mode (RGB is padded to 4)
+DECODED_BYTES_PER_PIXEL = {'1': 1, 'L': 1, 'P': 1, 'I;16': 2, 'RGB': 4}
 
 class OCRService:
+    # Bump whenever preprocess_image changes, so cached page text from the
+    # old preprocessing is not reused
+    PREPROCESS_VERSION = 3
+
     def __init__(self):
         # Set Tesseract command path if defined in settings
         if hasattr(settings, 'TESSERACT_CMD'):
             pytesseract.pytesseract.tesseract_cmd = settings.TESSERACT_CMD
         self.debug = settings.DEBUG
+        self.max_pixels = settings.OCR_MAX_PIXELS
+        self._local = threading.local()
+        self.config = r'--oem 3 --psm 1'  # Use LSTM OCR Engine Mode and Automatic page segmentation
+        self.lang = 'eng'
+        self.pdf_dpi = 300
+        self.cache = OCRResultCache() if settings.OCR_CACHE_ENABLED else None
+        self.auto_orient = settings.OCR_AUTO_ORIENT
+        self.max_skew = settings.OCR_MAX_SKEW_DEGREES
+        # 'text' runs image_to_string over the whole page; 'regions' crops to
+        # detected text blocks and reads per-word confidences (see _recognize_regions)
+        self.mode = settings.OCR_MODE
+        self.min_confidence = settings.OCR_MIN_CONFIDENCE
+        self.early_stop_words = settings.OCR_EARLY_STOP_WORDS
+        # Peak RSS is a per-process counter, so it only describes one image
+        # where nothing else runs alongside it: the extraction pool's workers
+        # turn this on, threaded callers leave the memory stats at None
+        self.measure_rss = False
+        # time.monotonic() by which the current document must be done, set by
+        # the extraction pool's workers: Tesseract and pdftoppm run as child
+        # processes, which their timeout interrupt can't reach
+        self.deadline = None
+
+    def _child_timeout(self):
+        """Seconds a Tesseract or pdftoppm child may run before it is killed, 0 for no limit"""
+        if self.deadline is None:
+            return 0
+        return max(self.deadline - time.monotonic(), 0.01)
 
+    @property
+    def last_stats(self):
+        """Memory statistics of the last image processed by this thread"""
+        return getattr(self._local, 'stats', None)
+
+    @property
+    def last_words(self):
+        """
+        Words recognized by this thread's last call in 'regions' mode, as dicts
+        with text, conf, page and a left/top/width/height box in page pixels
+        """
+        return getattr(self._local, 'words', [])
+
+    @span('ocr.preprocess')
     def preprocess_image(self, image):
         """Preprocess image to improve OCR accuracy"""
         try:
@@ -18,6 +81,10 @@ class OCRService:
             if image.mode not in ('RGB', 'L'):
                 image = image.convert('RGB')
 
+            # Straighten the page first, so full-resolution OCR runs only once
+            if self.auto_orient:
+                image = self.correct_orientation(image)
+
             # Enhance contrast
             enhancer = ImageEnhance.Contrast(image)
             image = enhancer.enhance(2.0)
@@ -26,13 +93,14 @@ class OCRService:
             enhancer = ImageEnhance.Sharpness(image)
             image = enhancer.enhance(2.0)
 
-            # Upscale image if too small
+            # Upscale image if too small, as long as it stays under the pixel cap
             if image.size[0] < 1000 or image.size[1] < 1000:
                 scale = 2
-                image = image.resize(
-                    (int(image.size[0] * scale), int(image.size[1] * scale)),
-                    Image.LANCZOS
-                )
+                if image.size[0] * image.size[1] * scale * scale <= self.max_pixels:
+                    image = image.resize(
+                        (int(image.size[0] * scale), int(image.size[1] * scale)),
+                        Image.LANCZOS
+                    )
 
             return image
         except Exception as e:
@@ -40,6 +108,262 @@ class OCRService:
                 print(f"Error preprocessing image: {str(e)}")
             raise ValueError(f"Failed to preprocess image: {str(e)}")
 
+    @span('ocr.orient')
+    def correct_orientation(self, image):
+        """
+        Rotate a page upright and remove small scan skew.
+
+        Both checks run on a downscaled copy: Tesseract's orientation and
+        script detection (OSD) for 90/180/270 degree turns, then a NumPy
+        projection profile for the residual skew. Only the final rotation
+        touches the full-resolution image.
+        """
+        rotate = self._detect_rotation(image)
+        if rotate:
+            # OSD reports the clockwise turn that makes the page upright
+            image = image.transpose({90: Image.ROTATE_270, 180: Image.ROTATE_180, 270: Image.ROTATE_90}[rotate])
+
+        angle = self._detect_skew(image)
+        if abs(angle) >= 0.2:
+            fill = 255 if image.mode == 'L' else (255, 255, 255)
+            image = image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=fill)
+
+        if self.debug and (rotate or abs(angle) >= 0.2):
+            print(f"Corrected orientation: rotated {rotate} degrees, deskewed {angle:.1f} degrees")
+        return image
+
+    def _detect_rotation(self, image):
+        """Clockwise rotation (0, 90, 180 or 270) that makes the page upright"""
+        small = image.convert('L')
+        small.thumbnail((1500, 1500))
+        try:
+            osd = pytesseract.image_to_osd(small, config='--psm 0', output_type=pytesseract.Output.DICT,
+                                           timeout=self._child_timeout())
+        except pytesseract.TesseractError:
+            # Raised for pages with too little text to judge; leave them as they are
+            return 0
+        if osd.get('orientation_conf', 0) < 2.0:
+            return 0
+        return int(osd.get('rotate', 0)) % 360
+
+    def _ink_mask(self, image, size):
+        """Downscaled copy of ``image`` with ink at 255 and background at 0"""
+        small = ImageOps.autocontrast(image.convert('L'))
+        small.thumbnail((size, size))
+        return Image.fromarray(((np.asarray(small) < 128) * 255).astype(np.uint8))
+
+    def _detect_skew(self, image):
+        """Counter-clockwise angle in degrees that levels the text lines"""
+        ink = self._ink_mask(image, 800)
+        coverage = np.asarray(ink).mean() / 255
+        # Blank pages and mostly dark photos have no text lines to level
+        if coverage == 0 or coverage > 0.5:
+            return 0.0
+
+        def score(angle):
+            # Level text lines give a row profile alternating sharply between
+            # ink and gaps; skewed lines smear it out
+            profile = np.asarray(ink.rotate(angle, resample=Image.NEAREST), dtype=np.float32).sum(axis=1)
+            return float(np.sum(np.diff(profile) ** 2))
+
+        # Coarse search in whole degrees, then refine around the best one
+        best = max(np.arange(-self.max_skew, self.max_skew + 1, 1.0), key=score)
+        best = max(np.arange(best - 1, best + 1.01, 0.1), key=score)
+        return round(float(best), 1)
+
+    def _iter_frames(self, image):
+        """Yield the frames of a (possibly multi-page) image one at a time"""
+        for index in range(getattr(image, 'n_frames', 1)):
+            image.seek(index)
+            yield image
+
+    @span('ocr.decode')
+    def _bound_pixels(self, frame):
+        """
+        Decode a frame at no more than ``max_pixels`` pixels.
+
+        JPEG frames are decoded directly at a reduced scale with ``draft``, so
+        the full-resolution buffer is never allocated. Other formats have to
+        be decoded once and are scaled down straight away, before any
+        enhancement multiplies the buffer; those whose full-size buffer would
+        be larger than an RGB image at the cap are refused before decoding.
+        """
+        width, height = frame.size
+        pixels = width * height
+        if pixels <= self.max_pixels:
+            return frame
+
+        factor = math.sqrt(pixels / self.max_pixels)
+        target = (int(width / factor), int(height / factor))
+        if frame.format == 'JPEG':
+            frame.draft(frame.mode if frame.mode in ('RGB', 'L') else 'RGB', target)
+        elif getattr(frame, 'tile', None):
+            # Still encoded (rendered PDF pages are already in memory)
+            decoded = pixels * DECODED_BYTES_PER_PIXEL.get(frame.mode, 4)
+            if decoded > self.max_pixels * DECODED_BYTES_PER_PIXEL['RGB']:
+                raise ValueError(f"{frame.format} image is too large to process ({width}x{height} "
+                                 f"{frame.mode}); at most {self.max_pixels:,} RGB pixels are allowed")
+
+        # draft only picks scales of 1/2, 1/4 or 1/8; finish with a resize that
+        # reduces by an integer factor first and then resamples to the exact cap
+        pixels = frame.size[0] * frame.size[1]
+        if pixels > self.max_pixels:
+            factor = math.sqrt(pixels / self.max_pixels)
+            target = (int(frame.size[0] / factor), int(frame.size[1] / factor))
+            frame = frame.resize(target, Image.LANCZOS, reducing_gap=2.0)
+        return frame
+
+    def _recognize(self, frame, stats):
+        """OCR one frame, reusing the cached text when the same page was seen before"""
+        page = self._bound_pixels(frame)
+        stats['frames'] += 1
+        stats['source_pixels'] = max(stats['source_pixels'], frame.size[0] * frame.size[1])
+
+        key = None
+        if self.cache is not None:
+            with span('ocr.cache'):
+                key = self.cache.key(page, self._cache_config(), self.lang, self.PREPROCESS_VERSION)
+                text = self.cache.get(key)
+            if text is not None:
+                stats['cached_frames'] += 1
+                if self.mode == 'regions':
+                    # Text cached in 'regions' mode only holds confident words
+                    stats['confident_words'] += len(text.split())
+                return text
+
+        # Preprocess image
+        page = self.preprocess_image(page)
+        stats['peak_pixels'] = max(stats['peak_pixels'], page.size[0] * page.size[1])
+
+        if self.mode == 'regions':
+            text = self._recognize_regions(page, stats)
+        else:
+            # Extract text with improved configuration
+            with span('ocr.tesseract'):
+                text = pytesseract.image_to_string(
+                    page,
+                    config=self.config,
+                    lang=self.lang,  # Specify language explicitly
+                    timeout=self._child_timeout()
+                )
+        # A page cut short by the early-stop budget isn't its full text
+        if key is not None and not stats.get('early_stopped'):
+            self.cache.set(key, text)
+        return text
+
+    def _cache_config(self):
+        """Every setting that changes a page's preprocessing or recognition, for the cache key"""
+        return (f"{self.config}|{self.mode}|orient={self.auto_orient}|skew={self.max_skew}"
+                f"|max_pixels={self.max_pixels}|min_conf={self.min_confidence}"
+                f"|early_stop={self.early_stop_words}")
+
+    def _text_regions(self, page):
+        """
+        Boxes ``(left, top, right, bottom)`` around the blocks of text on a
+        page, top to bottom, found from the ink profile of a downscaled copy
+        """
+        ink = np.asarray(self._ink_mask(page, 1000)) > 0
+        scale = page.size[0] / ink.shape[1]
+        rows = np.flatnonzero(ink.mean(axis=1) > 0.002)
+        if not rows.size:
+            return []
+
+        # Only wide blank bands split blocks: every block costs a separate
+        # Tesseract run, so lines and ordinary paragraphs stay together
+        gap = max(3, int(ink.shape[0] * 0.03))
+        splits = np.flatnonzero(np.diff(rows) > gap)
+        regions = []
+        for band in np.split(rows, splits + 1):
+            columns = np.flatnonzero(ink[band[0]:band[-1] + 1].any(axis=0))
+            # Pad so characters touching the band edges aren't clipped
+            pad = gap
+            left, right = max(0, columns[0] - pad), min(ink.shape[1], columns[-1] + 1 + pad)
+            top, bottom = max(0, band[0] - pad), min(ink.shape[0], band[-1] + 1 + pad)
+            regions.append(tuple(int(round(value * scale)) for value in (left, top, right, bottom)))
+        return regions
+
+    def _recognize_regions(self, page, stats):
+        """
+        OCR a page block by block with image_to_data, keeping confident words.
+
+        Blank margins are never sent to Tesseract, and recognition stops once
+        ``early_stop_words`` confident words have been read across the
+        document, which is plenty for classification (typically the header
+        of a certificate).
+        """
+        lines = {}
+        page_number = stats['frames']
+        for index, (left, top, right, bottom) in enumerate(self._text_regions(page)):
+            if self.early_stop_words and stats['confident_words'] >= self.early_stop_words:
+                stats['early_stopped'] = True
+                break
+            stats['regions'] += 1
+            with span('ocr.tesseract'):
+                data = pytesseract.image_to_data(
+                    page.crop((left, top, right, bottom)),
+                    config=self.config,
+                    lang=self.lang,
+                    output_type=pytesseract.Output.DICT,
+                    timeout=self._child_timeout()
+                )
+            for i, word in enumerate(data['text']):
+                word = word.strip()
+                conf = float(data['conf'][i])
+                # conf is -1 for layout rows (blocks, paragraphs, lines) that carry no text
+                if not word or conf < 0:
+                    continue
+                self._local.words.append({
+                    'text': word, 'conf': conf, 'page': page_number,
+                    'left': left + data['left'][i], 'top': top + data['top'][i],
+                    'width': data['width'][i], 'height': data['height'][i],
+                })
+                if conf >= self.min_confidence:
+                    stats['confident_words'] += 1
+                    line = (index, data['block_num'][i], data['par_num'][i], data['line_num'][i])
+                    lines.setdefault(line, []).append(word)
+
+        return '\n'.join(' '.join(words) for words in lines.values())
+
+    def _ocr_frames(self, frames):
+        """OCR a sequence of frames and join their text, recording memory statistics"""
+        rss_before = None
+        if self.measure_rss:
+            reset_peak_rss()
+            rss_before = read_peak_rss()
+        stats = {'frames': 0, 'cached_frames': 0, 'source_pixels': 0, 'peak_pixels': 0}
+        if self.mode == 'regions':
+            stats.update({'regions': 0, 'confident_words': 0, 'early_stopped': False})
+        self._local.words = []
+        texts = []
+
+        for frame in frames:
+            text = self._recognize(frame, stats)
+            if text.strip():
+                texts.append(text.strip())
+            if self.mode == 'regions' and self.early_stop_words and \
+                    stats['confident_words'] >= self.early_stop_words:
+                stats['early_stopped'] = True
+                break
+
+        text = '\n\n'.join(texts)
+        stats['peak_rss_bytes'] = read_peak_rss() if self.measure_rss else None
+        stats['rss_growth_bytes'] = (stats['peak_rss_bytes'] - rss_before
+                                     if stats['peak_rss_bytes'] is not None and rss_before is not None else None)
+        self._local.stats = stats
+
+        if self.debug:
+            print(f"Extracted text length: {len(text)}")
+            print(f"OCR memory stats: {stats}")
+            if text:
+                print(f"First 100 chars: {text[:100]}")
+            else:
+                print("No text extracted")
+
+        if not text.strip():
+            raise ValueError("No text could be extracted from the image")
+
+        return text.strip()
+
     def extract_text(self, image_path):
         """Extract text from an image using Tesseract OCR."""
         try:
@@ -48,38 +372,37 @@ class OCRService:
                 print(f"Image exists: {os.path.exists(image_path)}")
                 print(f"Tesseract path: {pytesseract.pytesseract.tesseract_cmd}")
 
-            image = Image.open(image_path)
-            
-            if self.debug:
-                print(f"Image size: {image.size}")
-                print(f"Image mode: {image.mode}")
+            with Image.open(image_path) as image:
+                if self.debug:
+                    print(f"Image size: {image.size}")
+                    print(f"Image mode: {image.mode}")
 
-            # Preprocess image
-            image = self.preprocess_image(image)
+                # Frames are decoded lazily, so a multi-page TIFF never sits in memory at once
+                return self._ocr_frames(self._iter_frames(image))
 
-            # Configure OCR
-            custom_config = r'--oem 3 --psm 1'  # Use LSTM OCR Engine Mode and Automatic page segmentation
-            
-            # Extract text with improved configuration
-            text = pytesseract.image_to_string(
-                image,
-                config=custom_config,
-                lang='eng'  # Specify language explicitly
-            )
-            
+        except Exception as e:
             if self.debug:
-                print(f"Extracted text length: {len(text)}")
-                if text:
-                    print(f"First 100 chars: {text[:100]}")
-                else:
-                    print("No text extracted")
-
-            if not text.strip():
-                raise ValueError("No text could be extracted from the image")
+                print(f"Error processing image: {str(e)}")
+            raise ValueError(f"Failed to extract text from image: {str(e)}")
 
-            return text.strip()
+    def _iter_pdf_pages(self, pdf_path):
+        """Rasterize a PDF one page at a time"""
+        with open(pdf_path, 'rb') as file:
+            page_count = len(PyPDF2.PdfReader(file).pages)
+        for number in range(1, page_count + 1):
+            with span('ocr.rasterize'):
+                pages = convert_from_path(pdf_path, dpi=self.pdf_dpi, first_page=number, last_page=number,
+                                          timeout=self._child_timeout() or None)
+            if pages:
+                yield pages[0]
 
+    def extract_text_from_pdf(self, pdf_path):
+        """Extract text from a scanned PDF that has no text layer"""
+        try:
+            if self.debug:
+                print(f"Running OCR on scanned PDF: {pdf_path}")
+            return self._ocr_frames(self._iter_pdf_pages(pdf_path))
         except Exception as e:
             if self.debug:
-                print(f"Error processing image: {str(e)}")
-            raise ValueError(f"Failed to extract text from image: {str(e)}")
\ No newline at end of file
+                print(f"Error processing scanned PDF: {str(e)}")
+            raise ValueError(f"Failed to extract text from scanned PDF: {str(e)}")
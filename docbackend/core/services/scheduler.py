@@ -0,0 +1,238 @@
+import heapq
+import itertools
+import math
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from PIL import Image
+from django.conf import settings
+from core import metrics
+from core.profiling import record
+from core.services.document_processor import IMAGE_EXTENSIONS
+
+# Work classes in dispatch priority order: text-layer documents take
+# milliseconds, OCR takes seconds per page
+WORK_CLASSES = ('fast', 'ocr')
+
+# DOCX has no page count without parsing it; bill it per this many bytes
+DOCX_BYTES_PER_PAGE = 100 * 1024
+
+# Same for a PDF whose page tree sits in compressed object streams
+PDF_BYTES_PER_PAGE = 100 * 1024
+
+# Markers read from a PDF's raw bytes: page tree counts, image XObjects
+# (streams, so never hidden in object streams) and font resources
+PDF_MARKERS = re.compile(rb'/Count\s{0,8}(\d{1,9})|/Subtype\s{0,8}/Image|/Font')
+PDF_PROBE_CHUNK = 1024 * 1024
+# Longer than any marker, so one cut by a chunk boundary is found in the next
+PDF_PROBE_OVERLAP = 64
+
+class Overloaded(Exception):
+    """Raised when an upload's estimated wait is longer than its class allows"""
+
+    def __init__(self, work_class, wait, retry_after):
+        super().__init__(f"Estimated wait for {work_class} processing is {wait:.0f}s")
+        self.work_class = work_class
+        self.wait = wait
+        self.retry_after = retry_after
+
+class WorkEstimate:
+    """Predicted class, pages and extraction seconds of one upload"""
+
+    def __init__(self, work_class, pages, seconds):
+        self.work_class = work_class
+        self.pages = pages
+        self.seconds = seconds
+
+    def __repr__(self):
+        return f"WorkEstimate({self.work_class!r}, pages={self.pages}, seconds={self.seconds:.2f})"
+
+def _pdf_pages(file_path):
+    """
+    ``(pages, has_text_layer)`` from a scan of the PDF's raw bytes.
+
+    The upload is untrusted and this runs in the web process, outside the
+    extraction pool's memory cap and timeout, so nothing is parsed: the
+    file is read in chunks and only PDF_MARKERS are counted. The root page
+    tree has the largest /Count; a PDF with images but no fonts is a scan.
+    """
+    counts, images, fonts = [], 0, False
+    try:
+        with open(file_path, 'rb') as file:
+            buffer = b''
+            while True:
+                chunk = file.read(PDF_PROBE_CHUNK)
+                buffer += chunk
+                limit = len(buffer) - PDF_PROBE_OVERLAP if chunk else len(buffer)
+                for match in PDF_MARKERS.finditer(buffer):
+                    if match.start() >= limit:
+                        break
+                    if match.group(1):
+                        counts.append(int(match.group(1)))
+                    elif match.group(0) == b'/Font':
+                        fonts = True
+                    else:
+                        images += 1
+                if not chunk:
+                    break
+                buffer = buffer[max(limit, 0):]
+            size = file.tell()
+    except OSError:
+        # Unreadable here means unreadable for the extractor too; it fails fast
+        return 1, True
+
+    has_text = fonts or not images
+    if counts:
+        pages = max(counts)
+    elif not has_text:
+        pages = images
+    else:
+        pages = math.ceil(size / PDF_BYTES_PER_PAGE)
+    return max(pages, 1), has_text
+
+def _image_frames(file_path):
+    try:
+        with Image.open(file_path) as image:
+            return max(getattr(image, 'n_frames', 1), 1)
+    except Exception:
+        return 1
+
+class ProcessingScheduler:
+    """
+    Admission control and dispatch for document extraction in this process.
+
+    Each upload's cost is estimated from its type, size and page count and it
+    joins the queue of its work class: 'fast' for DOCX and PDFs with a text
+    layer, 'ocr' for images and scanned PDFs. ``slots`` uploads run at once;
+    OCR may take at most ``slots - 1`` of them, so text documents never wait
+    behind scans, and freed slots go to 'fast' work first. Within a class the
+    upload that would finish earliest (arrival time + estimated seconds) goes
+    next, so small scans overtake big ones without starving them.
+
+    An upload whose estimated wait exceeds its class' maximum is refused with
+    Overloaded, carrying the seconds until the queue is expected to have
+    drained below that maximum. Seconds per page are learned from finished
+    work, so estimates follow the actual hardware and OCR settings.
+    """
+
+    def __init__(self, slots=None, max_wait=None, page_seconds=None):
+        self.slots = max(slots or settings.PROCESSING_SLOTS, 1)
+        self.max_wait = dict(max_wait or settings.PROCESSING_MAX_WAIT_SECONDS)
+        self.page_seconds = dict(page_seconds or settings.PROCESSING_PAGE_SECONDS)
+        # One slot is kept for fast work, unless there is only one
+        self.limits = {'fast': self.slots, 'ocr': max(self.slots - 1, 1)}
+        self._condition = threading.Condition()
+        self._queues = {work_class: [] for work_class in WORK_CLASSES}
+        self._running = {work_class: {} for work_class in WORK_CLASSES}
+        self._order = itertools.count()
+
+    def estimate(self, file_path, size=None):
+        """WorkEstimate of a stored upload"""
+        extension = os.path.splitext(file_path)[1].lower()
+        if extension == '.pdf':
+            pages, has_text = _pdf_pages(file_path)
+            work_class = 'fast' if has_text else 'ocr'
+        elif extension in IMAGE_EXTENSIONS:
+            pages, work_class = _image_frames(file_path), 'ocr'
+        else:
+            size = os.path.getsize(file_path) if size is None else size
+            pages, work_class = max(math.ceil(size / DOCX_BYTES_PER_PAGE), 1), 'fast'
+        return WorkEstimate(work_class, pages, pages * self.page_seconds[work_class])
+
+    def _wait_seconds(self, work_class, now):
+        """Estimated seconds before a new upload of ``work_class`` would start"""
+        # Fast work only waits for fast work; OCR also waits for fast work queued ahead
+        classes = ('fast',) if work_class == 'fast' else WORK_CLASSES
+        backlog = sum(finish - queued_at for queued in classes for finish, _, queued_at in self._queues[queued])
+        running = [max(estimate.seconds - (now - started), 0.0)
+                   for queued in classes for estimate, started in self._running[queued].values()]
+        capacity = self.limits[work_class]
+        if len(running) + sum(len(self._queues[queued]) for queued in classes) < capacity:
+            return 0.0
+        return (backlog + sum(running)) / capacity
+
+    def _admit(self, estimate, shed):
+        with self._condition:
+            now = time.monotonic()
+            wait = self._wait_seconds(estimate.work_class, now)
+            max_wait = self.max_wait[estimate.work_class]
+            if shed and wait > max_wait:
+                metrics.record_admission(estimate.work_class, False)
+                raise Overloaded(estimate.work_class, wait, max(1, math.ceil(wait - max_wait)))
+            ticket = next(self._order)
+            heapq.heappush(self._queues[estimate.work_class], (now + estimate.seconds, ticket, now))
+            metrics.record_admission(estimate.work_class, True)
+            self._publish()
+            return ticket
+
+    def _next_ticket(self):
+        """The ticket that gets the next free slot, or None if none may start"""
+        if sum(len(running) for running in self._running.values()) >= self.slots:
+            return None
+        for work_class in WORK_CLASSES:
+            if self._queues[work_class] and len(self._running[work_class]) < self.limits[work_class]:
+                return self._queues[work_class][0][1]
+        return None
+
+    def _publish(self):
+        metrics.set_processing_queue({work_class: len(queue) for work_class, queue in self._queues.items()})
+
+    @contextmanager
+    def slot(self, estimate, shed=True):
+        """
+        Hold a processing slot for ``estimate``'s upload, waiting for its turn::
+
+            with scheduler.slot(scheduler.estimate(path)):
+                text = extract(path)
+
+        Raises Overloaded instead of queueing when the wait would be too long,
+        unless ``shed`` is False (background workers, which can always wait).
+        """
+        work_class = estimate.work_class
+        ticket = self._admit(estimate, shed)
+        with self._condition:
+            try:
+                while self._next_ticket() != ticket:
+                    self._condition.wait()
+            except BaseException:
+                queue = self._queues[work_class]
+                queue[:] = [entry for entry in queue if entry[1] != ticket]
+                heapq.heapify(queue)
+                self._publish()
+                self._condition.notify_all()
+                raise
+            _, _, queued_at = heapq.heappop(self._queues[work_class])
+            started = time.monotonic()
+            self._running[work_class][ticket] = (estimate, started)
+            self._publish()
+        record(f'queue.{work_class}', started - queued_at)
+
+        succeeded = False
+        try:
+            yield
+            succeeded = True
+        finally:
+            with self._condition:
+                del self._running[work_class][ticket]
+                if succeeded:
+                    # Learn the actual cost, for later estimates and Retry-After
+                    observed = (time.monotonic() - started) / estimate.pages
+                    self.page_seconds[work_class] = 0.8 * self.page_seconds[work_class] + 0.2 * observed
+                self._condition.notify_all()
+
+    def snapshot(self):
+        """Queue lengths, running uploads, estimated waits and learned seconds per page"""
+        with self._condition:
+            now = time.monotonic()
+            return {
+                work_class: {
+                    'queued': len(self._queues[work_class]),
+                    'running': len(self._running[work_class]),
+                    'limit': self.limits[work_class],
+                    'estimated_wait': round(self._wait_seconds(work_class, now), 2),
+                    'page_seconds': round(self.page_seconds[work_class], 4),
+                }
+                for work_class in WORK_CLASSES
+            }
@@ -0,0 +1,94 @@
+import datetime
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.html import escape
+
+SNIPPET_START = '<mark>'
+SNIPPET_END = '</mark>'
+
+# The database marks matches with these private-use characters; the snippet
+# is HTML-escaped first and only then are they swapped for SNIPPET_START/END,
+# so markup in the extracted text can't reach a client rendering the snippet
+MATCH_START = '\ue000'
+MATCH_END = '\ue001'
+
+SQLITE_SEARCH = f"""
+    SELECT d.id, d.file_id, d.file_name, d.file_type, d.status, d.uploaded_at,
+           snippet(core_document_fts, 1, '{MATCH_START}', '{MATCH_END}', '...', 16) AS snippet,
+           bm25(core_document_fts, 10.0, 1.0) AS rank
+    FROM core_document_fts
+    JOIN core_document d ON d.id = core_document_fts.rowid
+    WHERE core_document_fts MATCH %s
+    ORDER BY rank
+    LIMIT %s
+"""
+
+POSTGRES_SEARCH = f"""
+    SELECT m.id, m.file_id, m.file_name, m.file_type, m.status, m.uploaded_at,
+           ts_headline('english', m.extracted_text, m.query,
+                       'StartSel={MATCH_START}, StopSel={MATCH_END}, MaxWords=30, MinWords=10') AS snippet,
+           m.rank
+    FROM (
+        SELECT d.*, q AS query, ts_rank(d.search_vector, q) AS rank
+        FROM core_document d, websearch_to_tsquery('english', %s) q
+        WHERE d.search_vector @@ q
+        ORDER BY rank DESC
+        LIMIT %s
+    ) m
+    ORDER BY m.rank DESC
+"""
+
+RESULT_COLUMNS = ['id', 'file_id', 'file_name', 'file_type', 'status', 'uploaded_at', 'snippet', 'rank']
+
+class DocumentSearchIndex:
+    """
+    Full-text index over Document.file_name and Document.extracted_text.
+
+    SQLite uses an external-content FTS5 table kept in sync by triggers;
+    Postgres uses a generated tsvector column with a GIN index. Both are
+    maintained by the database itself on every insert, update and delete
+    (see migration 0008_document_search_index).
+    """
+
+    def _fts5_query(self, query):
+        """Quote every term so user input can't break FTS5 query syntax"""
+        terms = [term.replace('"', '""') for term in query.split()]
+        return ' '.join(f'"{term}"' for term in terms if term)
+
+    def search(self, query, limit=20):
+        """Ranked matches with highlighted snippets, best first"""
+        if not query or not query.strip():
+            return []
+
+        if connection.vendor == 'sqlite':
+            sql, params = SQLITE_SEARCH, [self._fts5_query(query), limit]
+        elif connection.vendor == 'postgresql':
+            sql, params = POSTGRES_SEARCH, [query, limit]
+        else:
+            raise ValueError(f"Full-text search is not supported on {connection.vendor}")
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            results = [dict(zip(RESULT_COLUMNS, row)) for row in cursor.fetchall()]
+        for result in results:
+            result['uploaded_at'] = self._aware(result['uploaded_at'])
+            result['snippet'] = self._highlight(result['snippet'])
+        return results
+
+    def _highlight(self, snippet):
+        """HTML-escape a snippet and mark its matches with SNIPPET_START/END"""
+        if snippet is None:
+            return None
+        return escape(snippet).replace(MATCH_START, SNIPPET_START).replace(MATCH_END, SNIPPET_END)
+
+    def _aware(self, value):
+        """
+        ``value`` as the aware datetime the ORM would return: raw SQLite rows
+        hold naive UTC timestamps as text
+        """
+        if isinstance(value, str):
+            value = parse_datetime(value)
+        if value is not None and timezone.is_naive(value):
+            value = timezone.make_aware(value, datetime.timezone.utc)
+        return value
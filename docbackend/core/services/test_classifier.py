@@ -15,28 +15,25 @@ def test_classifier():
     for filename in os.listdir(test_docs_dir):
         file_path = os.path.join(test_docs_dir, filename)
         
-        # Get classification
-        prediction = classifier.classify_file(file_path)
-        
-        print(f"\nDocument: {filename}")
-        print(f"Prediction: {prediction}")
-        
-        # Get detailed scores for analysis
         text = ""
         if file_path.lower().endswith('.docx'):
             text = classifier._extract_text_from_docx(file_path)
         elif file_path.lower().endswith('.pdf'):
             text = classifier._extract_text_from_pdf(file_path)
-            
-        if text:
-            result = classifier.classifier(
-                text, 
-                classifier.candidate_labels,
-                hypothesis_template=classifier.hypothesis_template
-            )
-            print("\nDetailed scores:")
-            for label, score in sorted(zip(result['labels'], result['scores']), key=lambda x: x[1], reverse=True):
-                print(f"{label}: {score:.3f}")
+
+        print(f"\nDocument: {filename}")
+        if not text:
+            print("Prediction: unknown")
+            continue
+
+        # One model call gives both the prediction and the detailed scores
+        scores = classifier.score(text)
+        prediction = classifier.classify_scores(scores)
+        print(f"Prediction: {prediction}")
+
+        print("\nDetailed scores:")
+        for label, score in sorted(scores.items(), key=lambda x: x[1], reverse=True):
+            print(f"{label}: {score:.3f}")
 
 if __name__ == "__main__":
-    test_classifier()
\ No newline at end of file
+    test_classifier()
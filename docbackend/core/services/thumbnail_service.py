@@ -0,0 +1,73 @@
+import os
+import tempfile
+from pdf2image import convert_from_path
+from PIL import Image
+from django.conf import settings
+from core.utils import CacheBudget
+
+class ThumbnailService:
+    """Render page previews and keep them in a size-bounded on-disk cache"""
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir or settings.THUMBNAIL_CACHE_DIR
+        self.max_bytes = max_bytes or settings.THUMBNAIL_CACHE_MAX_BYTES
+        self.budget = CacheBudget(self.cache_dir, self.max_bytes)
+
+    def cache_path(self, content_hash, page, size):
+        """Cache location for one rendering, keyed by content hash, page and size"""
+        return os.path.join(self.cache_dir, content_hash[:2], f"{content_hash}_p{page}_{size}.jpg")
+
+    def get_thumbnail(self, file_path, content_hash, page=1, size=256):
+        """Return the path of a JPEG preview of ``page``, rendering it on first use"""
+        path = self.cache_path(content_hash, page, size)
+        if os.path.exists(path):
+            # Touch on hit so eviction drops the least recently used renders
+            os.utime(path)
+            return path
+
+        image = self._render(file_path, page, size)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                image.save(f, 'JPEG', quality=80, optimize=True)
+                written = f.tell()
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        self.budget.added(written)
+        return path
+
+    def _render(self, file_path, page, size):
+        """Render a single page scaled so its longest side is ``size`` pixels"""
+        lower_path = file_path.lower()
+        try:
+            if lower_path.endswith('.pdf'):
+                # Only the requested page is rasterized, directly at the target size
+                pages = convert_from_path(file_path, first_page=page, last_page=page, size=size)
+                if not pages:
+                    raise ValueError(f"Page {page} does not exist")
+                image = pages[0]
+            elif lower_path.endswith(('.jpg', '.jpeg', '.png', '.tif', '.tiff')):
+                image = Image.open(file_path)
+                try:
+                    image.seek(page - 1)
+                except EOFError:
+                    raise ValueError(f"Page {page} does not exist")
+                # Let the JPEG decoder skip straight to a reduced scale
+                image.draft('RGB', (size, size))
+                image.thumbnail((size, size), Image.LANCZOS)
+            else:
+                raise ValueError("Previews are not available for this file type")
+        except ValueError:
+            raise
+        except Exception as e:
+            print(f"Error rendering preview for {file_path}: {str(e)}")
+            raise ValueError(f"Could not render preview: {str(e)}")
+
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        return image
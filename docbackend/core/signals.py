@@ -0,0 +1,14 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from core.models import Notification
+from core.services.notification_feed import NotificationFeed
+
+
+@receiver(post_save, sender=Notification)
+def publish_notification(sender, instance, created, **kwargs):
+    """Wake up feed listeners waiting for new notifications"""
+    if created:
+        # Only once committed, otherwise listeners would wake up to nothing
+        transaction.on_commit(lambda: NotificationFeed.publish(instance.id))
@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import zipfile
+
+from django.test import SimpleTestCase, override_settings
+
+from core.services.archive_ingestor import ArchiveIngestor
+
+
+class ArchiveIngestorTests(SimpleTestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.ingestor = ArchiveIngestor(max_members=6, max_total_mb=4, max_member_mb=1, max_ratio=100)
+
+    def archive(self, members, compression=zipfile.ZIP_DEFLATED):
+        fd, path = tempfile.mkstemp(suffix='.zip')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        with zipfile.ZipFile(path, 'w', compression) as zf:
+            for name, content in members.items():
+                zf.writestr(name, content)
+        return path
+
+    def stored_files(self):
+        return [name for _, _, files in os.walk(self.media_root) for name in files]
+
+    def test_supported_members_are_stored_and_the_rest_reported(self):
+        uploads, rejected = self.ingestor.expand(self.archive({
+            'scans/a.pdf': b'%PDF-1.4',
+            'b.docx': b'docx',
+            'notes.txt': b'notes',
+            'inner.zip': b'zip',
+            'big.docx': os.urandom(2 * 2 ** 20),
+            '__MACOSX/._a.pdf': b'resource fork',
+        }, zipfile.ZIP_STORED))
+        self.assertEqual(sorted((upload.name, file_type) for upload, file_type in uploads),
+                         [('a.pdf', 'pdf'), ('b.docx', 'docx')])
+        self.assertEqual(sorted(self.stored_files()), ['a.pdf', 'b.docx'])
+        self.assertEqual({item['file_name']: item['error'] for item in rejected}, {
+            'notes.txt': 'Unsupported file type',
+            'inner.zip': 'Nested archives are not supported',
+            'big.docx': 'File is larger than 1 MB',
+        })
+
+    def test_highly_compressed_members_are_rejected(self):
+        ingestor = ArchiveIngestor(max_members=5, max_total_mb=4, max_member_mb=4, max_ratio=100)
+        uploads, rejected = ingestor.expand(self.archive({'bomb.docx': b'\0' * (3 * 2 ** 20)}))
+        self.assertEqual(uploads, [])
+        self.assertEqual(rejected, [{'file_name': 'bomb.docx', 'error': 'File is compressed more than allowed'}])
+        self.assertEqual(self.stored_files(), [])
+
+    def test_limits_are_checked_before_anything_is_stored(self):
+        with self.assertRaisesMessage(ValueError, 'at most 6 are allowed'):
+            self.ingestor.expand(self.archive({f'{n}.pdf': b'%PDF' for n in range(7)}))
+        with self.assertRaisesMessage(ValueError, 'at most 4 MB is allowed'):
+            self.ingestor.expand(self.archive({f'{n}.pdf': b'\0' * 2 ** 20 for n in range(5)}))
+        self.assertEqual(self.stored_files(), [])
+
+    def test_invalid_archive_is_refused(self):
+        fd, path = tempfile.mkstemp(suffix='.zip')
+        with os.fdopen(fd, 'wb') as file:
+            file.write(b'not a zip')
+        self.addCleanup(os.remove, path)
+        with self.assertRaisesMessage(ValueError, 'Not a valid zip archive'):
+            self.ingestor.expand(path)
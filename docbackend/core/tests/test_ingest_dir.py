@@ -0,0 +1,106 @@
+import io
+import os
+import shutil
+import signal
+import tempfile
+import zipfile
+
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+
+from core.models import ProcessingJob
+
+WORD_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+
+def docx_bytes(text):
+    """A minimal .docx holding ``text``"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as docx:
+        docx.writestr('word/document.xml', f'<?xml version="1.0" encoding="UTF-8"?><w:document xmlns:w="{WORD_NS}">'
+                                           f'<w:body><w:p><w:r><w:t>{text}</w:t></w:r></w:p></w:body></w:document>')
+    return buffer.getvalue()
+
+
+def certificate(name):
+    return docx_bytes(f'Certification: {name} earned 24 units in the training course')
+
+
+@override_settings(JOB_MAX_ATTEMPTS=1)
+class IngestDirMoveTests(TransactionTestCase):
+    """With --move a source is only removed once everything in it is safely in storage"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.directory = tempfile.mkdtemp()
+        for path in (self.media_root, self.directory):
+            self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        # The command installs its own SIGINT/SIGTERM handlers
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            self.addCleanup(signal.signal, signum, signal.getsignal(signum))
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as file:
+            file.write(content)
+        return path
+
+    def write_archive(self, name, members):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            for member, content in members.items():
+                archive.writestr(member, content)
+        return self.write(name, buffer.getvalue())
+
+    def ingest(self, *args):
+        stderr = io.StringIO()
+        call_command('ingest_dir', self.directory, '--workers', '0', *args, stdout=io.StringIO(), stderr=stderr)
+        return stderr.getvalue()
+
+    def test_only_fully_stored_sources_are_removed(self):
+        single = self.write('a.docx', certificate('Ana'))
+        duplicate = self.write('copy-of-a.docx', certificate('Ana'))
+        clean = self.write_archive('clean.zip', {'b.docx': certificate('Ben')})
+        mixed = self.write_archive('mixed.zip', {'c.docx': certificate('Cara'), 'notes.txt': b'notes'})
+
+        errors = self.ingest('--move')
+
+        self.assertFalse(os.path.exists(single))
+        self.assertFalse(os.path.exists(clean))
+        self.assertTrue(os.path.exists(duplicate))
+        self.assertTrue(os.path.exists(mixed))
+        self.assertIn('notes.txt', errors)
+        jobs = ProcessingJob.objects.all()
+        self.assertEqual(sorted(job.file_name for job in jobs), ['a.docx', 'b.docx', 'c.docx'])
+        self.assertEqual({job.status for job in jobs}, {'succeeded'})
+
+    def test_copy_leaves_sources_in_place(self):
+        single = self.write('a.docx', certificate('Ana'))
+        self.ingest()
+        self.assertTrue(os.path.exists(single))
+        self.assertTrue(default_storage.exists(ProcessingJob.objects.get().file))
+
+    def test_failed_import_keeps_its_stored_copy(self):
+        broken = self.write('broken.docx', b'not a docx file')
+        errors = self.ingest('--move')
+        job = ProcessingJob.objects.get()
+        self.assertEqual(job.status, 'failed')
+        self.assertFalse(os.path.exists(broken))
+        self.assertTrue(default_storage.exists(job.file))
+        self.assertIn(job.file, errors)
+
+    def test_restart_removes_sources_of_recorded_files_only(self):
+        recorded = self.write('a.docx', certificate('Ana'))
+        archive = self.write_archive('mixed.zip', {'notes.txt': b'notes'})
+        for path in (recorded, archive):
+            ProcessingJob.objects.create(job_id=os.path.basename(path), file_id=os.path.basename(path),
+                                         file=f'documents/{os.path.basename(path)}', source=path,
+                                         status='succeeded')
+        self.ingest('--move')
+        self.assertFalse(os.path.exists(recorded))
+        self.assertTrue(os.path.exists(archive))
+        self.assertEqual(ProcessingJob.objects.count(), 2)
@@ -0,0 +1,72 @@
+from datetime import timedelta
+from types import SimpleNamespace
+
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import Document, ProcessingJob
+from core.services.job_queue import JobQueue, LeaseLost
+
+
+def stored_upload(name='a.docx'):
+    return SimpleNamespace(storage_name=f'documents/{name}', name=name, content_hash='', size=1)
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.queue = JobQueue(lease_seconds=60, max_attempts=2, backoff_seconds=10)
+
+    def expire_lease(self, job):
+        ProcessingJob.objects.filter(id=job.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+    def test_claimed_job_is_not_claimed_again(self):
+        self.queue.enqueue(stored_upload(), 'docx', {})
+        job, = self.queue.claim('A')
+        self.assertEqual((job.status, job.attempts, job.leased_by), ('running', 1, 'A'))
+        self.assertEqual(self.queue.claim('B'), [])
+
+    def test_expired_lease_is_taken_over_and_fences_the_old_worker(self):
+        self.queue.enqueue(stored_upload(), 'docx', {})
+        stale, = self.queue.claim('A')
+        self.expire_lease(stale)
+        current, = self.queue.claim('B')
+        self.assertEqual(current.attempts, 2)
+
+        document = Document.objects.create(file_id=stale.file_id, file_name=stale.file_name, file_type='docx')
+        with self.assertRaises(LeaseLost):
+            self.queue.complete(stale, document, {}, 1.0)
+        self.assertIsNone(self.queue.fail(stale, 'late failure'))
+        self.assertEqual(self.queue.renew([stale]), [stale])
+
+        self.queue.complete(current, document, {}, 1.0)
+        self.assertEqual(ProcessingJob.objects.get(id=current.id).status, 'succeeded')
+
+    def test_failed_attempt_is_retried_after_a_backoff(self):
+        self.queue.enqueue(stored_upload(), 'docx', {})
+        job, = self.queue.claim('A')
+        self.assertEqual(self.queue.fail(job, 'model server down'), 'queued')
+        job.refresh_from_db()
+        self.assertGreater(job.available_at, timezone.now() + timedelta(seconds=5))
+        self.assertEqual(self.queue.claim('A'), [])
+
+    def test_exhausted_job_is_failed_instead_of_claimed(self):
+        job = self.queue.enqueue(stored_upload(), 'docx', {}, worker='A')
+        ProcessingJob.objects.filter(id=job.id).update(attempts=2)
+        self.expire_lease(job)
+        self.assertEqual(self.queue.claim('B'), [])
+        self.assertEqual(ProcessingJob.objects.get(id=job.id).status, 'failed')
+
+    def test_released_job_does_not_use_up_an_attempt(self):
+        self.queue.enqueue(stored_upload(), 'docx', {})
+        job, = self.queue.claim('A')
+        self.queue.release(job)
+        job, = self.queue.claim('B')
+        self.assertEqual(job.attempts, 1)
+
+    def test_renew_extends_held_leases(self):
+        self.queue.enqueue(stored_upload(), 'docx', {})
+        job, = self.queue.claim('A')
+        self.expire_lease(job)
+        self.assertEqual(self.queue.renew([job]), [])
+        self.assertGreater(ProcessingJob.objects.get(id=job.id).lease_expires_at, timezone.now())
+        self.assertEqual(self.queue.claim('B'), [])
@@ -0,0 +1,26 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Document, Notification
+from core.services.notification_feed import LATEST_ID_CACHE_KEY, NotificationFeed
+
+
+class NotificationFeedTests(TestCase):
+    def setUp(self):
+        cache.delete(LATEST_ID_CACHE_KEY)
+        self.addCleanup(cache.delete, LATEST_ID_CACHE_KEY)
+        self.feed = NotificationFeed(poll_interval=0.01, db_check_every=1000)
+        document = Document.objects.create(file_id='doc', file_name='doc.pdf', file_type='pdf')
+        self.notification = Notification.objects.create(document=document, type='status_change', message='Processed')
+
+    def test_poll_returns_newer_notifications(self):
+        self.assertEqual(self.feed.poll(self.notification.id - 1, 1), [self.notification])
+
+    def test_marker_ahead_of_the_table_is_clamped(self):
+        cache.set(LATEST_ID_CACHE_KEY, self.notification.id + 10, None)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.feed.poll(self.notification.id, 0.2), [])
+        self.assertEqual(cache.get(LATEST_ID_CACHE_KEY), self.notification.id)
+        self.assertLessEqual(len(queries), 2)
@@ -0,0 +1,37 @@
+import io
+import signal
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError
+from django.test import TransactionTestCase
+
+from core.services.job_queue import JobQueue
+
+
+class ProcessJobsTests(TransactionTestCase):
+    def setUp(self):
+        # The command installs its own SIGINT/SIGTERM handlers
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            self.addCleanup(signal.signal, signum, signal.getsignal(signum))
+
+    def run_command(self, *args):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('process_jobs', '--burst', '--poll-interval', '0.01', *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_claim_errors_are_logged_and_retried(self):
+        claim = mock.patch.object(JobQueue, 'claim', autospec=True,
+                                  side_effect=[OperationalError('database is locked'), []])
+        with claim as claimed:
+            stdout, stderr = self.run_command('--concurrency', '1')
+        self.assertEqual(claimed.call_count, 2)
+        self.assertIn('database is locked', stderr)
+        self.assertIn('Done', stdout)
+
+    def test_exits_with_an_error_when_every_worker_stops(self):
+        with mock.patch('core.management.commands.process_jobs.Command._take', side_effect=RuntimeError('bug')), \
+                mock.patch('threading.excepthook'):
+            with self.assertRaisesMessage(CommandError, 'Every worker thread stopped on an error'):
+                self.run_command('--concurrency', '2')
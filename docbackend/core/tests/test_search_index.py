@@ -0,0 +1,35 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from core.models import Document
+from core.services.search_index import DocumentSearchIndex, SNIPPET_END, SNIPPET_START
+
+
+class FTS5QueryTests(TestCase):
+    def test_terms_are_quoted(self):
+        index = DocumentSearchIndex()
+        self.assertEqual(index._fts5_query('teacher  III'), '"teacher" "III"')
+        self.assertEqual(index._fts5_query('say "hi" NEAR('), '"say" """hi""" "NEAR("')
+
+
+@skipUnless(connection.vendor == 'sqlite', "FTS5 index")
+class DocumentSearchTests(TestCase):
+    def setUp(self):
+        self.index = DocumentSearchIndex()
+        Document.objects.create(file_id='cert', file_name='certificate.pdf', file_type='pdf',
+                                extracted_text='Certificate of Employment issued to <script>alert(1)</script> Juan')
+
+    def test_query_syntax_in_user_input_is_searched_literally(self):
+        for query in ['"unbalanced', 'NEAR(', 'employment OR', '-certificate', 'file_name:x', '*']:
+            self.index.search(query)
+        self.assertEqual([result['file_id'] for result in self.index.search('employment OR')], [])
+        self.assertEqual([result['file_id'] for result in self.index.search('Employment')], ['cert'])
+
+    def test_snippets_are_escaped_and_marked(self):
+        result, = self.index.search('Juan')
+        self.assertNotIn('<script>', result['snippet'])
+        self.assertIn('&lt;script&gt;', result['snippet'])
+        self.assertIn(f'{SNIPPET_START}Juan{SNIPPET_END}', result['snippet'])
+        self.assertIsNotNone(result['uploaded_at'].tzinfo)
@@ -0,0 +1,134 @@
+import hashlib
+import os
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+
+from core.models import Document
+
+
+class StoredUploadedFile(UploadedFile):
+    """An upload that has already been written to its final storage location"""
+
+    def __init__(self, file, name, storage_name, content_type, size, charset,
+                 content_hash, bytes_written, content_type_extra=None):
+        super().__init__(file, name, content_type, size, charset, content_type_extra)
+        self.storage_name = storage_name
+        self.content_hash = content_hash
+        self.bytes_written = bytes_written
+
+    def temporary_file_path(self):
+        """Path of the stored file, so callers can read it without another copy"""
+        return self.file.name
+
+    def close(self):
+        try:
+            return self.file.close()
+        except FileNotFoundError:
+            pass
+
+    def discard(self):
+        """Remove the stored file, e.g. when the upload is rejected"""
+        self.close()
+        default_storage.delete(self.storage_name)
+
+
+def open_storage_file(file_name):
+    """
+    ``(file, storage_name)``: a new file, open for writing, at the path
+    Document.file would give ``file_name``. Only valid for FileSystemStorage.
+    """
+    file_field = Document._meta.get_field('file')
+    name = file_field.generate_filename(None, file_name)
+
+    # Claim the name atomically so concurrent uploads never share a file
+    while True:
+        name = default_storage.get_available_name(name, max_length=file_field.max_length)
+        path = default_storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            return open(path, 'x+b'), name
+        except FileExistsError:
+            continue
+
+
+class StorageUploadHandler(FileUploadHandler):
+    """
+    Stream the ``field_name`` uploads straight into MEDIA_ROOT at the path
+    Document.file would use; other file fields are left to the handlers after
+    this one, so they never reach storage.
+
+    Each chunk is written once to its final location and hashed in the same
+    pass, so no temporary copy is made. Only valid for FileSystemStorage.
+    """
+
+    def __init__(self, request=None, field_name='file'):
+        super().__init__(request)
+        self.field_name = field_name
+        self.storing = False
+        # Every file stored so far, so those the view doesn't accept can be removed
+        self.uploads = []
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.storing = field_name == self.field_name
+        if not self.storing:
+            return
+        self.file, self.storage_name = open_storage_file(self.file_name)
+        self.hasher = hashlib.sha256()
+        self.bytes_written = 0
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.storing:
+            return raw_data
+        self.file.write(raw_data)
+        self.hasher.update(raw_data)
+        self.bytes_written += len(raw_data)
+
+    def file_complete(self, file_size):
+        if not self.storing:
+            return None
+        self.storing = False
+        self.file.flush()
+        self.file.seek(0)
+        if default_storage.file_permissions_mode is not None:
+            os.chmod(self.file.name, default_storage.file_permissions_mode)
+        uploaded_file = StoredUploadedFile(
+            file=self.file,
+            name=self.file_name,
+            storage_name=self.storage_name,
+            content_type=self.content_type,
+            size=file_size,
+            charset=self.charset,
+            content_hash=self.hasher.hexdigest(),
+            bytes_written=self.bytes_written,
+            content_type_extra=self.content_type_extra,
+        )
+        self.uploads.append(uploaded_file)
+        return uploaded_file
+
+    def upload_interrupted(self):
+        if self.storing:
+            self.storing = False
+            try:
+                self.file.close()
+                os.remove(self.file.name)
+            except FileNotFoundError:
+                pass
+
+    def discard(self, keep=()):
+        """
+        Remove every file this handler stored other than ``keep``, including
+        one cut off when parsing the request failed part way
+        """
+        self.upload_interrupted()
+        for uploaded_file in self.uploads:
+            try:
+                if uploaded_file in keep:
+                    uploaded_file.close()
+                else:
+                    uploaded_file.discard()
+            except Exception as e:
+                print(f"Error removing stored upload: {str(e)}")
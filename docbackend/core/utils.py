@@ -1,50 +1,128 @@
-from django.core.cache import cache
-from django.db import transaction
-import time
-
-def get_processing_lock(document_id, timeout=30, max_retries=3, retry_delay=1):
-    """
-    Attempt to acquire a processing lock with retries
-    
-    Args:
-        document_id: ID of the document
-        timeout: Lock timeout in seconds (default: 30 seconds)
-        max_retries: Maximum number of retry attempts (default: 3)
-        retry_delay: Delay between retries in seconds (default: 1 second)
-    """
-    lock_id = f'doc_processing_{document_id}'
-    
-    for attempt in range(max_retries):
-        try:
-            acquired = cache.add(lock_id, 'lock', timeout)
-            if acquired:
-                return True
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay)
-        except Exception:
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay)
-            continue
-    
-    return False
-
-def release_processing_lock(document_id):
-    """Release the processing lock for a document"""
-    lock_id = f'doc_processing_{document_id}'
+import hashlib
+import os
+import threading
+
+def read_process_write_bytes():
+    """
+    Bytes this process has caused to be written to storage so far.
+
+    Reads ``write_bytes`` from /proc/self/io, so it is only available on Linux.
+    Returns None where the counter cannot be read.
+    """
     try:
-        cache.delete(lock_id)
+        with open('/proc/self/io') as io_stats:
+            for line in io_stats:
+                if line.startswith('write_bytes:'):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+def reset_peak_rss():
+    """
+    Reset the kernel's peak-RSS counter for this process (Linux 4.0+).
+
+    Returns False where that isn't possible, in which case read_peak_rss()
+    reports the peak since process start. The counter covers every thread,
+    so a peak read after it only belongs to one task in a process that runs
+    nothing else meanwhile.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
         return True
-    except Exception:
+    except OSError:
         return False
 
-def process_document(document):
-    # Acquire lock before processing
-    if not get_processing_lock(document.id):
-        raise Exception("Document is currently being processed. Please try again in a few moments.")
-    
+def read_peak_rss():
+    """Peak resident set size of this process in bytes"""
+    try:
+        with open('/proc/self/status') as status_file:
+            for line in status_file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    try:
+        import resource
+        # ru_maxrss is in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except (ImportError, OSError):
+        return None
+
+def read_rss():
+    """Current resident set size of this process in bytes, or None"""
     try:
-        with transaction.atomic():
-            # ...existing document processing code...
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """SHA-256 hex digest of a file, read in chunks"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def evict_lru(directory, max_bytes):
+    """
+    Delete the least recently used files under ``directory`` until it fits
+    ``max_bytes``, returning the bytes left
+    """
+    entries = []
+    total = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+    if total <= max_bytes:
+        return total
+
+    # Trim below the budget so the next few writes don't go over it straight away
+    entries.sort()
+    for _, file_size, path in entries:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
             pass
-    finally:
-        release_processing_lock(document.id)
\ No newline at end of file
+        total -= file_size
+        if total <= max_bytes * 0.9:
+            break
+    return total
+
+class CacheBudget:
+    """
+    Running size of a cache directory, trimmed with evict_lru once it goes
+    over ``max_bytes``.
+
+    Writes are counted as they happen, so the directory is only walked on
+    first use, when the total exceeds the budget, and every RESYNC_WRITES
+    writes to pick up what other processes have added meanwhile.
+    """
+    RESYNC_WRITES = 256
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._total = None
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def added(self, size):
+        """Count a file of ``size`` bytes just written, evicting if over budget"""
+        with self._lock:
+            self._writes += 1
+            if self._total is not None and self._writes < self.RESYNC_WRITES:
+                self._total += size
+                if self._total <= self.max_bytes:
+                    return
+            self._writes = 0
+            self._total = evict_lru(self.directory, self.max_bytes)
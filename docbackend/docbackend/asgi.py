@@ -0,0 +1,23 @@
+"""
+ASGI config for docbackend project.
+
+    uvicorn docbackend.asgi:application --workers 2
+
+Under ASGI the read-mostly endpoints are served by the async views in
+api/async_views.py unless ASYNC_VIEWS is set to False.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'docbackend.settings')
+os.environ.setdefault('ASYNC_VIEWS', 'True')
+
+application = get_asgi_application()
+
+# Retries and abandoned jobs are picked up by the web processes themselves
+# in 'inline' mode (process_jobs workers do it in 'queue' mode)
+from api.views import start_job_sweeper  # noqa: E402
+
+start_job_sweeper()
@@ -30,6 +30,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.profiling.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -69,6 +71,12 @@ DATABASES = {
     )
 }
 
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # Take SQLite's write lock when a transaction begins. Deferred transactions
+    # that read first and write later fail at once with "database is locked"
+    # under concurrent uploads, instead of waiting out the timeout.
+    DATABASES['default'].setdefault('OPTIONS', {}).update({'transaction_mode': 'IMMEDIATE', 'timeout': 20})
+
 # Cache settings
 CACHES = {
     'default': {
@@ -81,10 +89,19 @@ CACHES = {
     }
 }
 
-# Processing lock settings
-PROCESSING_LOCK_TIMEOUT = 60  # 60 seconds
-PROCESSING_LOCK_MAX_RETRIES = 3
-PROCESSING_LOCK_RETRY_DELAY = 1
+# Notification feed: long-poll/SSE clients check the cache marker every
+# NOTIFICATION_POLL_INTERVAL seconds and the database every Nth check. The
+# SSE stream (notifications/stream/) is only served with ASYNC_VIEWS
+NOTIFICATION_POLL_INTERVAL = config('NOTIFICATION_POLL_INTERVAL', default=1.0, cast=float)
+NOTIFICATION_DB_CHECK_EVERY = config('NOTIFICATION_DB_CHECK_EVERY', default=5, cast=int)
+NOTIFICATION_LONG_POLL_MAX_SECONDS = 30
+NOTIFICATION_STREAM_MAX_SECONDS = config('NOTIFICATION_STREAM_MAX_SECONDS', default=55, cast=int)
+
+# Serve the list, detail, file and notification endpoints from async views
+# (defaults on under docbackend.asgi). Other API views then run on a pool of
+# ASYNC_EXECUTOR_WORKERS threads instead of Django's single sync thread
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+ASYNC_EXECUTOR_WORKERS = config('ASYNC_EXECUTOR_WORKERS', default=4, cast=int)
 
 # Session configuration
 SESSION_ENGINE = "django.contrib.sessions.backends.cache"
@@ -123,14 +140,128 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Tesseract settings
 #TESSERACT_CMD = 'C:\\Program Files\\Tesseract-OCR\\tesseract.exe'
 
+# Largest image (in pixels) handed to OCR; bigger JPEGs are downscaled while
+# decoding and other formats right after, so one huge upload can't exhaust
+# worker memory. Non-JPEG images that would decode to more memory than an RGB
+# image of this size are refused
+OCR_MAX_PIXELS = config('OCR_MAX_PIXELS', default=12_000_000, cast=int)
+
+# Rotate pages upright and deskew them (up to OCR_MAX_SKEW_DEGREES) before
+# OCR; checked on a downscaled copy so it costs far less than a wasted pass
+OCR_AUTO_ORIENT = config('OCR_AUTO_ORIENT', default=True, cast=bool)
+OCR_MAX_SKEW_DEGREES = config('OCR_MAX_SKEW_DEGREES', default=10, cast=int)
+
+# 'text' OCRs whole pages; 'regions' crops each page to its text blocks, keeps
+# words scoring at least OCR_MIN_CONFIDENCE, and stops once
+# OCR_EARLY_STOP_WORDS confident words are read (0 reads everything)
+OCR_MODE = config('OCR_MODE', default='text')
+OCR_MIN_CONFIDENCE = config('OCR_MIN_CONFIDENCE', default=40, cast=int)
+OCR_EARLY_STOP_WORDS = config('OCR_EARLY_STOP_WORDS', default=150, cast=int)
+
+# Recognized text per page, keyed by the page's pixels and the OCR settings,
+# so re-uploaded scans only OCR the pages that changed
+OCR_CACHE_ENABLED = config('OCR_CACHE_ENABLED', default=True, cast=bool)
+OCR_CACHE_DIR = config('OCR_CACHE_DIR', default=os.path.join(MEDIA_ROOT, 'ocr_cache'))
+OCR_CACHE_MAX_BYTES = config('OCR_CACHE_MAX_BYTES', default=64 * 1024 * 1024, cast=int)
+
+# Text extraction (PDF parsing, docx2txt, OCR) runs in EXTRACTION_WORKERS
+# processes (0 extracts in the request thread), each capped at
+# EXTRACTION_MEMORY_LIMIT_MB of address space and EXTRACTION_TIMEOUT seconds
+# per document. Uploads beyond EXTRACTION_MAX_QUEUE waiting documents get a
+# 429 with the queue depth
+EXTRACTION_WORKERS = config('EXTRACTION_WORKERS', default=2, cast=int)
+EXTRACTION_MAX_QUEUE = config('EXTRACTION_MAX_QUEUE', default=8, cast=int)
+EXTRACTION_TIMEOUT = config('EXTRACTION_TIMEOUT', default=120, cast=int)
+EXTRACTION_MEMORY_LIMIT_MB = config('EXTRACTION_MEMORY_LIMIT_MB', default=2048, cast=int)
+
+# Upload scheduling: each upload is estimated from its type, size and page
+# count as 'fast' (DOCX, PDF with a text layer) or 'ocr' work. PROCESSING_SLOTS
+# uploads are extracted at once, OCR in at most all but one of them, and an
+# upload whose estimated wait exceeds its class' PROCESSING_MAX_WAIT_SECONDS
+# gets a 429 with Retry-After. PROCESSING_PAGE_SECONDS seeds the per-page cost
+# estimates, which are then learned from finished uploads
+PROCESSING_SLOTS = config('PROCESSING_SLOTS', default=max(EXTRACTION_WORKERS, 1), cast=int)
+PROCESSING_MAX_WAIT_SECONDS = {
+    'fast': config('PROCESSING_MAX_WAIT_FAST', default=10, cast=float),
+    'ocr': config('PROCESSING_MAX_WAIT_OCR', default=120, cast=float),
+}
+PROCESSING_PAGE_SECONDS = {'fast': 0.05, 'ocr': 4.0}
+
+# Every upload is recorded as a ProcessingJob before it is processed. In
+# 'inline' mode the upload request processes it; in 'queue' mode the request
+# answers 202 with the job id and `manage.py process_jobs` workers process it.
+# A job whose worker died is claimed again once its JOB_LEASE_SECONDS lease
+# runs out (a live worker renews it every third of a lease, however long a
+# batch takes); failed attempts are retried after an exponential backoff
+# from JOB_RETRY_BACKOFF_SECONDS, at most JOB_MAX_ATTEMPTS attempts in all.
+# Those retries and abandoned jobs are picked up by the process_jobs workers
+# in 'queue' mode, and in 'inline' mode by each web process every
+# JOB_SWEEP_SECONDS (0 turns that off, leaving it to process_jobs)
+PROCESSING_MODE = config('PROCESSING_MODE', default='inline')
+JOB_LEASE_SECONDS = config('JOB_LEASE_SECONDS', default=600, cast=int)
+JOB_MAX_ATTEMPTS = config('JOB_MAX_ATTEMPTS', default=3, cast=int)
+JOB_RETRY_BACKOFF_SECONDS = config('JOB_RETRY_BACKOFF_SECONDS', default=10, cast=float)
+JOB_RETRY_MAX_BACKOFF_SECONDS = config('JOB_RETRY_MAX_BACKOFF_SECONDS', default=600, cast=float)
+JOB_POLL_SECONDS = config('JOB_POLL_SECONDS', default=1.0, cast=float)
+JOB_SWEEP_SECONDS = config('JOB_SWEEP_SECONDS', default=30.0, cast=float)
+
+# Batch uploads (api/batches/) take up to BATCH_MAX_FILES files per request.
+# Their jobs are processed BATCH_PROCESS_SIZE at a time: extracted in parallel
+# and classified together, CLASSIFIER_BATCH_SIZE texts per model call
+BATCH_MAX_FILES = config('BATCH_MAX_FILES', default=200, cast=int)
+BATCH_PROCESS_SIZE = config('BATCH_PROCESS_SIZE', default=16, cast=int)
+CLASSIFIER_BATCH_SIZE = config('CLASSIFIER_BATCH_SIZE', default=8, cast=int)
+
+# Zip archives (to api/documents/process/ or api/batches/) are expanded member
+# by member into a batch. Archives of more than ARCHIVE_MAX_MEMBERS files or
+# expanding to more than ARCHIVE_MAX_TOTAL_MB are refused outright; members
+# over ARCHIVE_MAX_MEMBER_MB or compressed more than ARCHIVE_MAX_RATIO times
+# (likely decompression bombs) are skipped
+ARCHIVE_MAX_MEMBERS = config('ARCHIVE_MAX_MEMBERS', default=1000, cast=int)
+ARCHIVE_MAX_TOTAL_MB = config('ARCHIVE_MAX_TOTAL_MB', default=4096, cast=int)
+ARCHIVE_MAX_MEMBER_MB = config('ARCHIVE_MAX_MEMBER_MB', default=200, cast=int)
+ARCHIVE_MAX_RATIO = config('ARCHIVE_MAX_RATIO', default=100, cast=int)
+
 # Maximum upload file size: 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024
 
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
+DATA_UPLOAD_MAX_NUMBER_FILES = BATCH_MAX_FILES
 FILE_UPLOAD_PERMISSIONS = 0o644
 FILE_UPLOAD_DIRECTORY_PERMISSIONS = 0o755
 
+# File serving: 'python' streams from the worker, 'x-sendfile' (Apache/lighttpd)
+# and 'x-accel-redirect' (nginx) hand the transfer to the front-end server
+FILE_SERVE_MODE = config('FILE_SERVE_MODE', default='python')
+FILE_ACCEL_REDIRECT_PREFIX = config('FILE_ACCEL_REDIRECT_PREFIX', default='/protected-media/')
+FILE_CACHE_MAX_AGE = config('FILE_CACHE_MAX_AGE', default=3600, cast=int)
+
+# Page previews, rendered on first request and cached on disk
+THUMBNAIL_CACHE_DIR = config('THUMBNAIL_CACHE_DIR', default=os.path.join(MEDIA_ROOT, 'thumbnails'))
+THUMBNAIL_CACHE_MAX_BYTES = config('THUMBNAIL_CACHE_MAX_BYTES', default=256 * 1024 * 1024, cast=int)
+THUMBNAIL_SIZES = (256, 512, 1024)
+
+# Prometheus metrics at /metrics (needs prometheus_client). With several
+# worker processes, point PROMETHEUS_MULTIPROC_DIR at a directory shared by
+# all of them, empty it before the server starts, and call
+# core.metrics.mark_process_dead(pid) from the server's worker-exit hook
+PROMETHEUS_MULTIPROC_DIR = config('PROMETHEUS_MULTIPROC_DIR', default='')
+if PROMETHEUS_MULTIPROC_DIR:
+    # prometheus_client reads this from the environment when first imported
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+    os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', PROMETHEUS_MULTIPROC_DIR)
+
+# Per-stage timings (upload, OCR, classification, DB, ...) are returned in a
+# Server-Timing header on every response
+SERVER_TIMING_HEADER = config('SERVER_TIMING_HEADER', default=True, cast=bool)
+
+# Fraction of requests profiled in full; profiles are written to PROFILE_DIR
+# as .prof (cProfile) or .html (PROFILER = 'pyinstrument', if installed)
+PROFILE_SAMPLE_RATE = config('PROFILE_SAMPLE_RATE', default=0.0, cast=float)
+PROFILER = config('PROFILER', default='cprofile')
+PROFILE_DIR = config('PROFILE_DIR', default=os.path.join(BASE_DIR, 'profiles'))
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
@@ -184,4 +315,22 @@ APPWRITE_API_KEY = config('APPWRITE_API_KEY', default=None)
 
 # Model Settings
 MODEL_DEVICE = config('MODEL_DEVICE', default=-1, cast=int)
-MODEL_CONFIDENCE_THRESHOLD = config('MODEL_CONFIDENCE_THRESHOLD', default=0.3, cast=float)
\ No newline at end of file
+MODEL_CONFIDENCE_THRESHOLD = config('MODEL_CONFIDENCE_THRESHOLD', default=0.3, cast=float)
+# Classifier class used by the API; anything with classify_text(text) -> label.
+# benchmarks.stubs.KeywordClassifier skips loading BART for benchmarks
+DOCUMENT_CLASSIFIER = config('DOCUMENT_CLASSIFIER', default='core.services.cnn_classifier.DocumentClassifier')
+
+# Near-duplicate detection: estimated Jaccard similarity of extracted text at
+# which an upload is flagged, and whether it then reuses the prior classification
+NEAR_DUPLICATE_THRESHOLD = config('NEAR_DUPLICATE_THRESHOLD', default=0.85, cast=float)
+NEAR_DUPLICATE_REUSE_CLASSIFICATION = config('NEAR_DUPLICATE_REUSE_CLASSIFICATION', default=True, cast=bool)
+
+# Embedding kNN: uploads take the weighted category vote of their nearest
+# approved documents when it is clear enough, skipping the zero-shot model
+EMBEDDINGS_ENABLED = config('EMBEDDINGS_ENABLED', default=True, cast=bool)
+EMBEDDING_MODEL = config('EMBEDDING_MODEL', default='sentence-transformers/all-MiniLM-L6-v2')
+EMBEDDING_INDEX_REFRESH_SECONDS = config('EMBEDDING_INDEX_REFRESH_SECONDS', default=60, cast=int)
+KNN_NEIGHBOURS = 7
+KNN_MIN_SIMILARITY = config('KNN_MIN_SIMILARITY', default=0.8, cast=float)
+KNN_MIN_VOTES = 3
+KNN_VOTE_THRESHOLD = config('KNN_VOTE_THRESHOLD', default=0.7, cast=float)
\ No newline at end of file
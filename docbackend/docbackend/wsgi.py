@@ -8,4 +8,10 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'docbackend.settings')
 
-application = get_wsgi_application()
\ No newline at end of file
+application = get_wsgi_application()
+
+# Retries and abandoned jobs are picked up by the web processes themselves
+# in 'inline' mode (process_jobs workers do it in 'queue' mode)
+from api.views import start_job_sweeper  # noqa: E402
+
+start_job_sweeper()